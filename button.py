@@ -1,22 +1,103 @@
 from PyQt5.QtWidgets import QPushButton
-from PyQt5.QtCore import Qt, pyqtSignal, QPoint, QTimer
+from PyQt5.QtCore import Qt, pyqtSignal, QPoint, QTimer, QRectF
 import sys
+import time
 import ctypes
 from ctypes import wintypes
-from PyQt5.QtGui import QColor
+from functools import lru_cache
+from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap, QRegion
+from PyQt5.QtWidgets import QWidget
+from tap_classifier import TapClassifier, CANCELLED
+from profile_compiler import button_stylesheet, parse_color, PRESS_FEEDBACK
+
+
+class GuideOverlay(QWidget):
+    """拖拽时显示对齐参考线的透明置顶层（鼠标穿透）"""
+
+    def __init__(self):
+        super().__init__(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool | Qt.WindowTransparentForInput | Qt.WindowDoesNotAcceptFocus)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAttribute(Qt.WA_ShowWithoutActivating, True)
+        self.guides = []
+
+    def show_guides(self, screen, guides):
+        if not guides: return self.hide_guides()
+        if self.geometry() != screen.geometry(): self.setGeometry(screen.geometry())
+        if guides != self.guides: self.guides = guides; self.update()
+        if not self.isVisible(): self.show()
+
+    def hide_guides(self):
+        self.guides = []
+        if self.isVisible(): self.hide()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setPen(QPen(QColor(255, 45, 85), 1, Qt.DashLine))
+        for kind, pos, a, b in self.guides:
+            if kind == 'v': painter.drawLine(pos, a - 8, pos, b + 8)
+            else: painter.drawLine(a - 8, pos, b + 8, pos)
+
+
+_guide_overlay = None
+
+def guide_overlay():
+    global _guide_overlay
+    if _guide_overlay is None: _guide_overlay = GuideOverlay()
+    return _guide_overlay
+
+
+# ---------------------------------------------------------------- 按下反馈
+UP, PRESSED, HELD = range(3)
+HOLD_FEEDBACK_MS = 400  # 按住这么久显示「按住」外观（设置了长按拖动时为长按时间，表示可以拖动了）
+MIN_FEEDBACK_MS = 120  # 按下外观至少显示这么久：很快的点击在远程桌面等低帧率画面上也能看到
+SCALE = 0.9  # scale 模式按下时的缩放比例
+
+
+def feedback_mode(config):
+    mode = config.get('press_feedback', 'highlight')
+    return mode if mode in PRESS_FEEDBACK else 'highlight'
+
+
+@lru_cache(maxsize=64)
+def feedback_overlay(mode, width, height, dpr, rgb, held):
+    """按下 / 按住时叠加在按钮上的图（同尺寸、同颜色的按钮共用），没有叠加时返回 None
+
+    highlight 半透明填充，ring 内描边，scale 不叠加（缩小绘制按钮本身）；按住时都叠加填充 + 粗描边。
+    """
+    if mode == 'none' or (mode == 'scale' and not held): return None
+    pixmap = QPixmap(round(width * dpr), round(height * dpr)); pixmap.setDevicePixelRatio(dpr); pixmap.fill(Qt.transparent)
+    painter = QPainter(pixmap); painter.setRenderHint(QPainter.Antialiasing)
+    rect = QRectF(1, 1, width - 2, height - 2)
+    if mode == 'highlight' or held:
+        fill = QColor(*rgb); fill.setAlpha(110 if held else 80)
+        painter.setPen(Qt.NoPen); painter.setBrush(fill); painter.drawRoundedRect(rect, 10, 10)
+    if mode == 'ring' or held:
+        painter.setPen(QPen(QColor(*rgb), 4 if held else 3)); painter.setBrush(Qt.NoBrush); painter.drawRoundedRect(rect.adjusted(2, 2, -2, -2), 8, 8)
+    painter.end()
+    return pixmap
+
 
 class DraggableButton(QPushButton):
     # 自定义信号：当位置改变时触发，携带配置字典
     positionChanged = pyqtSignal(dict)
     # 自定义信号：当按钮被点击时触发，传递按钮ID
     clicked = pyqtSignal(str)
+    # 自定义信号：任何触摸 / 按下都会触发（空闲省电据此判断用户活动）
+    touched = pyqtSignal()
 
-    def __init__(self, config, parent=None):
+    def __init__(self, config, parent=None, stylesheet=None):
         super().__init__(config['label'], parent)  # 初始化父类并设置按钮文字
         self.config = config  # 保存配置信息
-        self.m_drag = False  # 拖拽状态标志
-        self.drag_start_pos = QPoint()  # 记录拖拽起始位置
-        self.setup_style()  # 初始化样式
+        self.tap = TapClassifier.from_config(config)  # 点击 / 拖动判定（按下触发、容差、长按拖动）
+        self.drag_offset = QPoint()  # 鼠标全局位置与组件位置的偏移量
+        self.snapper = None  # 吸附回调 (button, x, y) -> (x, y, guides)，由主程序注入
+        self.usage = None  # 使用统计计数器（usage_stats.ButtonUsage），由主程序注入
+        # 按下反馈：外观在样式 / 尺寸变化时预先绘制，按下时同步重绘（在触发点击之前），之后只贴图
+        self.feedback = feedback_mode(config); self.feedback_state = UP
+        self._overlays = (None, None, None)  # 按 UP / PRESSED / HELD 索引
+        self._face = None  # scale 模式：按钮正常外观的快照
+        self._feedback_key = None; self._feedback_timer = None; self._feedback_since = 0.0; self._pressing = False
+        self.setup_style(stylesheet)  # 初始化样式
         if sys.platform == "win32":
             self.setup_win32_properties()
         else:
@@ -50,22 +131,31 @@ class DraggableButton(QPushButton):
     def mousePressEvent(self, event):
         """鼠标按下事件处理"""
         self.setFocusPolicy(Qt.NoFocus)  # 禁止按钮获取焦点
-        self.drag_start_global = event.globalPos()  # 全局坐标记录
-        self.drag_start_pos = event.pos()  # 记录点击位置（相对于组件）
+        self.touched.emit()
         if event.button() == Qt.LeftButton:
-            self.m_drag = True  # 标记开始拖拽
             # 计算鼠标全局位置与组件位置的偏移量
             self.drag_offset = event.globalPos() - self.pos()
+            if self.feedback != 'none': self._feedback_press()  # 先让用户看到按下，再注入按键
+            # 锁定的按钮或设置为按下触发的按钮在这里立即触发，不等松开
+            fired = self.tap.press(event.globalX(), event.globalY(), event.timestamp(), self.config['position_lock'])
+            if fired: self.clicked.emit(self.config['id'])
+            if self.usage: self.usage.press(event.x(), event.y(), self.width(), self.height(), event.timestamp(), fired)  # 在触发之后记录
         super().mousePressEvent(event)  # 调用父类处理
 
     def mouseMoveEvent(self, event):
         """鼠标移动事件处理"""
         self.setFocusPolicy(Qt.NoFocus)  # 禁止按钮获取焦点
-        if self.m_drag and (self.config['position_lock'] == False):  # 锁定状态检查（当锁定时拒绝更新位置）
+        self.tap.move(event.globalX(), event.globalY(), event.timestamp())  # 超出容差（且满足长按要求）后进入拖动
+        if self.feedback_state and (self.tap.dragging or self.tap.state == CANCELLED): self._feedback_cancel()  # 拖动 / 取消不再是点击
+        if self.tap.dragging and (self.config['position_lock'] == False):  # 锁定状态检查（当锁定时拒绝更新位置）
             # 计算新的位置（全局坐标减去偏移量）
             new_pos = event.globalPos() - self.drag_offset
             # 应用位置限制（防止移出屏幕）
             new_pos = self._clamp_position(new_pos)
+            if self.snapper and not (event.modifiers() & Qt.AltModifier):  # 按住 Alt 临时关闭吸附
+                x, y, guides = self.snapper(self, new_pos.x(), new_pos.y())
+                new_pos = self._clamp_position(QPoint(x, y))
+                guide_overlay().show_guides(self.screen(), guides)
             self.move(new_pos)  # 移动组件到新位置
             # 更新配置中的位置信息（使用列表格式存储x,y）
             self.config['position'] = [new_pos.x(), new_pos.y()]
@@ -85,45 +175,92 @@ class DraggableButton(QPushButton):
     def mouseReleaseEvent(self, event):
         """鼠标释放事件处理"""
         self.setFocusPolicy(Qt.NoFocus)  # 禁止按钮获取焦点
-        # 如果移动距离小于5像素视为点击事件（使用曼哈顿距离）
-        if (event.globalPos() - self.drag_start_global).manhattanLength() < 2:
-            self.clicked.emit(self.config['id'])  # 发射点击信号并传递ID
-        self.m_drag = False  # 重置拖拽状态
+        # 松开触发的按钮：移动不超过容差视为点击
+        if event.button() == Qt.LeftButton:
+            dragged = self.tap.dragging
+            fired = self.tap.release(event.globalX(), event.globalY(), event.timestamp())
+            if fired: self.clicked.emit(self.config['id'])  # 发射点击信号并传递ID
+            if self.usage: self.usage.release(event.timestamp(), fired, dragged)
+            self._feedback_release()
+        if _guide_overlay: _guide_overlay.hide_guides()
         super().mouseReleaseEvent(event)
 
-    def update_style(self):
-        """更新按钮样式（根据配置中的透明度）"""
-        # 从配置获取颜色
-        qcolor = QColor(self.config['color'])
-        r = qcolor.red()
-        g = qcolor.green()
-        b = qcolor.blue()
-        qcolor = QColor(self.config['textColor'])
-        tr = qcolor.red()
-        tg = qcolor.green()
-        tb = qcolor.blue()
-        qcolor = QColor(self.config['borderColor'])
-        br = qcolor.red()
-        bg = qcolor.green()
-        bb = qcolor.blue()
-        
-        # 获取字体，确保向后兼容性
-        font_family = self.config.get('fontFamily', '微软雅黑')
-        # 如果字体为空，使用默认字体
-        if not font_family or not font_family.strip():
-            font_family = '微软雅黑'
-
+    def update_style(self, stylesheet=None):
+        """更新按钮样式（根据配置中的颜色、字体和透明度）；stylesheet 为加载时预先生成的样式表"""
         self.setFocusPolicy(Qt.NoFocus)  # 禁止按钮获取焦点
-        self.setStyleSheet(f"""
-            background-color: rgba({r}, {g}, {b}, {self.config['opacity']});
-            color: rgba({tr}, {tg}, {tb});
-            border-radius: 10px;        /* 圆角半径 */
-            font-family: "{font_family}";
-            font-size: {self.config['fontSize']}px;            /* 字体大小 */
-            border: 2px solid rgba({br}, {bg}, {bb}, {self.config['opacity']}); /* 边框 */
-        """)
-
-    def setup_style(self):
+        self.setStyleSheet(stylesheet or button_stylesheet(self.config))
+        self._feedback_key = None
+        if self.isVisible(): self.prepare_feedback()
+
+    # ------------------------------------------------------------ 按下反馈
+    def prepare_feedback(self):
+        """按当前配置、尺寸预先绘制按下 / 按住外观；没有变化时直接返回"""
+        mode = feedback_mode(self.config)
+        w, h, dpr = self.width(), self.height(), self.devicePixelRatioF()
+        rgb = parse_color(self.config.get('textColor')) or (0, 0, 0)  # 文字颜色与背景对比最明显
+        key = (mode, w, h, dpr, rgb)
+        if key == self._feedback_key: return
+        self._feedback_key = key; self.feedback = mode
+        self._overlays = (None, feedback_overlay(mode, w, h, dpr, rgb, False), feedback_overlay(mode, w, h, dpr, rgb, True))
+        self._face = None
+        if mode == 'scale':
+            face = QPixmap(round(w * dpr), round(h * dpr)); face.setDevicePixelRatio(dpr); face.fill(Qt.transparent)
+            state, self.feedback_state = self.feedback_state, UP  # 快照总是正常外观
+            self.render(face, QPoint(), QRegion(self.rect()), QWidget.DrawChildren); self.feedback_state = state
+            self._face = face
+
+    def _set_feedback(self, state, now=False):
+        if state == self.feedback_state: return
+        self.feedback_state = state
+        if now: self.repaint()  # 同步绘制，不等事件循环
+        else: self.update()
+
+    def _feedback_press(self):
+        if self._feedback_key is None: self.prepare_feedback()
+        self._pressing = True; self._feedback_since = time.perf_counter()
+        if self._feedback_timer is None:
+            self._feedback_timer = QTimer(self); self._feedback_timer.setSingleShot(True); self._feedback_timer.timeout.connect(self._on_feedback_timer)
+        self._feedback_timer.start(self.tap.long_press_ms or HOLD_FEEDBACK_MS)
+        self._set_feedback(PRESSED, now=True)
+
+    def _feedback_release(self):
+        self._pressing = False
+        if not self.feedback_state: return
+        remaining = MIN_FEEDBACK_MS - (time.perf_counter() - self._feedback_since) * 1000
+        if remaining > 1: self._feedback_timer.start(int(remaining))  # 到时恢复
+        else: self._feedback_timer.stop(); self._set_feedback(UP)
+
+    def _feedback_cancel(self):
+        self._pressing = False
+        if self._feedback_timer: self._feedback_timer.stop()
+        self._set_feedback(UP)
+
+    def _on_feedback_timer(self):
+        self._set_feedback(HELD if self._pressing else UP)  # 仍按着：切换为按住外观；已松开：最短显示时间到了
+
+    def paintEvent(self, event):
+        state = self.feedback_state
+        if not state: return super().paintEvent(event)
+        if self._face is not None:
+            w, h = self.width(), self.height()
+            painter = QPainter(self); painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawPixmap(QRectF(w * (1 - SCALE) / 2, h * (1 - SCALE) / 2, w * SCALE, h * SCALE), self._face, QRectF(self._face.rect()))
+        else:
+            super().paintEvent(event); painter = QPainter(self)
+        overlay = self._overlays[state]
+        if overlay is not None: painter.drawPixmap(0, 0, overlay)
+
+    def showEvent(self, event):
+        super().showEvent(event); self.prepare_feedback()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.isVisible(): self.prepare_feedback()
+
+    def hideEvent(self, event):
+        self._feedback_cancel(); super().hideEvent(event)
+
+    def setup_style(self, stylesheet=None):
         # 关键窗口标志组合
         self.setWindowFlags(
             Qt.FramelessWindowHint |  # 无边框
@@ -135,6 +272,5 @@ class DraggableButton(QPushButton):
         self.setFocusPolicy(Qt.NoFocus)
         self.setGeometry(*self.config['position'], *self.config['size'])
         self.setAttribute(Qt.WA_TranslucentBackground)
-        self.update_style()
-        self.show()
+        self.update_style(stylesheet)
 
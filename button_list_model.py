@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+
+IdRole = Qt.UserRole + 1
+SearchRole = Qt.UserRole + 2
+
+
+class ButtonListModel(QAbstractListModel):
+    """按钮列表模型，直接包装配置中的 buttons 列表（不复制）
+
+    插入、删除、修改都通过增量信号通知视图，只有切换配置时才整体重置。
+    """
+
+    def __init__(self, buttons=None, parent=None):
+        super().__init__(parent)
+        self._buttons = buttons if buttons is not None else []
+        self._rows = None  # id -> row，插入/删除后失效，按需重建
+        self._batch = None  # 批量修改期间收集变化的行，结束时只发一次 dataChanged
+
+    def buttons(self): return self._buttons
+
+    def set_buttons(self, buttons):
+        self.beginResetModel()
+        self._buttons = buttons; self._rows = None
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._buttons)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        button = self._buttons[index.row()]
+        if role == Qt.DisplayRole:
+            label = button.get('label') or "(未命名)"
+            return f"{label}  [{button['layer']}]" if button.get('layer') else label
+        if role == Qt.ToolTipRole: return button.get('macro') or button.get('shortcut', '')
+        if role == IdRole: return button.get('id')
+        if role == SearchRole: return f"{button.get('label', '')} {button.get('shortcut', '')} {button.get('macro', '')} {button.get('layer', '')}"
+        return None
+
+    def row_of(self, button_id):
+        if self._rows is None: self._rows = {b.get('id'): i for i, b in enumerate(self._buttons)}
+        return self._rows.get(button_id, -1)
+
+    def insert_button(self, row, button):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._buttons.insert(row, button); self._rows = None
+        self.endInsertRows()
+
+    def remove_button(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        button = self._buttons.pop(row); self._rows = None
+        self.endRemoveRows()
+        return button
+
+    def button_changed(self, button):
+        row = self.row_of(button.get('id'))
+        if row < 0: return
+        if self._batch is not None: self._batch.append(row); return
+        idx = self.index(row); self.dataChanged.emit(idx, idx)
+
+    @contextmanager
+    def batch(self):
+        """合并批量修改的通知：with model.batch(): ... 结束时对涉及的行范围发一次 dataChanged"""
+        outer = self._batch is None
+        if outer: self._batch = []
+        try: yield
+        finally:
+            if outer:
+                rows, self._batch = self._batch, None
+                last = self.rowCount() - 1
+                if rows and last >= 0:
+                    self.dataChanged.emit(self.index(min(min(rows), last)), self.index(min(max(rows), last)))
+
+
+class ButtonFilterModel(QSortFilterProxyModel):
+    """按名称 / 热键 / 宏搜索过滤"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFilterRole(SearchRole)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import getpass
+from collections import deque
+from PyQt5.QtCore import QObject
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+# Windows 上是命名管道，其他平台是临时目录下的 Unix socket；按用户区分，互不干扰（TMB_CONTROL_NAME 可另行指定，回放时使用）
+SERVER_NAME = os.environ.get('TMB_CONTROL_NAME') or f"TouchMultiButton-{getpass.getuser()}"
+MAX_LINE = 64 * 1024
+
+
+class ControlServer(QObject):
+    """本地控制端点（QLocalServer，运行在 Qt 主线程）
+
+    协议：每行一个 JSON 请求 {"id": 1, "cmd": "trigger", ...}，按顺序每行回一个 JSON 响应
+    {"id": 1, "ok": true, "result": ...} 或 {"id": 1, "ok": false, "error": "..."}。
+    客户端可以连续发送多条请求而不等响应（流水线），同一批到达的请求只写回一次。
+    handlers: {命令名: handler(request) -> result}
+    """
+
+    def __init__(self, handlers, name=SERVER_NAME, parent=None):
+        super().__init__(parent)
+        self.handlers = handlers
+        self.name = name
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)  # 只允许当前用户连接
+        self.server.newConnection.connect(self._on_new_connection)
+        self._buffers = {}  # socket -> bytes
+        self.handled = 0; self.errors = 0
+        self._latency = deque(maxlen=1000)  # 单条命令处理耗时（秒）
+
+    def start(self):
+        # 先试着连接：能连上说明另一个实例正在运行（--new-instance、同时启动），不能抢走它的端点。
+        # 必须在 listen 之前检查，Unix 上设置了访问权限的 listen 会直接替换已有的 socket 文件
+        probe = QLocalSocket(); probe.connectToServer(self.name)
+        if probe.waitForConnected(300):
+            probe.disconnectFromServer()
+            print(f"控制端点 {self.name} 已被运行中的实例使用，本实例不提供控制端点")
+            return False
+        if self.server.listen(self.name): return True
+        QLocalServer.removeServer(self.name)  # 连不上：上次异常退出残留的 socket 文件
+        if self.server.listen(self.name): return True
+        print(f"控制端点启动失败: {self.server.errorString()}")
+        return False
+
+    def stop(self):
+        for sock in list(self._buffers): sock.disconnectFromServer()
+        self.server.close()
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            sock = self.server.nextPendingConnection()
+            self._buffers[sock] = b''
+            sock.readyRead.connect(lambda s=sock: self._on_ready_read(s))
+            sock.disconnected.connect(lambda s=sock: self._on_disconnected(s))
+
+    def _on_disconnected(self, sock):
+        self._buffers.pop(sock, None); sock.deleteLater()
+
+    def _on_ready_read(self, sock):
+        data = self._buffers.get(sock, b'') + bytes(sock.readAll())
+        *lines, rest = data.split(b'\n')
+        if len(rest) > MAX_LINE:
+            sock.write(self._encode({'ok': False, 'error': "请求过长"})); sock.disconnectFromServer(); return
+        self._buffers[sock] = rest
+        replies = [self._encode(self.execute_line(line)) for line in lines if line.strip()]
+        if replies: sock.write(b''.join(replies)); sock.flush()
+
+    @staticmethod
+    def _encode(reply):
+        return json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def execute_line(self, line):
+        try: request = json.loads(line)
+        except ValueError as e: return {'ok': False, 'error': f"JSON 格式错误: {e}"}
+        if not isinstance(request, dict): return {'ok': False, 'error': "请求必须是 JSON 对象"}
+        return self.execute(request)
+
+    def execute(self, request):
+        """执行一条命令（也用于本进程内直接调用）"""
+        t = time.perf_counter()
+        reply = {'id': request.get('id')} if 'id' in request else {}
+        handler = self.handlers.get(request.get('cmd'))
+        if handler is None:
+            reply.update(ok=False, error=f"未知命令: {request.get('cmd')}")
+        else:
+            try: reply.update(ok=True, result=handler(request))
+            except Exception as e: reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+        self.handled += 1
+        if not reply['ok']: self.errors += 1
+        self._latency.append(time.perf_counter() - t)
+        return reply
+
+    def stats(self):
+        samples = sorted(self._latency)
+        data = {'handled': self.handled, 'errors': self.errors, 'clients': len(self._buffers)}
+        if samples:
+            data['handle_p50_ms'] = round(samples[len(samples) // 2] * 1000, 3)
+            data['handle_p99_ms'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3)
+        return data
+
+
+def send_commands(commands, name=SERVER_NAME, timeout_ms=1000):
+    """把命令一次性发给运行中的实例，按顺序返回响应列表；没有运行中的实例时返回 None
+
+    使用阻塞式 waitFor*，不需要事件循环（仍需已创建 QCoreApplication）。
+    """
+    sock = QLocalSocket()
+    sock.connectToServer(name)
+    if not sock.waitForConnected(timeout_ms): return None
+    sock.write(b''.join(json.dumps(dict(c, id=i), ensure_ascii=False).encode('utf-8') + b'\n' for i, c in enumerate(commands)))
+    sock.flush()
+    data = b''; deadline = time.monotonic() + timeout_ms / 1000
+    while data.count(b'\n') < len(commands):
+        remaining = int((deadline - time.monotonic()) * 1000)
+        if remaining <= 0 or not sock.waitForReadyRead(remaining): break
+        data += bytes(sock.readAll())
+    sock.disconnectFromServer()
+    replies = [json.loads(line) for line in data.split(b'\n') if line.strip()]
+    return replies + [{'ok': False, 'error': "等待响应超时"}] * (len(commands) - len(replies))
+
+
+def add_arguments(parser):
+    """main.py 的命令行参数：有运行中的实例时转发给它，否则在启动后由本实例执行"""
+    parser.add_argument('--trigger', metavar='ID', help="触发按钮（与点击相同）")
+    parser.add_argument('--press', metavar='KEYS', help="按下按键，如 ctrl+shift")
+    parser.add_argument('--release', metavar='KEYS', help="松开按键")
+    parser.add_argument('--tap', metavar='KEYS', help="按一次按键（经点击队列）")
+    parser.add_argument('--switch', metavar='FILE', help="切换配置文件")
+    parser.add_argument('--layer', metavar='NAME', help="切换图层（空字符串回到基础图层）")
+    parser.add_argument('--reload', action='store_true', help="从磁盘重新加载当前配置")
+    parser.add_argument('--metrics', action='store_true', help="输出运行指标（JSON）")
+    parser.add_argument('--settings', action='store_true', help="打开设置窗口")
+    parser.add_argument('--profile', metavar='SECONDS', type=float, help="性能采集 N 秒，结果写入 diagnostics 目录")
+    parser.add_argument('--resources', action='store_true', help="输出存活的控件、定时器、连接数和内存（JSON）")
+    parser.add_argument('--soak', metavar='CYCLES', type=int, help="浸泡测试：反复切换配置和打开设置窗口，报告资源增长")
+    parser.add_argument('--idle', choices=('enter', 'wake'), help="立即进入 / 退出空闲省电，输出空闲统计（JSON）")
+    parser.add_argument('--record', choices=('start', 'stop'), help="开始 / 停止录制触摸会话（见 replay.py）")
+    parser.add_argument('--sync', action='store_true', help="立即从配置服务器同步配置（preferences.json 的 sync.server）")
+    parser.add_argument('--new-instance', action='store_true', help="不检查已运行的实例")
+
+
+def commands_from_args(args):
+    commands = []
+    if args.switch: commands.append({'cmd': 'switch', 'profile': args.switch})
+    if args.reload: commands.append({'cmd': 'reload'})
+    if args.layer is not None: commands.append({'cmd': 'layer', 'mode': 'switch', 'layer': args.layer})
+    if args.trigger: commands.append({'cmd': 'trigger', 'button': args.trigger})
+    if args.press: commands.append({'cmd': 'press', 'keys': args.press})
+    if args.release: commands.append({'cmd': 'release', 'keys': args.release})
+    if args.tap: commands.append({'cmd': 'tap', 'keys': args.tap})
+    if args.settings: commands.append({'cmd': 'settings'})
+    if args.profile: commands.append({'cmd': 'profile', 'seconds': args.profile})
+    if args.metrics: commands.append({'cmd': 'metrics'})
+    if args.resources: commands.append({'cmd': 'resources'})
+    if args.soak: commands.append({'cmd': 'soak', 'cycles': args.soak})
+    if args.idle: commands.append({'cmd': 'idle', 'state': args.idle})
+    if args.record: commands.append({'cmd': 'record', 'state': args.record})
+    if args.sync: commands.append({'cmd': 'sync'})
+    return commands
+
+
+def benchmark(count=1000, name=SERVER_NAME):
+    """向运行中的实例流水线发送 count 个 ping，返回总耗时和平均每条耗时（毫秒）"""
+    t = time.perf_counter()
+    replies = send_commands([{'cmd': 'ping'}] * count, name, timeout_ms=10000)
+    if replies is None: return None
+    elapsed = time.perf_counter() - t
+    return {'count': count, 'ok': sum(1 for r in replies if r.get('ok')), 'total_ms': round(elapsed * 1000, 2), 'per_command_us': round(elapsed / count * 1e6, 1)}
+
+
+if __name__ == "__main__":
+    # 命令行客户端：python control_server.py '{"cmd": "metrics"}' ...，或 --bench 1000
+    import sys
+    from PyQt5.QtCore import QCoreApplication
+    app = QCoreApplication(sys.argv)
+    if len(sys.argv) > 2 and sys.argv[1] == '--bench':
+        result = benchmark(int(sys.argv[2]))
+        print(json.dumps(result, ensure_ascii=False) if result else "没有运行中的实例"); sys.exit(0 if result else 1)
+    replies = send_commands([json.loads(a) for a in sys.argv[1:]] or [{'cmd': 'ping'}])
+    if replies is None: sys.exit("没有运行中的实例")
+    for reply in replies: print(json.dumps(reply, ensure_ascii=False))
+    sys.exit(0 if all(r.get('ok') for r in replies) else 1)
@@ -0,0 +1,117 @@
+import time
+
+
+class EditHistory:
+    """设置窗口的撤销/重做历史
+
+    只记录字段级差异，按钮字典以引用方式共享（插入/删除/切换配置都不复制），
+    因此内存只随修改量增长，与布局大小无关；取消 = 依次撤销到起点。
+
+    操作格式:
+        ('set', button, field, old, new)      修改单个字段
+        ('insert', index, button)             插入按钮
+        ('remove', index, button)             删除按钮
+        ('replace', old_name, old_cfg, new_name, new_cfg)  切换配置文件
+
+    doc 为被编辑的文档，需实现 apply_set / apply_insert / apply_remove / apply_replace，
+    这样撤销、重做时的修改和正常编辑走同一条路径（例如同步通知列表模型）。
+    """
+
+    def __init__(self, merge_window=1.0):
+        self.merge_window = merge_window  # 同一字段连续修改在该时间窗口内合并为一步
+        self._undo = []  # [(ops, merge_key, timestamp)]
+        self._redo = []
+
+    def can_undo(self): return bool(self._undo)
+    def can_redo(self): return bool(self._redo)
+    def __len__(self): return len(self._undo)
+
+    def clear(self):
+        self._undo.clear(); self._redo.clear()
+
+    def do(self, doc, ops, merge_key=None):
+        """执行操作并记录"""
+        for op in ops: self._apply(doc, op, reverse=False)
+        self.push(ops, merge_key)
+
+    def push(self, ops, merge_key=None):
+        """记录一步操作；merge_key 相同且间隔很短时与上一步合并（如连续输入）"""
+        if not ops: return
+        self._redo.clear()
+        now = time.monotonic()
+        if merge_key is not None and self._undo:
+            last_ops, last_key, last_time = self._undo[-1]
+            if last_key == merge_key and now - last_time < self.merge_window:
+                self._undo[-1] = (self._merge(last_ops, ops), merge_key, now)
+                return
+        self._undo.append((list(ops), merge_key, now))
+
+    @staticmethod
+    def _merge(old_ops, new_ops):
+        # 同一按钮同一字段只保留最早的 old 和最新的 new
+        merged = list(old_ops)
+        index = {(id(op[1]), op[2]): i for i, op in enumerate(merged) if op[0] == 'set'}
+        for op in new_ops:
+            key = (id(op[1]), op[2]) if op[0] == 'set' else None
+            if key in index:
+                i = index[key]; merged[i] = ('set', op[1], op[2], merged[i][3], op[4])
+            else:
+                if key: index[key] = len(merged)
+                merged.append(op)
+        return merged
+
+    def undo(self, doc):
+        """撤销一步，返回被撤销的操作列表"""
+        if not self._undo: return None
+        ops, key, ts = self._undo.pop()
+        for op in reversed(ops): self._apply(doc, op, reverse=True)
+        self._redo.append((ops, key, ts))
+        return ops
+
+    def redo(self, doc):
+        if not self._redo: return None
+        ops, key, ts = self._redo.pop()
+        for op in ops: self._apply(doc, op, reverse=False)
+        self._undo.append((ops, None, ts))  # 重做后的步骤不再参与合并
+        return ops
+
+    def rewind(self, doc):
+        """撤销全部修改，回到打开窗口时的状态（代价与修改次数成正比）"""
+        steps = 0
+        while self._undo:
+            self.undo(doc); steps += 1
+        self._redo.clear()
+        return steps
+
+    @staticmethod
+    def _apply(doc, op, reverse):
+        kind = op[0]
+        if kind == 'set':
+            _, button, field, old, new = op
+            doc.apply_set(button, field, old if reverse else new)
+        elif kind in ('insert', 'remove'):
+            _, index, button = op
+            if (kind == 'insert') != reverse: doc.apply_insert(index, button)
+            else: doc.apply_remove(index)
+        elif kind == 'replace':
+            _, old_name, old_cfg, new_name, new_cfg = op
+            doc.apply_replace(*((old_name, old_cfg) if reverse else (new_name, new_cfg)))
+
+
+class _Missing:
+    def __repr__(self): return "<missing>"
+
+
+# 字段原本不存在时的占位值，撤销时会删除该字段而不是写入 None
+_MISSING = _Missing()
+
+
+def set_field(button, field, value):
+    """写入字段；值为 _MISSING 时删除该字段"""
+    if value is _MISSING: button.pop(field, None)
+    else: button[field] = value
+
+
+def diff_fields(button, new_values):
+    """比较按钮字典与新值，返回 set 操作列表（只包含真正变化的字段）"""
+    return [('set', button, k, button.get(k, _MISSING), v) for k, v in new_values.items() if button.get(k, _MISSING) != v]
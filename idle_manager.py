@@ -0,0 +1,149 @@
+import sys
+import time
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal, QAbstractEventDispatcher
+from button import DraggableButton
+from profile_compiler import normalize_button
+
+MODES = ('fade', 'handle')
+MODE_NAMES = {'fade': "淡出", 'handle': "收起为小圆点"}
+
+
+def system_idle_ms():
+    """系统最近一次输入（任何窗口）距今的毫秒数；只在 Windows 上可用，其他平台返回 None"""
+    if sys.platform != "win32": return None
+    import ctypes
+    from ctypes import wintypes
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [('cbSize', wintypes.UINT), ('dwTime', wintypes.DWORD)]
+    info = LASTINPUTINFO(); info.cbSize = ctypes.sizeof(info)
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)): return None
+    return (ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF
+
+
+class IdleManager(QObject):
+    """空闲省电
+
+    一段时间没有触摸悬浮按钮后进入空闲（Windows 上还要求整个系统在这段时间内没有输入）：
+        fade    按钮窗口整体淡出到 opacity，仍可点击，点击时立即恢复并照常触发
+        handle  隐藏所有按钮，只留一个可拖动的小圆点，点它恢复（不再合成任何按钮窗口，最省电）
+    进入空闲时暂停注册的定时器（register），恢复时按图层恢复可见性，只调用 setVisible / setWindowOpacity，
+    不重建任何控件。空闲期间没有任何定时器；只在空闲期间统计事件循环唤醒次数和进程 CPU 时间。
+    """
+    idleChanged = pyqtSignal(bool)
+
+    def __init__(self, buttons, layers, timeout_ms=300000, mode='fade', opacity=0.2, handle_position=None, parent=None):
+        super().__init__(parent)
+        self.buttons = buttons  # 返回当前按钮列表的函数
+        self.layers = layers
+        self.mode = mode if mode in MODES else 'fade'
+        self.opacity = opacity
+        self.handle_position = handle_position
+        self.handle = None
+        self.idle = False
+        self.enabled = False
+        self._hooks = []  # (pause, resume)
+        self.timeout_ms = max(1000, int(timeout_ms))
+        self._timer = QTimer(self); self._timer.setSingleShot(True); self._timer.setTimerType(Qt.VeryCoarseTimer)
+        self._timer.timeout.connect(self._on_timeout)
+        self._dispatcher = None
+        self.on_handle_moved = None  # 小圆点被拖动后回调 on_handle_moved([x, y])
+        self.entered = 0; self.wakeups = 0; self.idle_since = None; self.cpu_at_idle = 0.0
+        self.last_idle = None  # 上一段空闲的统计
+        self.last_wake_ms = None
+
+    def register(self, pause, resume):
+        """注册空闲时需要暂停的定时器 / 动画"""
+        self._hooks.append((pause, resume))
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            if self.mode == 'handle': self._ensure_handle()
+            self._timer.start(self.timeout_ms)
+        else:
+            self._timer.stop()
+            if self.idle: self.wake()
+
+    def activity(self, *args):
+        """用户触摸了按钮：空闲中则立即恢复，然后重新计时"""
+        if self.idle: self.wake()
+        if self.enabled: self._timer.start(self.timeout_ms)
+
+    def _on_timeout(self):
+        idle_ms = system_idle_ms()
+        if idle_ms is not None and idle_ms < self.timeout_ms:
+            self._timer.start(self.timeout_ms - idle_ms); return  # 其他窗口仍在使用中，按剩余时间再等
+        self.enter_idle()
+
+    def _ensure_handle(self):
+        if self.handle is not None: return self.handle
+        config = normalize_button({'id': '__idle_handle__', 'label': "●", 'size': [44, 44], 'opacity': 0.35,
+                                   'color': '#000000', 'textColor': '#ffffff', 'borderColor': '#ffffff', 'fontSize': 16})
+        handle = DraggableButton(config)
+        handle.setGeometry(*self._handle_position(handle), 44, 44)
+        handle.ensurePolished(); handle.winId()  # 提前创建原生窗口，恢复 / 收起时只切换可见性
+        handle.clicked.connect(lambda _: self.activity())
+        handle.positionChanged.connect(lambda c: self.on_handle_moved and self.on_handle_moved(list(c['position'])))
+        handle.hide()
+        self.handle = handle
+        return handle
+
+    def _handle_position(self, handle):
+        if self.handle_position: return self.handle_position
+        rect = handle.screen().availableGeometry()
+        return [rect.right() - 44 - 16, rect.bottom() - 44 - 16]
+
+    def prepare(self, button):
+        """空闲期间新建的按钮（例如自动切换了配置）也保持空闲外观"""
+        if self.idle and self.mode == 'fade': button.setWindowOpacity(self.opacity)
+
+    def enter_idle(self):
+        if self.idle: return
+        self.idle = True; self.entered += 1
+        for pause, _ in self._hooks:
+            try: pause()
+            except Exception as e: print(f"空闲暂停失败: {e}")
+        if self.mode == 'handle':
+            self.layers.suspend()
+            self._ensure_handle().show(); self.handle.raise_()
+        else:
+            for button in self.buttons(): button.setWindowOpacity(self.opacity)
+        self.wakeups = 0; self.idle_since = time.monotonic(); self.cpu_at_idle = time.process_time()
+        self._dispatcher = QAbstractEventDispatcher.instance()
+        if self._dispatcher is not None: self._dispatcher.awake.connect(self._count_wakeup)
+        self.idleChanged.emit(True)
+
+    def _count_wakeup(self):
+        self.wakeups += 1
+
+    def wake(self):
+        if not self.idle: return
+        t = time.perf_counter()
+        if self._dispatcher is not None:
+            self._dispatcher.awake.disconnect(self._count_wakeup); self._dispatcher = None
+        self.last_idle = self._idle_stats()
+        self.idle = False
+        if self.mode == 'handle':
+            self.layers.resume()  # 只显示当前可见图层的按钮
+            if self.handle: self.handle.hide()
+        else:
+            for button in self.buttons(): button.setWindowOpacity(1.0)
+        for _, resume in self._hooks:
+            try: resume()
+            except Exception as e: print(f"空闲恢复失败: {e}")
+        self.last_wake_ms = round((time.perf_counter() - t) * 1000, 3)
+        self.idleChanged.emit(False)
+
+    def _idle_stats(self):
+        seconds = time.monotonic() - self.idle_since
+        cpu = time.process_time() - self.cpu_at_idle
+        minutes = max(seconds / 60, 1e-9)
+        return {'seconds': round(seconds, 1), 'wakeups': self.wakeups, 'wakeups_per_min': round(self.wakeups / minutes, 2),
+                'cpu_ms': round(cpu * 1000, 1), 'cpu_ms_per_min': round(cpu * 1000 / minutes, 2)}
+
+    def stats(self):
+        data = {'enabled': self.enabled, 'idle': self.idle, 'mode': self.mode, 'timeout_s': self.timeout_ms / 1000,
+                'entered': self.entered, 'last_wake_ms': self.last_wake_ms, 'last_idle': self.last_idle}
+        if self.idle: data['current_idle'] = self._idle_stats()
+        return data
@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+
+
+def split_chord(keys):
+    """'ctrl+shift+a' -> ['ctrl', 'shift', 'a']（'+' 键本身写作 'plus'）"""
+    return [k.strip().lower() for k in keys.split('+') if k.strip()]
+
+
+def split_sequence(keys):
+    """'ctrl+c, ctrl+v' -> ['ctrl+c', 'ctrl+v']，与 keyboard.send 的语法一致"""
+    return [s.strip() for s in keys.split(',') if s.strip()]
+
+
+class InputBackend:
+    """按键注入后端接口；keys 参数使用与 keyboard 库相同的组合键语法"""
+    name = 'base'
+
+    def press(self, keys): raise NotImplementedError
+    def release(self, keys): raise NotImplementedError
+    def write(self, text): raise NotImplementedError
+
+    def supports(self, key):
+        """能否发送该按键（规范名），编译配置时检查；默认都能"""
+        return True
+
+    def send(self, keys):
+        for chord in split_sequence(keys):
+            self.press(chord); self.release(chord)
+
+    def warm(self):
+        """提前完成耗时的初始化（启动完成后调用），默认无操作"""
+
+    def close(self): pass
+
+
+class KeyboardBackend(InputBackend):
+    """keyboard 库（Windows 直接可用；Linux 需要 root）
+
+    导入 keyboard 需要几十毫秒，推迟到 warm() 或第一次注入时进行，不拖慢首屏。
+    """
+    name = 'keyboard'
+
+    def __init__(self):
+        self._kb = None
+
+    def warm(self):
+        if self._kb is None:
+            import keyboard
+            self._kb = keyboard
+        return self._kb
+
+    def press(self, keys): (self._kb or self.warm()).press(keys)
+    def release(self, keys): (self._kb or self.warm()).release(keys)
+    def send(self, keys): (self._kb or self.warm()).send(keys)
+    def write(self, text): (self._kb or self.warm()).write(text)
+
+
+class UInputBackend(InputBackend):
+    """Linux uinput 虚拟键盘（需要 python-evdev 以及 /dev/uinput 写权限，不需要 root 运行整个程序）"""
+    name = 'uinput'
+
+    ALIASES = {
+        'ctrl': 'LEFTCTRL', 'control': 'LEFTCTRL', 'shift': 'LEFTSHIFT', 'alt': 'LEFTALT', 'alt gr': 'RIGHTALT',
+        'windows': 'LEFTMETA', 'win': 'LEFTMETA', 'cmd': 'LEFTMETA', 'command': 'LEFTMETA',
+        'right ctrl': 'RIGHTCTRL', 'right shift': 'RIGHTSHIFT', 'right alt': 'RIGHTALT',
+        'enter': 'ENTER', 'return': 'ENTER', 'esc': 'ESC', 'escape': 'ESC', 'space': 'SPACE', 'tab': 'TAB',
+        'backspace': 'BACKSPACE', 'delete': 'DELETE', 'del': 'DELETE', 'insert': 'INSERT',
+        'page up': 'PAGEUP', 'page down': 'PAGEDOWN', 'caps lock': 'CAPSLOCK', 'num lock': 'NUMLOCK',
+        'print screen': 'SYSRQ', 'scroll lock': 'SCROLLLOCK', 'pause': 'PAUSE', 'menu': 'COMPOSE',
+        'volume up': 'VOLUMEUP', 'volume down': 'VOLUMEDOWN', 'volume mute': 'MUTE',
+        'play/pause media': 'PLAYPAUSE', 'next track': 'NEXTSONG', 'previous track': 'PREVIOUSSONG', 'stop media': 'STOPCD',
+        '-': 'MINUS', '=': 'EQUAL', ',': 'COMMA', '.': 'DOT', '/': 'SLASH', ';': 'SEMICOLON',
+        "'": 'APOSTROPHE', '[': 'LEFTBRACE', ']': 'RIGHTBRACE', '\\': 'BACKSLASH', '`': 'GRAVE',
+        **{f'num {i}': f'KP{i}' for i in range(10)},
+    }
+    # 需要按住 Shift 输入的字符
+    SHIFTED = dict(zip('~!@#$%^&*()_+{}|:"<>?', '`1234567890-=[]\\;\',./'))
+
+    def __init__(self):
+        from evdev import UInput, ecodes
+        self._ecodes = ecodes
+        self._codes = {}
+        self._ui = UInput(name="TouchMultiButton")
+        self._lock = threading.Lock()
+
+    def _code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            sym = self.ALIASES.get(name, name.upper().replace(' ', ''))
+            code = getattr(self._ecodes, 'KEY_' + sym, None)
+            if code is None: raise ValueError(f"uinput 不支持的按键: {name}")
+            self._codes[name] = code
+        return code
+
+    def _emit(self, codes, value):
+        with self._lock:
+            for code in codes: self._ui.write(self._ecodes.EV_KEY, code, value)
+            self._ui.syn()
+
+    def _chord(self, keys):
+        """单个组合键 -> 按下顺序的键码；'plus'、'!' 等需要 Shift 的字符自动加上 Shift"""
+        if len(split_sequence(keys)) > 1: raise ValueError(f"press / release 只接受单个组合键: {keys}")
+        codes = []
+        for k in split_chord(keys):
+            if k == 'plus': k = '+'
+            if k in self.SHIFTED: codes.append(self._code('shift')); k = self.SHIFTED[k]
+            codes.append(self._code(k))
+        return list(dict.fromkeys(codes))  # 'shift+plus' 不重复按 Shift
+
+    def supports(self, key):
+        try: self._chord(key); return True
+        except ValueError: return False
+
+    def press(self, keys): self._emit(self._chord(keys), 1)
+    def release(self, keys): self._emit(list(reversed(self._chord(keys))), 0)
+
+    def write(self, text):
+        for ch in text:
+            if ch == ' ': chord = 'space'
+            elif ch == '\n': chord = 'enter'
+            elif ch.isupper(): chord = 'shift+' + ch.lower()
+            elif ch in self.SHIFTED: chord = 'shift+' + self.SHIFTED[ch]
+            else: chord = ch
+            codes = [self._code(k) for k in chord.split('+')]  # '+' 已在 SHIFTED 中换成 shift+=
+            self._emit(codes, 1); self._emit(list(reversed(codes)), 0)
+
+    def close(self):
+        try: self._ui.close()
+        except Exception: pass
+
+
+class RecordingBackend(InputBackend):
+    """内存中的假后端：不注入任何按键，只带时间戳记录事件，供测试和基准使用
+
+    events 中每项为 (perf_counter_ns, 'press'|'release'|'write', keys)。
+    latency 可模拟注入耗时（秒），用于测试排队和背压。
+    """
+    name = 'recording'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.events = []
+        self._lock = threading.Lock()
+
+    def _record(self, kind, keys):
+        if self.latency: time.sleep(self.latency)
+        with self._lock: self.events.append((time.perf_counter_ns(), kind, keys))
+
+    def press(self, keys): self._record('press', keys)
+    def release(self, keys): self._record('release', keys)
+    def write(self, text): self._record('write', text)
+
+    def clear(self):
+        with self._lock: self.events.clear()
+
+    def keys(self, kind='press'):
+        """按顺序返回某类事件的按键，便于断言"""
+        with self._lock: return [k for _, t, k in self.events if t == kind]
+
+
+BACKENDS = {'keyboard': KeyboardBackend, 'uinput': UInputBackend, 'recording': RecordingBackend}
+
+
+def create_backend(name=None):
+    """按环境变量 TMB_INPUT_BACKEND > 配置 > 默认 keyboard 的顺序选择后端；
+    指定的后端不可用时回退到 keyboard"""
+    name = (os.environ.get('TMB_INPUT_BACKEND') or name or 'keyboard').lower()
+    cls = BACKENDS.get(name)
+    if cls is None:
+        print(f"未知的输入后端: {name}，使用 keyboard")
+        cls = KeyboardBackend
+    try: return cls()
+    except Exception as e:
+        if cls is KeyboardBackend: raise
+        print(f"输入后端 {name} 不可用: {e}，使用 keyboard")
+        return KeyboardBackend()
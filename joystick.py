@@ -0,0 +1,138 @@
+import math
+from PyQt5.QtCore import Qt, pyqtSignal, QPointF
+from PyQt5.QtGui import QPainter, QColor, QBrush, QPen
+from button import DraggableButton
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+DEFAULT_KEYS = {'up': 'w', 'down': 's', 'left': 'a', 'right': 'd'}
+
+# 扇区从正右方开始逆时针编号，每个扇区对应按住的方向
+_SECTORS = {
+    4: (('right',), ('up',), ('left',), ('down',)),
+    8: (('right',), ('up', 'right'), ('up',), ('up', 'left'), ('left',), ('down', 'left'), ('down',), ('down', 'right')),
+}
+
+
+class DirectionMapper:
+    """把相对中心的偏移映射为按住的按键，只输出变化
+
+    所有扇区之间的 (松开, 按下) 转换在构造时预先算好，update() 只做几次浮点运算和查表，
+    不创建列表/集合，可以跟上触摸屏的完整采样率。
+    dead_zone: 死区半径占总半径的比例；hysteresis: 扇区边界的滞回角度（度），死区也有 20% 的滞回。
+    """
+
+    def __init__(self, keys=None, sectors=8, dead_zone=0.25, hysteresis=8.0):
+        if sectors not in _SECTORS: raise ValueError(f"方向数只能是 4 或 8: {sectors}")
+        keys = dict(DEFAULT_KEYS, **(keys or {}))
+        self.sectors = sectors
+        self.width = 360.0 / sectors
+        self.half = self.width / 2 + hysteresis  # 留在当前扇区的最大偏角
+        self.enter = dead_zone; self.leave = dead_zone * 0.8
+        held = [frozenset(keys[d] for d in dirs if keys.get(d)) for dirs in _SECTORS[sectors]] + [frozenset()]  # 最后一项为死区
+        # transitions[a][b] = (要松开的键, 要按下的键)，下标 -1 即死区
+        self.transitions = [[(tuple(sorted(a - b)), tuple(sorted(b - a))) for b in held] for a in held]
+        self.current = -1
+
+    def update(self, dx, dy, radius):
+        """dx/dy 为相对中心的像素偏移（屏幕坐标，y 向下），返回 (松开, 按下) 或 None（没有变化）"""
+        r = math.hypot(dx, dy) / radius if radius else 0.0
+        current = self.current
+        if r < (self.leave if current >= 0 else self.enter): sector = -1
+        else:
+            angle = math.degrees(math.atan2(-dy, dx)) % 360.0
+            if current >= 0 and abs((angle - current * self.width + 180.0) % 360.0 - 180.0) <= self.half: return None
+            sector = int((angle + self.width / 2) // self.width) % self.sectors
+        if sector == current: return None
+        self.current = sector
+        return self.transitions[current][sector]
+
+    def reset(self):
+        """回到死区，返回需要松开的键"""
+        current, self.current = self.current, -1
+        return self.transitions[current][-1]
+
+
+class JoystickButton(DraggableButton):
+    """虚拟摇杆 / 十字键（配置 "type": "joystick"）
+
+    位置未锁定时与普通按钮一样拖动摆放；锁定后手指在按钮内的位置决定方向，
+    只在方向变化时发出 keysChanged(松开, 按下)。隐藏（切换图层）或松手时松开所有键。
+    """
+    keysChanged = pyqtSignal(tuple, tuple)
+
+    def __init__(self, config, parent=None, keys=None):
+        # keys 为配置编译器解析好的方向键（profile_compiler.py）；无效的方向数已在编译时报告
+        sectors = config.get('sectors', 8)
+        if sectors not in _SECTORS: sectors = 8
+        self.mapper = DirectionMapper(config.get('keys') if keys is None else keys, sectors, config.get('dead_zone', 0.25), config.get('hysteresis', 8.0))
+        self.knob_x = self.knob_y = 0.0  # 摇杆头相对中心的位置（保存为数值，移动时不创建对象）
+        self.tracking = False
+        super().__init__(config, parent)
+
+    def is_locked(self): return self.config.get('position_lock', False)
+
+    def mousePressEvent(self, event):
+        if not self.is_locked(): return super().mousePressEvent(event)
+        self.touched.emit()
+        if event.button() == Qt.LeftButton:
+            self.tracking = True; self._track(event.pos())
+            if self.usage: self.usage.press(event.x(), event.y(), self.width(), self.height(), event.timestamp())
+        event.accept()
+
+    def mouseMoveEvent(self, event):
+        if not self.is_locked(): return super().mouseMoveEvent(event)
+        if self.tracking: self._track(event.pos())
+        event.accept()
+
+    def mouseReleaseEvent(self, event):
+        if not self.is_locked(): return super().mouseReleaseEvent(event)
+        self.release_all(); event.accept()
+        if self.usage: self.usage.release(event.timestamp())
+
+    def hideEvent(self, event):
+        self.release_all(); super().hideEvent(event)
+
+    def _track(self, pos):
+        radius = min(self.width(), self.height()) / 2
+        dx = pos.x() - self.width() / 2; dy = pos.y() - self.height() / 2
+        change = self.mapper.update(dx, dy, radius)
+        if change: self.keysChanged.emit(*change)
+        # 摇杆头限制在圆内
+        r = math.hypot(dx, dy); limit = radius * 0.6
+        if r > limit: dx, dy = dx * limit / r, dy * limit / r
+        if abs(dx - self.knob_x) >= 1 or abs(dy - self.knob_y) >= 1:
+            self.knob_x, self.knob_y = dx, dy; self.update()
+
+    def release_all(self):
+        self.tracking = False
+        released, _ = self.mapper.reset()
+        if released: self.keysChanged.emit(released, ())
+        if self.knob_x or self.knob_y: self.knob_x = self.knob_y = 0.0; self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        painter = QPainter(self); painter.setRenderHint(QPainter.Antialiasing)
+        color = QColor(self.config.get('borderColor', '#ffffff')); color.setAlphaF(min(1.0, self.config.get('opacity', 0.5) + 0.3))
+        center = QPointF(self.width() / 2, self.height() / 2)
+        radius = min(self.width(), self.height()) / 2
+        painter.setPen(QPen(color, 2)); painter.setBrush(Qt.NoBrush)
+        painter.drawEllipse(center, radius * self.mapper.enter, radius * self.mapper.enter)  # 死区
+        painter.setPen(Qt.NoPen); painter.setBrush(QBrush(color))
+        painter.drawEllipse(QPointF(center.x() + self.knob_x, center.y() + self.knob_y), radius * 0.3, radius * 0.3)
+
+
+def benchmark(events=200000, sectors=8):
+    """模拟手指绕圈移动，返回每个事件的平均处理时间（微秒）和方向变化次数"""
+    import time
+    mapper = DirectionMapper(sectors=sectors)
+    points = [(math.cos(i / 50) * 60, math.sin(i / 50) * 60) for i in range(1000)]
+    changes = 0
+    t = time.perf_counter()
+    for i in range(events):
+        dx, dy = points[i % 1000]
+        if mapper.update(dx, dy, 75): changes += 1
+    return {'per_event_us': round((time.perf_counter() - t) / events * 1e6, 3), 'changes': changes}
+
+
+if __name__ == "__main__":
+    print(benchmark())
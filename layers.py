@@ -0,0 +1,105 @@
+BASE = ''  # 基础图层：没有 layer 字段的按钮，始终显示
+MODES = ('switch', 'toggle', 'hold')
+MODE_NAMES = {'switch': "切换到", 'toggle': "开关", 'hold': "按住"}
+
+
+def layer_of(config):
+    return config.get('layer') or BASE
+
+
+def parse_layer_action(config):
+    """返回 (mode, layer)，按钮没有图层动作时返回 None；格式错误抛出 ValueError"""
+    action = config.get('layer_action')
+    if not action: return None
+    mode = action.get('mode')
+    if mode not in MODES: raise ValueError(f"未知的图层动作: {mode}")
+    return mode, action.get('layer') or BASE
+
+
+class LayerManager:
+    """配置内的图层
+
+    加载配置时所有图层的按钮都已创建，切换图层只对变化的图层调用 setVisible，
+    不创建、不销毁任何控件。可见图层 = 基础图层 + 已打开的图层 + 正在按住的图层。
+    suspend() 临时隐藏全部按钮（空闲收起），期间图层照常切换，resume() 时只显示届时可见的图层。
+    """
+
+    def __init__(self):
+        self._widgets = {}  # layer -> [widget]
+        self._shown = set()  # 当前实际可见的非基础图层
+        self.active = set()  # 通过 switch / toggle 打开的图层
+        self._held = {}  # 按住中的按钮 key -> layer
+        self.on_change = None  # 可见图层变化时回调 on_change(visible_layers)
+        self.suspended = False
+
+    def clear(self):
+        """清空控件（重建按钮时调用），保留当前打开的图层"""
+        self._widgets.clear(); self._held.clear(); self._shown = set()
+
+    def reset(self):
+        """切换配置时调用：回到只显示基础图层"""
+        self.clear(); self.active.clear()
+
+    def add(self, widget, layer):
+        self._widgets.setdefault(layer, []).append(widget)
+        visible = layer == BASE or layer in self.active
+        if visible and layer != BASE: self._shown.add(layer)
+        if self.suspended: visible = False
+        if not visible:
+            # 隐藏的按钮也提前完成样式计算和原生窗口创建，第一次切换时不再有这部分开销
+            widget.ensurePolished(); widget.winId()
+        widget.setVisible(visible)
+
+    def remove(self, widget, layer):
+        """单个按钮被删除（同步更新配置时只重建变化的按钮）"""
+        widgets = self._widgets.get(layer)
+        if widgets is None or widget not in widgets: return
+        widgets.remove(widget)
+        if not widgets: del self._widgets[layer]; self._shown.discard(layer)
+
+    def layers(self):
+        return sorted(name for name in self._widgets if name != BASE)
+
+    def visible_layers(self):
+        return self.active | set(self._held.values())
+
+    def is_visible(self, layer):
+        return layer == BASE or layer in self._shown
+
+    def switch(self, layer):
+        self.active = {layer} if layer != BASE else set(); self._apply()
+
+    def toggle(self, layer):
+        if layer == BASE: return
+        self.active ^= {layer}; self._apply()
+
+    def hold(self, key, layer):
+        if layer == BASE: return
+        self._held[key] = layer; self._apply()
+
+    def release(self, key):
+        if self._held.pop(key, None) is not None: self._apply()
+
+    def suspend(self):
+        if self.suspended: return
+        self.suspended = True
+        self._set_visible(self._shown | {BASE}, False)
+
+    def resume(self):
+        if not self.suspended: return
+        self.suspended = False
+        self._set_visible(self._shown | {BASE}, True)
+
+    def _set_visible(self, names, visible):
+        for name in names:
+            for w in self._widgets.get(name, ()): w.setVisible(visible)
+
+    def _apply(self):
+        # 只处理可见性发生变化的图层；收起期间只记录状态
+        shown = self.visible_layers() & set(self._widgets)
+        if not self.suspended:
+            self._set_visible(shown - self._shown, True)
+            self._set_visible(self._shown - shown, False)
+        changed = shown != self._shown
+        self._shown = shown
+        if changed and self.on_change: self.on_change(shown)
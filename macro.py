@@ -0,0 +1,200 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+# 编译后的操作码
+OP_CHORD, OP_TEXT, OP_DELAY, OP_PRESS, OP_RELEASE = range(5)
+
+MAX_OPS = 10000  # 展开 repeat 后的操作数上限，防止配置写错导致内存爆炸
+
+
+class MacroError(ValueError):
+    pass
+
+
+def _split_steps(text):
+    """按 ';' 分割步骤，括号内的分号不分割"""
+    steps, depth, buf = [], 0, []
+    for ch in text:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth < 0: raise MacroError("括号不匹配")
+        if ch == ';' and depth == 0:
+            steps.append(''.join(buf)); buf = []
+        else: buf.append(ch)
+    if depth: raise MacroError("括号不匹配")
+    steps.append(''.join(buf))
+    return [s.strip() for s in steps if s.strip()]
+
+
+def _parse_ms(word, step):
+    try: ms = float(word)
+    except ValueError: raise MacroError(f"无效的时长: {step}")
+    if ms < 0: raise MacroError(f"时长不能为负: {step}")
+    return ms / 1000.0
+
+
+def _compile_steps(text, out):
+    for step in _split_steps(text):
+        head, _, rest = step.partition(' ')
+        head = head.lower(); rest = rest.strip()
+        if head in ('wait', 'delay'):
+            out.append((OP_DELAY, _parse_ms(rest, step)))
+        elif head == 'type':
+            if not rest: raise MacroError(f"type 缺少文本: {step}")
+            out.append((OP_TEXT, rest))
+        elif head == 'hold':
+            keys, _, ms = rest.rpartition(' ')
+            if not keys: raise MacroError(f"hold 格式应为 'hold 按键 毫秒': {step}")
+            out += [(OP_PRESS, keys.strip()), (OP_DELAY, _parse_ms(ms, step)), (OP_RELEASE, keys.strip())]
+        elif head == 'repeat':
+            count, _, body = rest.partition(' ')
+            body = body.strip()
+            if not count.isdigit(): raise MacroError(f"repeat 次数无效: {step}")
+            if body.startswith('(') and body.endswith(')'): body = body[1:-1]
+            inner = []
+            _compile_steps(body, inner)
+            if len(out) + len(inner) * int(count) > MAX_OPS: raise MacroError("宏过长")
+            out += inner * int(count)
+        else:
+            out.append((OP_CHORD, step))
+        if len(out) > MAX_OPS: raise MacroError("宏过长")
+
+
+def compile_macro(text):
+    """把宏文本编译为操作元组，例如:
+
+        "f1; wait 300; volume up; hold shift 200; type hello; repeat 3 (right; wait 50)"
+
+    步骤以 ';' 分隔：普通步骤为按键组合，wait/delay 为毫秒延时，type 输入文本，
+    hold 按住指定毫秒，repeat N (...) 重复一组步骤。格式错误抛出 MacroError。
+    """
+    out = []
+    _compile_steps(text or '', out)
+    return tuple(out)
+
+
+class _Job:
+    __slots__ = ('key', 'ops', 'pc', 'due', 'cancelled', 'held')
+
+    def __init__(self, key, ops, due):
+        self.key = key; self.ops = ops; self.pc = 0; self.due = due
+        self.cancelled = False; self.held = []
+
+
+class MacroScheduler:
+    """宏调度线程
+
+    所有宏在同一个后台线程中按时间表推进，GUI 线程只负责提交。延时以计划时间为基准
+    （不累积误差），等待时先睡眠、最后约 1.5ms 自旋，以获得亚毫秒级精度。
+    injector 为 input_backend 中的注入后端（提供 send / press / release / write）。
+    """
+
+    SPIN_MARGIN = 0.0015
+
+    def __init__(self, injector):
+        self.injector = injector
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._running = {}  # key -> _Job
+        self._lateness = deque(maxlen=2000)  # (请求延时, 实际延迟误差) 秒
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="MacroScheduler", daemon=True)
+        self._thread.start()
+
+    def toggle(self, key, ops):
+        """启动宏；同一按键的宏正在运行时则取消它。返回 True 表示已启动"""
+        with self._cond:
+            job = self._running.pop(key, None)
+            if job:
+                self._cancel(job); return False
+            job = _Job(key, ops, time.perf_counter())
+            self._running[key] = job
+            heapq.heappush(self._heap, (job.due, next(self._seq), job))
+            self._cond.notify()
+            return True
+
+    def _cancel(self, job):
+        # 立即排入一次执行以尽快松开按住的键；堆里原有的条目到期后会被忽略
+        job.cancelled = True
+        heapq.heappush(self._heap, (time.perf_counter(), next(self._seq), job))
+        self._cond.notify()
+
+    def is_running(self, key):
+        return key in self._running
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            for job in list(self._running.values()): self._cancel(job)
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
+
+    def timing_report(self):
+        """返回延时精度统计（毫秒）：请求总延时、实际误差的平均值 / p99 / 最大值"""
+        samples = list(self._lateness)
+        if not samples: return {'count': 0}
+        errors = sorted(abs(e) * 1000 for _, e in samples)
+        return {
+            'count': len(samples),
+            'requested_ms': round(sum(r for r, _ in samples) * 1000, 3),
+            'mean_error_ms': round(sum(errors) / len(errors), 4),
+            'p99_error_ms': round(errors[min(len(errors) - 1, int(len(errors) * 0.99))], 4),
+            'max_error_ms': round(errors[-1], 4),
+        }
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._heap: self._cond.wait()
+                if self._stopped:
+                    pending, self._heap = self._heap, []
+                    break
+                due, _, job = self._heap[0]
+                remaining = due - time.perf_counter()
+                if remaining > self.SPIN_MARGIN and not job.cancelled:
+                    self._cond.wait(remaining - self.SPIN_MARGIN)
+                    continue  # 可能有更早的任务插入，重新检查堆顶
+                heapq.heappop(self._heap)
+            while time.perf_counter() < due and not job.cancelled: pass  # 最后一小段自旋
+            self._step(job)
+        for _, _, job in pending: self._finish(job)
+
+    def _step(self, job):
+        """执行到下一个延时为止，然后把任务放回时间表"""
+        if job.cancelled:
+            self._finish(job); return
+        if job.pc and job.ops[job.pc - 1][0] == OP_DELAY:
+            self._lateness.append((job.ops[job.pc - 1][1], time.perf_counter() - job.due))
+        ops = job.ops; inj = self.injector
+        try:
+            while job.pc < len(ops):
+                op, arg = ops[job.pc]; job.pc += 1
+                if op == OP_DELAY:
+                    job.due += arg
+                    with self._cond:
+                        if job.cancelled: break
+                        heapq.heappush(self._heap, (job.due, next(self._seq), job))
+                    return
+                if op == OP_CHORD: inj.send(arg)
+                elif op == OP_TEXT: inj.write(arg)
+                elif op == OP_PRESS: inj.press(arg); job.held.append(arg)
+                elif op == OP_RELEASE:
+                    inj.release(arg)
+                    if arg in job.held: job.held.remove(arg)
+        except Exception as e: print(f"宏执行错误: {e}")
+        self._finish(job)
+
+    def _finish(self, job):
+        # 取消时松开仍按住的键，避免卡键
+        for keys in reversed(job.held):
+            try: self.injector.release(keys)
+            except Exception: pass
+        job.held.clear()
+        with self._cond:
+            if self._running.get(job.key) is job: del self._running[job.key]
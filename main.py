@@ -1,28 +1,57 @@
+from startup_timeline import timeline
 import sys, os
 import json
-import keyboard
 import shutil
 import copy
+import time
+import threading
 from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction
 from PyQt5.QtGui import QIcon, QColor
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QTimer, Qt
 from button import DraggableButton
-from settings_window import SettingsDialog, THEMES
+from joystick import JoystickButton
+from profile_cache import ProfileCache
+from profile_hotkeys import ProfileHotkeys
+from macro import MacroScheduler
+from profile_compiler import compile_profile, compile_button, normalize_button, resolve_shortcut, upgrade_profile
+from input_backend import create_backend
+from tap_queue import TapDispatcher, POLICIES
+from tap_classifier import IDLE
+from spatial_index import SpatialIndex
+from layers import LayerManager, layer_of
+from profile_store import ProfileStore, describe_version
+from usage_stats import UsageStats
+from idle_manager import IdleManager
+from control_server import ControlServer, send_commands, add_arguments, commands_from_args
+timeline.mark("导入完成")
 
 class TouchButtonApp:
-    def __init__(self):
+    def __init__(self, args=None):
         self.app = QApplication(sys.argv)
         self.app.setQuitOnLastWindowClosed(False)
-        
-        # 应用全局样式表 (美化托盘菜单)
-        self.apply_global_styles()
+        timeline.mark("QApplication")
+
+        # 已有实例在运行时把命令转发给它后退出，不再叠加第二层悬浮按钮
+        self.startup_commands = commands_from_args(args) if args else []
+        if not (args and args.new_instance):
+            replies = send_commands(self.startup_commands or [{'cmd': 'activate'}], timeout_ms=2000)
+            if replies is not None:
+                for reply in replies:
+                    if not reply.get('ok') or reply.get('result') not in (None, True): print(json.dumps(reply, ensure_ascii=False))
+                sys.exit(0 if all(r.get('ok') for r in replies) else 1)
+        self.control = ControlServer(self.control_handlers())
+        self.control.start()
 
         if getattr(sys, 'frozen', False):
             self.base_dir = os.path.dirname(sys.executable)
         else:
             self.base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.profiler = None  # 按需性能采集，首次使用时才导入
+        if os.environ.get('TMB_PROFILE'):  # 从启动开始采集 N 秒
+            try: self.start_profile(float(os.environ['TMB_PROFILE']))
+            except ValueError: print(f"忽略无效的 TMB_PROFILE: {os.environ['TMB_PROFILE']!r}")
             
-        self.config_dir = os.path.join(self.base_dir, 'config')
+        self.config_dir = os.environ.get('TMB_CONFIG_DIR') or os.path.join(self.base_dir, 'config')  # 回放 / 测试时指向临时目录
         if not os.path.exists(self.config_dir):
             os.makedirs(self.config_dir)
             
@@ -34,14 +63,335 @@ class TouchButtonApp:
                 shutil.move(old_config_path, os.path.join(self.config_dir, 'old_config_backup.json'))
 
         self.prefs_file = os.path.join(self.config_dir, 'preferences.json')
+        self.prefs = self.load_prefs()
+        self.backend = create_backend(self.prefs.get('input_backend'))  # 也可用环境变量 TMB_INPUT_BACKEND 指定
+        queue_prefs = self.prefs.get('tap_queue') or {}
+        policy, capacity = queue_prefs.get('policy', 'drop_oldest'), queue_prefs.get('capacity', 8)
+        if policy not in POLICIES: print(f"未知的队列策略 {policy!r}，使用 drop_oldest"); policy = 'drop_oldest'
+        if not isinstance(capacity, int) or isinstance(capacity, bool): print(f"无效的队列容量 {capacity!r}，使用 8"); capacity = 8
+        self.dispatcher = TapDispatcher(self.backend, capacity, policy)
         self.current_config_file = self.get_last_config_file()
+        self.profiles = ProfileCache(self.config_dir)
+        # 每次加载 / 保存都记录历史版本（profile_store.py），内容没变时不写任何文件
+        history_prefs = self.prefs.get('history') or {}
+        self.history = ProfileStore(self.config_dir, history_prefs.get('keep', 50), history_prefs.get('days', 30),
+                                    history_prefs.get('coalesce_s', 60)) if history_prefs.get('enabled', True) else None
         self.buttons = []
+        self.button_map = {}  # id -> DraggableButton
+        self.spatial = SpatialIndex()  # 当前配置所有按钮矩形，用于吸附和命中测试
+        self.layers = LayerManager()  # 配置内的图层，切换只改可见性
+        self.macro_scheduler = None  # 首次运行宏时才启动调度线程
+        self.profile_issues = []  # 最近一次编译配置发现的问题（profile_compiler.py）
+        self.recorder = None  # 触摸会话录制（session_recorder.py），首次录制时才创建
+        # 拖动时位置变化很频繁：复用同一个单次定时器，停下 100ms 后保存一次
+        self.save_timer = QTimer(); self.save_timer.setSingleShot(True); self.save_timer.setInterval(100)
+        self.save_timer.timeout.connect(self.save_config)
+        self.prefs_timer = QTimer(); self.prefs_timer.setSingleShot(True); self.prefs_timer.setInterval(500)  # 空闲小圆点拖动时同样合并保存
+        self.prefs_timer.timeout.connect(self.save_prefs)
+        # 切换配置、关闭设置窗口会一次释放大量窗口缓冲，稍后把空闲堆内存还给系统（见 resource_monitor.trim_heap）
+        self.trim_timer = QTimer(); self.trim_timer.setSingleShot(True); self.trim_timer.setInterval(2000)
+        self.trim_timer.timeout.connect(self.trim_memory)
+        # 按钮使用统计（usage_stats.py）：按钮只累加内存中的计数，定期批量写盘
+        usage_prefs = self.prefs.get('usage') or {}
+        self.usage = UsageStats(self.config_dir) if usage_prefs.get('enabled', True) else None
+        self.usage_timer = QTimer(); self.usage_timer.setTimerType(Qt.VeryCoarseTimer); self.usage_timer.setInterval(int(usage_prefs.get('flush_s', 60) * 1000))
+        self.usage_timer.timeout.connect(self.flush_usage)
+        # 配置同步（profile_sync.py）：后台线程联网，回到界面线程合并、只更新变化的按钮
+        sync_prefs = self.prefs.get('sync') or {}
+        self.sync = None; self.sync_status = None; self._sync_thread = None; self._sync_result = None; self._sync_pending = None
+        if sync_prefs.get('server') and sync_prefs.get('enabled', True):
+            from profile_sync import SyncClient, KEEP_LOCAL  # 没有配置服务器时不导入网络模块
+            self.sync = SyncClient(self.config_dir, sync_prefs['server'], sync_prefs.get('keep_local', KEEP_LOCAL))
+        self.sync_timer = QTimer(); self.sync_timer.setTimerType(Qt.VeryCoarseTimer); self.sync_timer.setInterval(int(sync_prefs.get('interval_s', 300) * 1000))
+        self.sync_timer.timeout.connect(self.start_sync)
+        self.sync_poll = QTimer(); self.sync_poll.setSingleShot(True); self.sync_poll.setInterval(100)  # 只在联网期间检查是否完成
+        self.sync_poll.timeout.connect(self.check_sync)
+        self.sync_retry = QTimer(); self.sync_retry.setSingleShot(True); self.sync_retry.setInterval(500)  # 暂时不能应用时稍后再试
+        self.sync_retry.timeout.connect(self.apply_sync)
+        # 空闲省电（idle_manager.py）：按钮建好前创建，新按钮才能接上触摸信号；是否启用在托盘就绪后决定
+        idle_prefs = self.prefs.get('idle') or {}
+        self.idle = IdleManager(lambda: self.buttons, self.layers, idle_prefs.get('timeout_s', 300) * 1000, idle_prefs.get('mode', 'fade'),
+                                idle_prefs.get('opacity', 0.2), idle_prefs.get('handle_position'))
+        
+        self.tray = None
         
+        # 先让按钮出现，样式表、托盘、热键等放到第一帧之后
         self.load_config()
+        timeline.mark("按钮已显示")
+        QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        timeline.mark("第一帧")
+        # 应用全局样式表 (美化托盘菜单)
+        self.apply_global_styles()
         self.tray = self.create_tray_icon()
+        timeline.mark("托盘就绪")
+        self.setup_profile_hotkeys()
+        self.setup_auto_switch()
+        self.setup_idle()
+        if self.usage: self.usage_timer.start()
+        if self.sync: self.sync_timer.start(); self.start_sync()
+        self.backend.warm()
+        timeline.mark("输入后端就绪")
+        if os.environ.get('TMB_STARTUP_TIMELINE'): print(timeline.report())
+        # 没有运行中的实例时，命令行参数由本实例在启动后执行
+        for command in self.startup_commands:
+            reply = self.control.execute(command)
+            if not reply['ok'] or reply.get('result') not in (None, True): print(json.dumps(reply, ensure_ascii=False))
+
+    # --- 本地控制端点（control_server.py）的命令 ---
+    def control_handlers(self):
+        return {
+            'ping': lambda r: 'pong',
+            'activate': self.on_second_launch,
+            'trigger': self.ipc_trigger,
+            'press': lambda r: self.backend.press(resolve_shortcut(r['keys'])),
+            'release': lambda r: self.backend.release(resolve_shortcut(r['keys'])),
+            'tap': lambda r: self.dispatcher.submit(r.get('button', 'ipc'), resolve_shortcut(r['keys'])),
+            'switch': self.ipc_switch,
+            'reload': self.ipc_reload,
+            'layer': self.ipc_layer,
+            'settings': lambda r: QTimer.singleShot(0, self.show_settings) if not getattr(self, 'settings_open', False) else None,
+            'metrics': lambda r: self.metrics(),
+            'profile': self.ipc_profile,
+            'resources': self.ipc_resources,
+            'soak': self.ipc_soak,
+            'idle': self.ipc_idle,
+            'history': self.ipc_history,
+            'usage': self.ipc_usage,
+            'record': lambda r: self.start_recording() if r.get('state', 'start') == 'start' else self.stop_recording(),
+            'sync': self.ipc_sync,
+        }
+
+    def on_second_launch(self, request):
+        if self.tray: self.tray.showMessage("TouchButton", "已经在运行", QSystemTrayIcon.Information, 1500)
+
+    def require_settings_closed(self, action):
+        # 设置窗口直接编辑 self.config（与配置缓存共享）：打开期间不能重建按钮或切换配置，取消时 rewind 才能还原
+        if getattr(self, 'settings_open', False): raise RuntimeError(f"设置窗口打开时不能{action}")
+
+    def ipc_trigger(self, request):
+        # 与点击按钮相同（热键 / 宏 / 图层动作）；也可用按钮名称查找
+        self.require_settings_closed("触发按钮")
+        key = request['button']
+        button = self.button_map.get(key) or next((b for b in self.buttons if b.config.get('label') == key), None)
+        if button is None: raise KeyError(f"没有该按钮: {key}")
+        button.clicked.emit(button.config['id'])
+        return button.config['id']
+
+    def ipc_switch(self, request):
+        self.require_settings_closed("切换配置")
+        filename = request['profile']
+        if filename not in self.list_config_files(): raise FileNotFoundError(filename)
+        self.switch_config(filename)
+        return self.current_config_file
+
+    def ipc_reload(self, request):
+        self.require_settings_closed("重新加载配置")
+        self.load_config(self.current_config_file)
+        return len(self.buttons)
+
+    def ipc_layer(self, request):
+        self.require_settings_closed("切换图层")
+        mode, layer = request.get('mode', 'switch'), request.get('layer') or ''
+        if mode == 'toggle': self.layers.toggle(layer)
+        elif mode == 'switch': self.layers.switch(layer)
+        else: raise ValueError(f"不支持的图层动作: {mode}")
+        return sorted(self.layers.visible_layers())
+
+    def ipc_profile(self, request):
+        if request.get('stop'): return self.finish_profile()
+        result = self.start_profile(float(request.get('seconds', 10)))
+        if not result: raise RuntimeError("已经在采集中")
+        return result
+
+    def ipc_resources(self, request):
+        from resource_monitor import snapshot, flush_deleted
+        if request.get('flush', True): flush_deleted()
+        return snapshot()
+
+    def ipc_soak(self, request):
+        # 浸泡测试会阻塞事件循环直到结束，只用于诊断
+        self.require_settings_closed("运行浸泡测试")
+        from resource_monitor import soak
+        return soak(self, int(request.get('cycles', 1000)), int(request.get('dialog_every', 10)))
+
+    def ipc_history(self, request):
+        # 不带 version 时列出版本，带 version 时还原到该版本
+        if self.history is None: raise RuntimeError("历史版本未启用")
+        filename = request.get('profile') or self.current_config_file
+        if request.get('version'): self.restore_version(filename, request['version']); return self.current_config_file
+        return self.history.versions(filename)
+
+    def ipc_usage(self, request):
+        # 当前配置每个按钮的统计；带 export 时导出为 CSV，带 reset 时清零
+        if self.usage is None: raise RuntimeError("使用统计未启用")
+        if request.get('reset'): self.usage.reset(self.current_config_file); return None
+        if request.get('export'): return self.usage.export_csv(request['export'], self.current_config_file, self.config['buttons'])
+        return self.usage.rows(self.current_config_file, self.config['buttons'])
+
+    def flush_usage(self):
+        if self.usage: self.usage.flush()
+
+    def ipc_sync(self, request):
+        # 立即开始一次同步（后台进行），返回上一次同步的结果
+        if self.sync is None: raise RuntimeError("没有配置同步服务器（preferences.json 的 sync.server）")
+        return {'started': self.start_sync(), 'last': self.sync_status, 'client': self.sync.stats()}
+
+    def start_sync(self):
+        # 还有结果等着应用时不再拉取：否则旧结果可能晚于新结果写入
+        if self.sync is None or self._sync_pending is not None or (self._sync_thread and self._sync_thread.is_alive()): return False
+        def run():
+            try: self._sync_result = self.sync.fetch()
+            except Exception as e: self._sync_result = e
+        self._sync_result = None
+        self._sync_thread = threading.Thread(target=run, name="ProfileSync", daemon=True); self._sync_thread.start()
+        self.sync_poll.start()
+        return True
+
+    def check_sync(self):
+        if self._sync_thread.is_alive(): self.sync_poll.start(); return
+        result, self._sync_result = self._sync_result, None
+        if isinstance(result, Exception):
+            print(f"同步配置失败: {result}"); self.sync_status = {'time': time.time(), 'error': str(result)}; return
+        self.apply_sync(result)
+
+    def apply_sync(self, result=None):
+        # 设置窗口打开或手指正按在按钮上时稍后再应用；合并用的是届时内存中最新的配置（含未保存的拖动）
+        if result is not None: self._sync_pending = result
+        if self._sync_pending is None: return
+        if getattr(self, 'settings_open', False) or any(b.tap.state != IDLE or getattr(b, 'tracking', False) for b in self.buttons):
+            self.sync_retry.start(); return
+        result, self._sync_pending = self._sync_pending, None
+        t = time.perf_counter(); applied, conflicts, failed = [], [], False
+        for name, remote_hash, remote in result['updates']:
+            current = name == self.current_config_file
+            local = dict(self.config, buttons=[b.config for b in self.buttons]) if current else None
+            try: merged, report = self.sync.apply(name, remote_hash, remote, local)
+            except Exception as e: print(f"应用同步的配置失败 {name}: {e}"); failed = True; continue
+            conflicts += [[name] + c for c in report['conflicts']]
+            if current:
+                self.save_timer.stop()  # 拖动中未保存的位置已经合并写入
+                self.apply_profile_changes(merged, report); self.snapshot_profile('sync')
+            elif self.history:
+                try: self.history.snapshot(name, merged, 'sync')
+                except Exception as e: print(f"记录历史版本失败: {e}")
+            applied.append(name)
+        for name in result['removed']: self.sync.forget(name)
+        try: self.sync.commit(None if failed else result['etag'])  # 有失败的配置时下次重新比较
+        except OSError as e: print(f"保存同步状态失败: {e}")
+        self.sync_status = {'time': time.time(), 'updated': applied, 'removed': result['removed'], 'conflicts': conflicts,
+                            'bytes': result['bytes'], 'requests': result['requests'], 'apply_ms': round((time.perf_counter() - t) * 1000, 2)}
+        if applied and self.tray: self.tray.showMessage("TouchButton", f"已同步配置: {', '.join(applied)}", QSystemTrayIcon.Information, 1500)
+
+    def apply_profile_changes(self, config, report):
+        """同步合并后的当前配置：只重建变化的按钮，只改了位置 / 尺寸的直接移动，其余按钮和当前图层不受影响"""
+        issues = []
+        by_id = {b.get('id'): (i, b) for i, b in enumerate(config['buttons'])}
+        for button_id in report['removed']: self.remove_button(button_id)
+        for button_id in list(report['changed']) + report['added']:
+            index, new = by_id[button_id]
+            normalize_button(new, index, issues=issues)
+            button = self.button_map.get(button_id)
+            if button is not None and set(report['changed'].get(button_id, ())) <= {'position', 'size'}:
+                button.config = new; button.setGeometry(*new['position'], *new['size'])
+                self.spatial.update(button_id, *new['position'], *new['size'])
+                continue
+            self.remove_button(button_id)
+            self.create_single_button(compile_button(new, index, issues))
+        order = {b.get('id'): i for i, b in enumerate(config['buttons'])}
+        self.buttons.sort(key=lambda b: order.get(b.config['id'], len(order)))
+        config['buttons'] = [b.config for b in self.buttons]
+        self.config = config
+        self.profiles.put(self.current_config_file, config)
+        if issues: self.report_profile_issues(issues)
+        if self.recorder and self.recorder.active: self.recorder.profile_changed(self.current_config_file, self.config)
+
+    def remove_button(self, button_id):
+        button = self.button_map.pop(button_id, None)
+        if button is None: return
+        button.hide(); button.deleteLater()  # 先隐藏，摇杆会松开按住的键
+        self.buttons.remove(button); self.spatial.remove(button_id)
+        self.layers.release(button_id)  # 正按住的图层按钮
+        self.layers.remove(button, layer_of(button.config))
+
+    def ipc_idle(self, request):
+        state = request.get('state')
+        if state == 'enter': self.idle.enter_idle()
+        elif state == 'wake': self.idle.activity()
+        elif state is not None: raise ValueError(f"不支持的空闲状态: {state}")
+        return self.idle.stats()
+
+    def trim_memory(self):
+        from resource_monitor import trim_heap
+        trim_heap()
+
+    def show_resources(self):
+        from resource_monitor import snapshot, summary, flush_deleted
+        flush_deleted()
+        data = summary(snapshot())
+        print(json.dumps(data, ensure_ascii=False))
+        self.tray.showMessage("TouchButton", "\n".join(f"{k}: {v}" for k, v in data.items()), QSystemTrayIcon.Information, 5000)
+
+    def metrics(self):
+        return {
+            'profile': self.current_config_file,
+            'buttons': len(self.buttons),
+            'profile_issues': [str(issue) for issue in self.profile_issues],
+            'visible_layers': sorted(self.layers.visible_layers()),
+            'tap_queue': self.dispatcher.stats(),
+            'macro_timing': self.macro_scheduler.timing_report() if self.macro_scheduler else None,
+            'control': self.control.stats(),
+            'idle': self.idle.stats(),
+            'startup_ms': timeline.as_dict(),
+        }
+
+    # --- 性能采集（profiler.py）---
+    def start_profile(self, seconds=10):
+        # 已经在采集时返回 False：托盘菜单直接连接到这里，槽函数里抛出异常会让 PyQt5 终止进程
+        if self.profiler is None:
+            from profiler import ProfileCapture
+            self.profiler = ProfileCapture(os.path.join(self.base_dir, 'diagnostics'))
+        if not self.profiler.start():
+            if getattr(self, 'tray', None): self.tray.showMessage("TouchButton", "已经在进行性能采集", QSystemTrayIcon.Information, 1500)
+            return False
+        started = self.profiler.started_at  # 提前停止后再开始新的采集时，旧的定时器不应结束新的采集
+        QTimer.singleShot(int(seconds * 1000), lambda: self.finish_profile() if self.profiler.started_at == started else None)
+        if getattr(self, 'tray', None): self.tray.showMessage("TouchButton", f"开始性能采集（{seconds:g} 秒）", QSystemTrayIcon.Information, 1500)
+        return {'seconds': seconds}
+
+    def finish_profile(self):
+        if not (self.profiler and self.profiler.active): return None  # 已经提前停止
+        result = self.profiler.stop()
+        print(f"性能采集已保存: {result['pstats']}")
+        if getattr(self, 'tray', None): self.tray.showMessage("TouchButton", f"性能采集已保存到 diagnostics\n{os.path.basename(result['pstats'])}", QSystemTrayIcon.Information, 3000)
+        return result
+
+    # --- 触摸会话录制（session_recorder.py，回放见 replay.py）---
+    def start_recording(self):
+        if self.recorder is None:
+            from session_recorder import SessionRecorder
+            self.recorder = SessionRecorder(os.path.join(self.base_dir, 'diagnostics'))
+        path = self.recorder.start(self.current_config_file, self.config, self.buttons)
+        if getattr(self, 'record_action', None): self.record_action.setChecked(True)
+        if getattr(self, 'tray', None): self.tray.showMessage("TouchButton", "开始录制触摸会话", QSystemTrayIcon.Information, 1500)
+        return {'path': path}
+
+    def stop_recording(self):
+        result = self.recorder.stop() if self.recorder else None
+        if getattr(self, 'record_action', None): self.record_action.setChecked(False)
+        if result:
+            print(f"触摸会话已保存: {result['path']}")
+            if getattr(self, 'tray', None): self.tray.showMessage("TouchButton", f"触摸会话已保存到 diagnostics（{result['events']} 个事件）\n{os.path.basename(result['path'])}", QSystemTrayIcon.Information, 3000)
+        return result
+
+    def show_startup_timeline(self):
+        print(timeline.report())
+        self.tray.showMessage("TouchButton", timeline.report(), QSystemTrayIcon.Information, 5000)
 
     def apply_global_styles(self):
         # 使用深色主题作为托盘菜单的默认配色
+        from theme import THEMES
         thm = THEMES["深色 (Dark)"]
         
         # 增加 font-size 到 16px，增加 padding-right 改善对齐
@@ -89,22 +439,100 @@ class TouchButtonApp:
         """
         self.app.setStyleSheet(css)
 
-    def get_last_config_file(self):
+    def load_prefs(self):
         if os.path.exists(self.prefs_file):
             try:
-                with open(self.prefs_file, 'r') as f:
-                    data = json.load(f)
-                    last = data.get('last_config')
-                    if last and os.path.exists(os.path.join(self.config_dir, last)):
-                        return last
+                with open(self.prefs_file, 'r', encoding='utf-8') as f: return json.load(f)
             except: pass
+        return {}
+
+    def get_last_config_file(self):
+        last = self.prefs.get('last_config')
+        if last and os.path.exists(os.path.join(self.config_dir, last)):
+            return last
         return 'default.json'
 
     def save_prefs(self):
+        self.prefs['last_config'] = self.current_config_file
         try:
-            with open(self.prefs_file, 'w') as f: json.dump({'last_config': self.current_config_file}, f)
+            with open(self.prefs_file, 'w', encoding='utf-8') as f: json.dump(self.prefs, f, ensure_ascii=False)
         except Exception as e: print(f"Failed to save prefs: {e}")
 
+    def setup_profile_hotkeys(self):
+        # preferences.json 中的 "profile_hotkeys"，未配置时不安装任何钩子
+        bindings = self.prefs.get('profile_hotkeys')
+        if not bindings: return
+        self.profile_hotkeys = ProfileHotkeys(bindings)
+        self.profile_hotkeys.triggered.connect(self.on_profile_hotkey)
+        self.profile_hotkeys.install()
+        # 空闲时预解析全部配置，热键切换时直接命中缓存
+        QTimer.singleShot(0, lambda: self.profiles.warm(self.list_config_files()))
+
+    def setup_auto_switch(self):
+        # preferences.json 中的 "auto_switch"，没有规则时不启动监视器
+        prefs = self.prefs.get('auto_switch') or {}
+        rules = prefs.get('rules')
+        if not rules: return
+        from window_monitor import WindowMonitor, create_provider
+        provider = create_provider(prefs.get('provider'), watch_titles=any(r.get('title') for r in rules if isinstance(r, dict)), poll_ms=prefs.get('poll_ms', 1000))
+        self.window_monitor = WindowMonitor(rules, provider, prefs.get('debounce_ms', 400), prefs.get('fallback'))
+        self.window_monitor.current = self.current_config_file
+        self.window_monitor.profileRequested.connect(self.on_auto_switch)
+        menu = self.tray.contextMenu()
+        self.auto_switch_action = QAction("按程序自动切换配置", menu)
+        self.auto_switch_action.setCheckable(True); self.auto_switch_action.setChecked(prefs.get('enabled', True))
+        self.auto_switch_action.toggled.connect(lambda on: (self.set_auto_switch(on), self.save_prefs()))
+        menu.insertAction(self.lock_action, self.auto_switch_action)
+        self.set_auto_switch(self.auto_switch_action.isChecked())
+        # 空闲时预解析全部配置，自动切换时直接命中缓存
+        QTimer.singleShot(0, lambda: self.profiles.warm(self.list_config_files()))
+
+    def setup_idle(self):
+        # preferences.json 中的 "idle"：{"enabled", "timeout_s", "mode": "fade" | "handle", "opacity", "handle_position"}
+        prefs = self.prefs.get('idle') or {}
+        self.idle.on_handle_moved = lambda pos: (self.prefs.setdefault('idle', {}).update(handle_position=pos), self.prefs_timer.start())
+        # 空闲前把还在等待的保存 / 内存整理立即做完，空闲期间不留任何定时器
+        self.idle.register(lambda: self.save_timer.isActive() and (self.save_timer.stop(), self.save_config()), lambda: None)
+        self.idle.register(lambda: self.trim_timer.isActive() and (self.trim_timer.stop(), self.trim_memory()), lambda: None)
+        if hasattr(self, 'window_monitor'): self.idle.register(self.window_monitor.pause, self.window_monitor.resume)
+        if self.sync:
+            self.idle.register(self.sync_timer.stop, self.sync_timer.start)
+            self.idle.register(self.sync_retry.stop, lambda: self._sync_pending is not None and self.sync_retry.start())
+        if self.usage: self.idle.register(lambda: (self.usage_timer.stop(), self.flush_usage()), self.usage_timer.start)
+        menu = self.tray.contextMenu()
+        self.idle_action = QAction("空闲省电", menu)
+        self.idle_action.setCheckable(True); self.idle_action.setChecked(prefs.get('enabled', False))
+        self.idle_action.toggled.connect(lambda on: (self.idle.set_enabled(on), self.prefs.setdefault('idle', {}).update(enabled=on), self.save_prefs()))
+        menu.insertAction(self.lock_action, self.idle_action)
+        self.idle.set_enabled(self.idle_action.isChecked())
+
+    def set_auto_switch(self, enabled):
+        self.prefs.setdefault('auto_switch', {})['enabled'] = enabled
+        if not enabled: self.window_monitor.stop(); return
+        if not self.window_monitor.start(): print("前台窗口监视不可用，自动切换配置未启用")
+
+    def on_auto_switch(self, filename):
+        if getattr(self, 'settings_open', False):  # 设置窗口打开期间不切换，避免覆盖正在编辑的配置；关闭后重新判断
+            self.window_monitor.current = self.current_config_file; self.auto_switch_deferred = True; return
+        if filename in self.list_config_files(): self.switch_config(filename)
+        else: print(f"自动切换规则指向的配置不存在: {filename}")
+
+    def on_profile_hotkey(self, action):
+        if action == 'next': self.cycle_config(1)
+        elif action == 'prev': self.cycle_config(-1)
+        elif action in self.list_config_files(): self.switch_config(action)
+        else: print(f"热键指向的配置不存在: {action}")
+
+    def list_config_files(self):
+        files = sorted(f for f in os.listdir(self.config_dir) if f.endswith('.json') and f != 'preferences.json')
+        return files or ['default.json']
+
+    def cycle_config(self, step):
+        files = self.list_config_files()
+        idx = files.index(self.current_config_file) if self.current_config_file in files else -step
+        self.switch_config(files[(idx + step) % len(files)])
+        self.tray.showMessage("TouchButton", f"当前配置: {self.current_config_file}", QSystemTrayIcon.Information, 1000)
+
     def create_tray_icon(self):
         tray = QSystemTrayIcon()
         
@@ -121,6 +549,10 @@ class TouchButtonApp:
         self.config_menu = menu.addMenu("切换配置")
         self.update_config_menu()
         self.config_menu.aboutToShow.connect(self.update_config_menu)
+        if self.history:
+            self.history_menu = menu.addMenu("历史版本")
+            self.history_menu.aboutToShow.connect(self.update_history_menu)
+        if self.sync: menu.addAction("立即同步配置").triggered.connect(self.start_sync)
         menu.addSeparator()
         
         menu.addAction("管理按钮").triggered.connect(self.show_settings)
@@ -132,6 +564,12 @@ class TouchButtonApp:
         self.lock_action.triggered.connect(self.toggle_all_locks)
         
         menu.addSeparator()
+        diag_menu = menu.addMenu("诊断")
+        diag_menu.addAction("启动时间线").triggered.connect(self.show_startup_timeline)
+        diag_menu.addAction("性能采集 10 秒").triggered.connect(lambda: self.start_profile(10))
+        diag_menu.addAction("资源统计").triggered.connect(self.show_resources)
+        self.record_action = diag_menu.addAction("录制触摸会话"); self.record_action.setCheckable(True)
+        self.record_action.triggered.connect(lambda on: self.start_recording() if on else self.stop_recording())
         menu.addAction("退出").triggered.connect(self.clean_exit)
         tray.setContextMenu(menu)
         tray.show()
@@ -139,9 +577,7 @@ class TouchButtonApp:
 
     def update_config_menu(self):
         self.config_menu.clear()
-        files = [f for f in os.listdir(self.config_dir) if f.endswith('.json') and f != 'preferences.json']
-        if not files: files = ['default.json']
-        for f in files:
+        for f in self.list_config_files():
             action = self.config_menu.addAction(f)
             action.setCheckable(True)
             action.setChecked(f == self.current_config_file)
@@ -150,15 +586,41 @@ class TouchButtonApp:
         new_action = self.config_menu.addAction("新建配置...")
         new_action.triggered.connect(self.create_new_config)
 
+    def update_history_menu(self):
+        self.history_menu.clear()
+        current = set(self.list_config_files())
+        for name in self.history.profiles():
+            sub = self.history_menu.addMenu(name if name in current else f"{name}（已删除）")
+            for entry in self.history.versions(name)[:30]:
+                sub.addAction(describe_version(entry)).triggered.connect(lambda checked, n=name, v=entry['id']: self.restore_version(n, v))
+        if self.history_menu.isEmpty(): self.history_menu.addAction("（暂无）").setEnabled(False)
+
+    def restore_version(self, filename, vid):
+        if getattr(self, 'settings_open', False): return  # 设置窗口里用「历史」按钮还原
+        if self.save_timer.isActive(): self.save_timer.stop(); self.save_config()  # 先记下拖动中未保存的位置
+        try: self.history.restore(filename, vid)
+        except Exception as e: print(f"还原历史版本失败: {e}"); return
+        if filename == self.current_config_file: self.load_config(filename)
+        else: self.switch_config(filename)
+        if self.tray: self.tray.showMessage("TouchButton", f"已还原 {filename}", QSystemTrayIcon.Information, 1500)
+
+    def snapshot_profile(self, reason):
+        if self.history is None: return
+        try: self.history.snapshot(self.current_config_file, self.config, reason)
+        except Exception as e: print(f"记录历史版本失败: {e}")
+
     def switch_config(self, filename):
         if filename == self.current_config_file: return
         print(f"Switching to config: {filename}")
+        # 先把拖动中未保存的位置写盘（save_config 会更新缓存）；不直接 put 内存中的配置，以免未保存或已被外部修改的内容按新 mtime 留在缓存里
+        if self.save_timer.isActive(): self.save_timer.stop(); self.save_config()
         self.current_config_file = filename
+        if hasattr(self, 'window_monitor'): self.window_monitor.current = filename  # 手动切换后，回到对应程序时仍会自动切回
         self.save_prefs()
         self.load_config(filename)
+        self.trim_timer.start()
         
     def create_new_config(self):
-        import time
         new_name = f"config_{int(time.time())}.json"
         new_path = os.path.join(self.config_dir, new_name)
         with open(new_path, 'w') as f: json.dump({"buttons": []}, f, indent=2)
@@ -176,13 +638,16 @@ class TouchButtonApp:
 
     def load_config(self, filename=None):
         if filename: self.current_config_file = filename
-        config_path = os.path.join(self.config_dir, self.current_config_file)
         try:
-            if not os.path.exists(config_path):
+            config = self.profiles.get(self.current_config_file)
+            if config is None:
                 self.config = {"buttons": []}
                 self.save_config()
             else:
-                with open(config_path, 'r', encoding='utf-8') as f: self.config = json.load(f)
+                self.config = upgrade_profile(config)
+                self.snapshot_profile('load')  # 记下磁盘上的原样内容（外部修改过的也能找回）
+            timeline.mark_once("首个配置解析")
+            self.layers.reset()
             self.create_buttons()
             if hasattr(self, 'lock_action') and self.config['buttons']:
                 locked = self.config['buttons'][0].get('position_lock', False)
@@ -192,65 +657,168 @@ class TouchButtonApp:
             self.config = {"buttons": []}; self.create_buttons()
 
     def create_buttons(self):
-        for btn in self.buttons: btn.deleteLater() 
-        self.buttons.clear()   
-        for btn_cfg in self.config['buttons']: self.create_single_button(btn_cfg)
+        for btn in self.buttons: btn.hide(); btn.deleteLater()  # 先隐藏，摇杆会松开按住的键
+        self.buttons.clear(); self.button_map.clear(); self.spatial.clear(); self.layers.clear()
+        if self.recorder and self.recorder.active: self.recorder.profile_changed(self.current_config_file, self.config)
+        # 一次性规范化并编译整份配置：按键名、宏、样式表都在这里解析，点击时不再出错
+        plans, issues = compile_profile(self.config, supports=self.backend.supports)
+        self.report_profile_issues(issues)
+        for plan in plans: self.create_single_button(plan)
+
+    def report_profile_issues(self, issues):
+        self.profile_issues = issues
+        for issue in issues: print(f"配置{'错误' if issue.level == 'error' else '已修正'}: {issue}")
+        errors = [issue for issue in issues if issue.level == 'error']
+        if errors and self.tray:
+            self.tray.showMessage("TouchButton", f"配置中有 {len(errors)} 处错误，相关按钮已停用\n{errors[0]}", QSystemTrayIcon.Warning, 3000)
 
-    def create_single_button(self, config):
-        button = DraggableButton(config)
-        button.clicked.connect(lambda _, c=config: self.trigger_shortcut(c['shortcut']))
+    def create_single_button(self, plan):
+        config = plan.config
+        if plan.kind == 'joystick': return self.create_joystick(plan)
+        button = DraggableButton(config, stylesheet=plan.stylesheet)
+        if plan.kind == 'layer':
+            # 图层按钮不注入按键；按住模式在按下/松开时切换，不等点击判定
+            mode, layer = plan.layer_action
+            if mode == 'hold':
+                button.pressed.connect(lambda c=config, l=layer: self.layers.hold(c['id'], l))
+                button.released.connect(lambda c=config: self.layers.release(c['id']))
+            elif mode == 'toggle': button.clicked.connect(lambda _, l=layer: self.layers.toggle(l))
+            else: button.clicked.connect(lambda _, l=layer: self.layers.switch(l))
+        elif not plan.valid: pass  # 按键或宏有错误：按钮照常显示和拖动，点击不做任何事（加载时已报告）
+        elif plan.kind == 'macro':
+            button.clicked.connect(lambda _, c=config, o=plan.ops: self.run_macro(c['id'], o))  # 点击时只提交已编译的操作
+        elif plan.keys:
+            button.clicked.connect(lambda _, c=config, k=plan.keys: self.trigger_shortcut(k, c['id']))
+        if plan.valid and ('tap_queue' in config or 'tap_policy' in config):
+            self.dispatcher.configure(config['id'], config.get('tap_queue'), config.get('tap_policy'))
+        self.add_button(button)
+
+    def create_joystick(self, plan):
+        button = JoystickButton(plan.config, keys=plan.keys)
+        button.keysChanged.connect(self.on_joystick_keys)
+        self.add_button(button)
+
+    def add_button(self, button):
+        config = button.config
         button.positionChanged.connect(self.handle_position_change)
-        button.show()
+        button.snapper = self.snap_button
+        button.touched.connect(self.idle.activity)
+        if self.usage: button.usage = self.usage.button(self.current_config_file, config['id'])
+        if self.recorder: self.recorder.attach(button)
+        self.idle.prepare(button)
+        self.layers.add(button, layer_of(config))  # 不在当前图层的按钮建好后保持隐藏
         self.buttons.append(button)
+        self.button_map[config['id']] = button
+        self.spatial.insert(config['id'], *config['position'], *config['size'])
 
     def handle_position_change(self, new_config):
         try:
             index = next(i for i, btn in enumerate(self.buttons) if btn.config['id'] == new_config['id'])
             self.buttons[index].config = new_config
-            QTimer.singleShot(100, self.save_config)
+            self.spatial.update(new_config['id'], *new_config['position'], *new_config['size'])
+            self.save_timer.start()
         except StopIteration: pass
 
-    def trigger_shortcut(self, shortcut):
-        if not shortcut: return
+    def snap_button(self, button, x, y):
+        snap = self.prefs.get('snap', {})
+        if not snap.get('enabled', True): return x, y, []
+        return self.spatial.snap(button.config['id'], x, y, button.width(), button.height(), snap.get('threshold', 8), accept=self.is_button_visible)
+
+    def is_button_visible(self, button_id):
+        return self.layers.is_visible(layer_of(self.button_map[button_id].config))
+
+    def button_at(self, x, y):
+        """屏幕坐标处最上层的按钮，没有则返回 None"""
+        return self.button_map.get(self.spatial.hit_test(x, y, accept=self.is_button_visible))
+
+    def on_joystick_keys(self, released, pressed):
+        # 摇杆只发出方向变化：先松开再按下，斜向切换时共有的键保持按住
         try:
-            keyboard.press(shortcut); keyboard.release(shortcut)
-        except ValueError: print(f"无效的快捷键: {shortcut}")
-        except Exception as e: print(f"快捷键执行错误: {e}")
+            for key in released: self.backend.release(key)
+            for key in pressed: self.backend.press(key)
+        except Exception as e: print(f"摇杆按键注入失败: {e}")
+
+    def trigger_shortcut(self, shortcut, button_id=None):
+        # 只入队，由后台线程按点击顺序注入，连续快速点击不会卡住界面
+        if not shortcut: return
+        self.dispatcher.submit(button_id or shortcut, shortcut)
+
+    def run_macro(self, button_id, ops):
+        if self.macro_scheduler is None: self.macro_scheduler = MacroScheduler(self.backend)
+        self.macro_scheduler.toggle(button_id, ops)  # 运行中再次点击则取消
 
     def apply_live_settings(self, new_config):
         self.config = copy.deepcopy(new_config)
         self.create_buttons()
+        self.live_applied = True
 
     def show_settings(self):
-        original_config = copy.deepcopy(self.config)
-        original_filename = self.current_config_file
-        dialog = SettingsDialog(self.config_dir, self.current_config_file, self.config, apply_callback=self.apply_live_settings)
-        if dialog.exec_():
-            new_filename, new_config = dialog.get_values()
-            self.current_config_file = new_filename
-            self.config = new_config
-            self.save_config()
-            self.save_prefs()
-            self.create_buttons()
-        else:
-            self.current_config_file = original_filename
-            self.config = original_config
-            self.create_buttons()
+        self.idle.activity()  # 编辑时需要看到完整布局
+        dialog = self.create_settings_dialog()
+        self.settings_open = True
+        try: accepted = dialog.exec_()
+        finally: self.settings_open = False
+        self.close_settings(dialog, accepted)
+
+    def create_settings_dialog(self):
+        from settings_window import SettingsDialog  # 设置窗口较重，首次打开时才导入
+        self.live_applied = False
+        if self.save_timer.isActive(): self.save_timer.stop(); self.save_config()  # 窗口直接编辑 self.config，打开前先写盘
+        return SettingsDialog(self.config_dir, self.current_config_file, self.config, apply_callback=self.apply_live_settings, store=self.history, usage=self.usage)
+
+    def close_settings(self, dialog, accepted=False):
+        """应用或撤销设置窗口的修改，然后释放窗口（没有父对象的对话框不会自动释放，长时间运行会累积）"""
+        try:
+            if accepted:
+                new_filename, new_config = dialog.get_values()
+                self.current_config_file = new_filename
+                self.config = new_config
+                self.create_buttons()  # 先编译重建，保存的是规范化后的配置
+                self.save_config()
+                self.save_prefs()
+            else:
+                # 取消：窗口与主程序共享配置字典，把窗口内的修改全部撤销回起点，而不是预先整份深拷贝
+                dialog.rewind()
+                if self.live_applied:
+                    self.current_config_file, self.config = dialog.get_values()
+                    self.create_buttons()
+        finally:
+            dialog.deleteLater(); self.trim_timer.start()
+            if getattr(self, 'auto_switch_deferred', False):  # 打开期间推迟了自动切换：按当前前台窗口重新判断
+                self.auto_switch_deferred = False; self.window_monitor.recheck(self.current_config_file)
 
     def save_config(self):
         config_path = os.path.join(self.config_dir, self.current_config_file)
         try:
             self.config['buttons'] = [btn.config for btn in self.buttons]
             with open(config_path, 'w', encoding='utf-8') as f: json.dump(self.config, f, indent=2, ensure_ascii=False)
-        except Exception as e: print(f"保存配置失败: {e}")
+            self.profiles.put(self.current_config_file, self.config)
+        except Exception as e: print(f"保存配置失败: {e}"); return
+        self.snapshot_profile('save')
 
     def clean_exit(self):
+        if hasattr(self, 'profile_hotkeys'): self.profile_hotkeys.uninstall()
+        if hasattr(self, 'window_monitor'): self.window_monitor.stop()
+        self.control.stop()
+        if self.profiler: self.finish_profile()
+        if self.recorder: self.stop_recording()
+        if self.prefs_timer.isActive(): self.prefs_timer.stop(); self.save_prefs()
+        self.save_timer.stop(); self.trim_timer.stop(); self.usage_timer.stop(); self.sync_timer.stop(); self.sync_poll.stop(); self.sync_retry.stop()
+        self.idle.set_enabled(False)
+        self.flush_usage()
+        if self.macro_scheduler: self.macro_scheduler.stop()
+        self.dispatcher.stop()
+        self.backend.close()
         self.save_config()
-        for btn in self.buttons: btn.deleteLater()
+        for btn in self.buttons: btn.hide(); btn.deleteLater()  # 先隐藏，摇杆会松开按住的键
         self.app.quit()
 
     def run(self): sys.exit(self.app.exec_())
 
 if __name__ == "__main__":
-    app = TouchButtonApp()
+    import argparse
+    parser = argparse.ArgumentParser(description="TouchMultiButton 触摸悬浮按钮")
+    add_arguments(parser)
+    args, _ = parser.parse_known_args()  # 其余参数留给 Qt
+    app = TouchButtonApp(args)
     app.run()
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import json
+
+
+class ProfileCache:
+    """已解析配置的缓存（按文件修改时间失效），切换配置时免去重复读取和解析"""
+
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+        self._entries = {}  # filename -> (mtime_ns, config)
+
+    def _mtime(self, filename):
+        try: return os.stat(os.path.join(self.config_dir, filename)).st_mtime_ns
+        except OSError: return None
+
+    def get(self, filename):
+        """返回配置字典（与缓存共享同一对象）；文件不存在时返回 None"""
+        mtime = self._mtime(filename)
+        if mtime is None:
+            self._entries.pop(filename, None); return None
+        entry = self._entries.get(filename)
+        if entry and entry[0] == mtime: return entry[1]
+        with open(os.path.join(self.config_dir, filename), 'r', encoding='utf-8') as f: config = json.load(f)
+        self._entries[filename] = (mtime, config)
+        return config
+
+    def put(self, filename, config):
+        """记录当前内存中的配置（通常在保存或切换离开时调用）"""
+        mtime = self._mtime(filename)
+        if mtime is not None: self._entries[filename] = (mtime, config)
+
+    def warm(self, filenames):
+        """预先解析所有配置，之后的切换直接命中缓存"""
+        for name in filenames:
+            try: self.get(name)
+            except Exception as e: print(f"预加载配置失败 {name}: {e}")
@@ -0,0 +1,341 @@
+import re
+import uuid
+import bisect
+import difflib
+from collections import namedtuple
+from functools import lru_cache
+from macro import compile_macro, MacroError, OP_CHORD, OP_PRESS, OP_RELEASE
+from layers import parse_layer_action
+from tap_queue import POLICIES
+
+# ---------------------------------------------------------------- 按键名索引
+# 规范名与 keyboard 库一致（uinput 后端也按这些名字映射），'+' 和 ',' 是组合键 / 序列的分隔符，
+# 在组合键里分别写作 plus 和 comma
+_NAMED_KEYS = (
+    'space', 'enter', 'esc', 'tab', 'backspace', 'delete', 'insert', 'home', 'end', 'page up', 'page down',
+    'up', 'down', 'left', 'right', 'caps lock', 'num lock', 'scroll lock', 'print screen', 'pause', 'menu',
+    'clear', 'help', 'select', 'execute', 'sleep', 'decimal', 'separator',
+    'ctrl', 'shift', 'alt', 'windows', 'alt gr', 'left ctrl', 'right ctrl', 'left shift', 'right shift',
+    'left alt', 'right alt', 'left windows', 'right windows',
+    'volume up', 'volume down', 'volume mute', 'play/pause media', 'next track', 'previous track', 'stop media', 'select media',
+    'browser back', 'browser forward', 'browser refresh', 'browser stop', 'browser search key', 'browser favorites',
+    'browser start and home', 'start mail', 'start application 1', 'start application 2',
+    'plus', 'comma',
+)
+KEY_NAMES = tuple(sorted(set(_NAMED_KEYS) | set('abcdefghijklmnopqrstuvwxyz0123456789') | {f'num {i}' for i in range(10)}  # 小键盘数字
+                         | {f'f{i}' for i in range(1, 25)} | set('`-=[]\\;\'./~!@#$%^&*()_{}|:"<>?')))
+_KEY_SET = frozenset(KEY_NAMES)
+
+# 常见别名（包括设置窗口录制按键时 QKeySequence 给出的名字）-> 规范名
+KEY_ALIASES = {
+    'escape': 'esc', 'return': 'enter', 'del': 'delete', 'ins': 'insert', 'control': 'ctrl', 'option': 'alt',
+    'win': 'windows', 'cmd': 'windows', 'command': 'windows', 'meta': 'windows', 'super': 'windows',
+    'left win': 'left windows', 'right win': 'right windows', 'left control': 'left ctrl', 'right control': 'right ctrl',
+    'left menu': 'left alt', 'right menu': 'right alt', 'altgr': 'alt gr',
+    'pgup': 'page up', 'pageup': 'page up', 'pgdown': 'page down', 'pgdn': 'page down', 'pagedown': 'page down',
+    'prtscn': 'print screen', 'prtsc': 'print screen', 'prnt scrn': 'print screen', 'snapshot': 'print screen',
+    'print': 'print screen', 'sysreq': 'print screen',
+    'capslock': 'caps lock', 'numlock': 'num lock', 'number lock': 'num lock', 'scrolllock': 'scroll lock', 'scrlk': 'scroll lock',
+    'pause break': 'pause', 'break': 'pause',
+    'app': 'menu', 'apps': 'menu', 'application': 'menu', 'applications': 'menu',
+    'spacebar': 'space', 'space bar': 'space', 'bksp': 'backspace',
+    'left arrow': 'left', 'right arrow': 'right', 'up arrow': 'up', 'down arrow': 'down',
+    'play/pause': 'play/pause media', 'media play': 'play/pause media', 'media pause': 'play/pause media',
+    'media next': 'next track', 'media previous': 'previous track', 'media stop': 'stop media', 'mute': 'volume mute',
+    '+': 'plus', ',': 'comma',
+    **{f'numpad {i}': f'num {i}' for i in range(10)},
+}
+
+
+class KeyNameError(ValueError):
+    pass
+
+
+def resolve_key(name):
+    """单个按键名 -> 规范名；未知的名字抛出 KeyNameError（附带最接近的候选）"""
+    key = ' '.join(name.lower().split())
+    if key in _KEY_SET: return key
+    alias = KEY_ALIASES.get(key)
+    if alias: return alias
+    if len(key) == 1 and key.isprintable() and not key.isspace(): return key  # 其他单个字符由注入后端按字符映射
+    if not key: raise KeyNameError("组合键不完整")
+    close = difflib.get_close_matches(key, KEY_NAMES + tuple(KEY_ALIASES), n=1)
+    raise KeyNameError(f"未知的按键 '{name.strip()}'" + (f"，是否为 '{KEY_ALIASES.get(close[0], close[0])}'?" if close else ""))
+
+
+@lru_cache(maxsize=1024)
+def resolve_shortcut(text):
+    """快捷键文本 -> 规范形式，如 'Ctrl+PgUp, F1' -> 'ctrl+page up, f1'；空文本返回 ''
+
+    语法与 keyboard 库相同：'+' 连接组合键，',' 分隔依次发送的多个组合键。格式错误抛出 KeyNameError。
+    """
+    text = (text or '').strip()
+    if not text: return ''
+    if text in ('+', ','): return resolve_key(text)
+    steps = []
+    for step in text.split(','):
+        if not step.strip(): raise KeyNameError("按键序列中有空步骤")
+        steps.append('+'.join(resolve_key(k) for k in step.split('+')))
+    return ', '.join(steps)
+
+
+def unsupported_keys(keys, supports):
+    """规范形式的快捷键中 supports(按键名) 为假的按键（按出现顺序，不重复）"""
+    return list(dict.fromkeys(k for step in keys.split(', ') for k in step.split('+') if k and not supports(k)))
+
+
+def complete_keys(prefix, limit=50):
+    """按键名补全：返回以 prefix 开头的规范名（有序，二分查找）"""
+    prefix = prefix.lower().lstrip()
+    i = bisect.bisect_left(KEY_NAMES, prefix)
+    out = []
+    while i < len(KEY_NAMES) and KEY_NAMES[i].startswith(prefix) and len(out) < limit:
+        out.append(KEY_NAMES[i]); i += 1
+    return out
+
+
+# ---------------------------------------------------------------- 颜色与样式
+_NAMED_COLORS = {
+    'white': (255, 255, 255), 'black': (0, 0, 0), 'red': (255, 0, 0), 'green': (0, 128, 0), 'blue': (0, 0, 255),
+    'yellow': (255, 255, 0), 'cyan': (0, 255, 255), 'magenta': (255, 0, 255), 'gray': (128, 128, 128), 'grey': (128, 128, 128),
+    'orange': (255, 165, 0), 'purple': (128, 0, 128), 'pink': (255, 192, 203), 'transparent': (0, 0, 0),
+}
+_HEX = re.compile(r'#([0-9a-fA-F]{3}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})')
+
+
+@lru_cache(maxsize=256)
+def parse_color(text):
+    """'#rgb' / '#rrggbb' / '#aarrggbb'（与 QColor 相同，忽略 alpha）/ 常用颜色名 -> (r, g, b)，无法识别时返回 None"""
+    text = (text or '').strip().lower()
+    m = _HEX.fullmatch(text)
+    if not m: return _NAMED_COLORS.get(text)
+    digits = m.group(1)
+    if len(digits) == 3: digits = ''.join(c * 2 for c in digits)
+    digits = digits[-6:]
+    return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+
+
+DEFAULT_FONT = '微软雅黑'
+
+
+def button_stylesheet(config):
+    """按钮样式表（加载时预先生成；拖动、改透明度等重新生成时也只用这一处）"""
+    r, g, b = parse_color(config.get('color')) or (255, 255, 255)
+    tr, tg, tb = parse_color(config.get('textColor')) or (0, 0, 0)
+    br, bg, bb = parse_color(config.get('borderColor')) or (204, 204, 204)
+    font_family = (config.get('fontFamily') or '').replace('"', '').strip() or DEFAULT_FONT
+    opacity = config.get('opacity', 1.0)
+    return f"""
+            background-color: rgba({r}, {g}, {b}, {opacity});
+            color: rgba({tr}, {tg}, {tb});
+            border-radius: 10px;        /* 圆角半径 */
+            font-family: "{font_family}";
+            font-size: {config.get('fontSize', 14)}px;            /* 字体大小 */
+            border: 2px solid rgba({br}, {bg}, {bb}, {opacity}); /* 边框 */
+        """
+
+
+# 按下时的视觉反馈（button.py 预先绘制好，按下时只贴图），不写时为 highlight
+PRESS_FEEDBACK = ('highlight', 'ring', 'scale', 'none')
+PRESS_FEEDBACK_NAMES = {'highlight': "高亮", 'ring': "描边", 'scale': "缩小", 'none': "无"}
+
+
+# ---------------------------------------------------------------- 配置规范化与编译
+BUTTON_DEFAULTS = {
+    'label': '', 'shortcut': '', 'position': [0, 0], 'size': [100, 50], 'opacity': 1.0,
+    'color': '#ffffff', 'textColor': '#000000', 'borderColor': '#cccccc', 'fontSize': 14,
+    'position_lock': False, 'fontFamily': DEFAULT_FONT,
+}
+
+
+class ProfileIssue(namedtuple('ProfileIssue', 'index button field message level')):
+    """一条配置问题；level 为 'error'（该功能被停用）或 'warning'（已自动修正）"""
+    __slots__ = ()
+
+    def __str__(self):
+        where = f"按钮 {self.index + 1}" if self.index is not None else "配置"
+        if self.button: where += f" [{self.button}]"
+        return f"{where} {self.field}: {self.message}" if self.field else f"{where}: {self.message}"
+
+
+class ButtonPlan:
+    """单个按钮编译后的执行计划：点击时只使用这里预先解析好的数据
+
+    kind:       'shortcut' / 'macro' / 'layer' / 'joystick'
+    keys:       规范化的快捷键（shortcut，空字符串表示不注入），摇杆为方向 -> 键 的字典
+    ops:        宏操作（按键已规范化）
+    stylesheet: 预先生成的样式表
+    valid:      False 表示按键或宏有错误，点击时不做任何事（错误已在加载时报告）
+    """
+    __slots__ = ('config', 'kind', 'keys', 'ops', 'layer_action', 'stylesheet', 'valid')
+
+    def __init__(self, config):
+        self.config = config; self.kind = 'shortcut'; self.keys = ''; self.ops = None
+        self.layer_action = None; self.stylesheet = None; self.valid = True
+
+
+def _number(value, default, cast, low=None, high=None):
+    if type(value) is cast and (low is None or value >= low) and (high is None or value <= high): return value, True  # 常见情况：已经合法
+    try: value = cast(value)
+    except (TypeError, ValueError): return default, False
+    if value != value: return default, False  # NaN
+    if low is not None: value = max(low, value)
+    if high is not None: value = min(high, value)
+    return value, True
+
+
+def _round_int(v): return int(round(float(v)))
+
+
+def _pair(value, default, low):
+    if type(value) is list and len(value) == 2 and type(value[0]) is int and type(value[1]) is int and (low is None or min(value) >= low):
+        return value, True
+    if not isinstance(value, (list, tuple)) or len(value) != 2: return list(default), False
+    a, ok_a = _number(value[0], default[0], _round_int, low)
+    b, ok_b = _number(value[1], default[1], _round_int, low)
+    return [a, b], ok_a and ok_b
+
+
+_LEGACY_FIELDS = (('position', 'x', 'y'), ('size', 'width', 'height'))  # 早期配置的分开字段
+
+
+def normalize_button(config, index=0, seen_ids=None, issues=None):
+    """原地补全缺失字段、修正类型，返回 config；修正记录追加到 issues"""
+    def warn(field, message): issues is not None and issues.append(ProfileIssue(index, config.get('label') or config.get('id'), field, message, 'warning'))
+    for field, a, b in _LEGACY_FIELDS:
+        if a in config or b in config:
+            default = BUTTON_DEFAULTS[field]
+            if field not in config: config[field] = [config.get(a, default[0]), config.get(b, default[1])]
+            config.pop(a, None); config.pop(b, None); warn(field, f"旧格式的 {a}/{b} 已转换")
+    for field, default in BUTTON_DEFAULTS.items():
+        if field not in config: config[field] = list(default) if isinstance(default, list) else default
+    bid = config.get('id')
+    if not isinstance(bid, str) or not bid or (seen_ids is not None and bid in seen_ids):
+        if bid: warn('id', f"重复的 id {bid}，已重新生成" if isinstance(bid, str) else f"无效的 id {bid!r}，已重新生成")
+        config['id'] = str(uuid.uuid4())
+    if seen_ids is not None: seen_ids.add(config['id'])
+    for field in ('label', 'shortcut', 'fontFamily'):
+        if not isinstance(config[field], str): config[field] = '' if config[field] is None else str(config[field])
+    config['position'], ok = _pair(config['position'], BUTTON_DEFAULTS['position'], None)
+    if not ok: warn('position', "格式应为 [x, y]，已使用默认值")
+    config['size'], ok = _pair(config['size'], BUTTON_DEFAULTS['size'], 1)
+    if not ok: warn('size', "格式应为 [宽, 高]，已使用默认值")
+    config['opacity'], ok = _number(config['opacity'], 1.0, float, 0.0, 1.0)
+    if not ok: warn('opacity', "应为 0~1 的数字")
+    config['fontSize'], ok = _number(config['fontSize'], 14, int, 1)
+    if not ok: warn('fontSize', "应为正整数")
+    config['position_lock'] = bool(config['position_lock'])
+    for field in ('color', 'textColor', 'borderColor'):
+        if parse_color(config[field]) is None:
+            warn(field, f"无法识别的颜色 {config[field]!r}，已使用默认值"); config[field] = BUTTON_DEFAULTS[field]
+    if 'press_feedback' in config and config['press_feedback'] not in PRESS_FEEDBACK:
+        warn('press_feedback', f"未知的按下反馈 {config['press_feedback']!r}，已使用默认值"); del config['press_feedback']
+    return config
+
+
+def compile_button(config, index=0, issues=None, stylesheet=True, supports=None):
+    """编译一个（已规范化的）按钮配置，返回 ButtonPlan；错误追加到 issues
+
+    supports 为输入后端的 supports(按键名)：后端发不出的按键（如没有小键盘键码）报告为错误，而不是换成别的键。
+    """
+    plan = ButtonPlan(config)
+    name = config.get('label') or config.get('id')
+    def error(field, message):
+        plan.valid = False
+        if issues is not None: issues.append(ProfileIssue(index, name, field, message, 'error'))
+    def check(field, keys):
+        bad = unsupported_keys(keys, supports) if supports and keys else None
+        if bad: error(field, f"当前输入后端不支持按键: {', '.join(bad)}")
+    if stylesheet: plan.stylesheet = button_stylesheet(config)
+    if config.get('type') == 'joystick':
+        plan.kind = 'joystick'; plan.keys = {}  # 未配置的方向由摇杆使用默认的 WASD
+        for direction, key in (config.get('keys') or {}).items():
+            try: plan.keys[direction] = resolve_shortcut(key); check(f'keys.{direction}', plan.keys[direction])
+            except KeyNameError as e: plan.keys[direction] = ''; error(f'keys.{direction}', str(e))
+        if config.get('sectors', 8) not in (4, 8): error('sectors', f"方向数只能是 4 或 8: {config.get('sectors')}")
+        return plan
+    try: plan.layer_action = parse_layer_action(config)
+    except ValueError as e: error('layer_action', str(e))
+    if plan.layer_action:
+        plan.kind = 'layer'; return plan
+    if config.get('macro'):
+        plan.kind = 'macro'
+        try: plan.ops = compile_macro_keys(config['macro'])
+        except (MacroError, KeyNameError) as e: error('macro', str(e))
+        else: check('macro', ', '.join(arg for op, arg in plan.ops if op in (OP_CHORD, OP_PRESS, OP_RELEASE) and arg))
+        return plan
+    try: plan.keys = resolve_shortcut(config.get('shortcut')); check('shortcut', plan.keys)
+    except KeyNameError as e: error('shortcut', str(e))
+    for field in ('tap_queue', 'tap_policy'):
+        if field in config:
+            if field == 'tap_policy' and config[field] not in POLICIES: error(field, f"未知的队列策略: {config[field]}")
+            if field == 'tap_queue' and _number(config[field], None, int, 1)[0] is None: error(field, "应为正整数")
+    return plan
+
+
+def upgrade_profile(data):
+    """读取到的 JSON -> 配置字典：早期只保存按钮列表的文件包装为 {"buttons": [...]}；其他类型抛出 ValueError"""
+    if isinstance(data, list): return {'buttons': data}
+    if not isinstance(data, dict): raise ValueError("配置文件应为 JSON 对象")
+    return data
+
+
+def compile_profile(config, stylesheets=True, supports=None):
+    """规范化并编译整份配置，返回 (plans, issues)
+
+    plans 与 config['buttons'] 一一对应（非字典的条目会被移除）；issues 为 ProfileIssue 列表。
+    stylesheets=False 时不生成样式表（命令行批量处理用不到）；supports 见 compile_button。
+    加载和保存配置时调用，之后点击路径只使用 plans 中预先解析好的数据。
+    """
+    issues = []
+    buttons = config.get('buttons')
+    if not isinstance(buttons, list):
+        if buttons is not None: issues.append(ProfileIssue(None, None, 'buttons', "应为列表，已清空", 'warning'))
+        buttons = config['buttons'] = []
+    kept = [b for b in buttons if isinstance(b, dict)]
+    if len(kept) != len(buttons):
+        issues.append(ProfileIssue(None, None, 'buttons', f"移除了 {len(buttons) - len(kept)} 个无效的按钮条目", 'warning'))
+        buttons[:] = kept
+    seen, plans = set(), []
+    for i, button in enumerate(buttons):
+        normalize_button(button, i, seen, issues)
+        plans.append(compile_button(button, i, issues, stylesheets, supports))
+    return plans, issues
+
+
+def compile_macro_keys(text):
+    """编译宏并把其中的按键名解析为规范名；格式错误抛出 MacroError，按键名错误抛出 KeyNameError"""
+    return tuple((op, resolve_shortcut(arg)) if op in (OP_CHORD, OP_PRESS, OP_RELEASE) else (op, arg) for op, arg in compile_macro(text))
+
+
+def validate_macro(text):
+    """设置窗口即时校验用：返回错误信息，合法时返回 None"""
+    try: compile_macro_keys(text); return None
+    except (MacroError, KeyNameError) as e: return str(e)
+
+
+def validate_shortcut(text):
+    """设置窗口即时校验用：返回错误信息，合法时返回 None"""
+    try: resolve_shortcut(text); return None
+    except KeyNameError as e: return str(e)
+
+
+def benchmark(buttons=500):
+    """编译 buttons 个按钮的配置，返回总耗时（毫秒）"""
+    import time
+    samples = ['ctrl+c', 'F1', 'volume up', 'alt+tab, enter', 'Ctrl+PgUp', 'left+down']
+    config = {'buttons': [{'label': str(i), 'shortcut': samples[i % len(samples)], 'position': [i, i]} for i in range(buttons)]}
+    resolve_shortcut.cache_clear()
+    t = time.perf_counter()
+    plans, issues = compile_profile(config)
+    return {'buttons': len(plans), 'issues': len(issues), 'compile_ms': round((time.perf_counter() - t) * 1000, 3)}
+
+
+if __name__ == "__main__":
+    import sys, json
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, 'r', encoding='utf-8') as f: plans, issues = compile_profile(json.load(f))
+            print(f"{path}: {len(plans)} 个按钮, {len(issues)} 个问题")
+            for issue in issues: print(f"  [{issue.level}] {issue}")
+    else: print(benchmark())
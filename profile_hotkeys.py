@@ -0,0 +1,63 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+def normalize_key(name):
+    """统一按键名称：忽略左右区分及常见别名，便于与配置中的热键比较"""
+    name = (name or '').strip().lower()
+    for prefix in ('left ', 'right '):
+        if name.startswith(prefix): name = name[len(prefix):]
+    return {'control': 'ctrl', 'win': 'windows', 'cmd': 'windows', 'command': 'windows', 'option': 'alt',
+            'altgr': 'alt', 'alt gr': 'alt', 'escape': 'esc', 'return': 'enter',
+            'pgup': 'page up', 'pgdn': 'page down', 'pageup': 'page up', 'pagedown': 'page down'}.get(name, name)
+
+
+def parse_hotkey(text):
+    """'ctrl+alt+1' -> frozenset({'ctrl', 'alt', '1'})"""
+    keys = frozenset(normalize_key(k) for k in text.split('+') if k.strip())
+    return keys or None
+
+
+class ProfileHotkeys(QObject):
+    """全局配置切换热键
+
+    只安装一个 keyboard 钩子；回调里只做集合运算和字典查找，
+    命中后通过跨线程信号交给 Qt 主线程处理，不阻塞钩子链。
+    bindings: {"next": "ctrl+alt+page down", "prev": "...", "<配置文件名>.json": "ctrl+alt+1"}
+    """
+    triggered = pyqtSignal(str)  # "next" / "prev" / 配置文件名
+
+    def __init__(self, bindings, parent=None):
+        super().__init__(parent)
+        self._table = {}
+        for action, hotkey in (bindings or {}).items():
+            keys = parse_hotkey(hotkey) if isinstance(hotkey, str) else None
+            if keys: self._table[keys] = action
+            else: print(f"无效的配置切换热键: {action} = {hotkey}")
+        self._pressed = set()
+        self._hook = None
+
+    def install(self):
+        if self._hook is not None or not self._table: return
+        try:
+            import keyboard
+            self._hook = keyboard.hook(self._on_event)
+        except Exception as e: print(f"安装全局热键失败: {e}")
+
+    def uninstall(self):
+        if self._hook is None: return
+        try:
+            import keyboard
+            keyboard.unhook(self._hook)
+        except Exception: pass
+        self._hook = None; self._pressed.clear()
+
+    def _on_event(self, event):
+        # 运行在 keyboard 的监听线程中
+        name = normalize_key(event.name)
+        if event.event_type == 'down':
+            if name in self._pressed: return  # 按住不放时的自动重复
+            self._pressed.add(name)
+            action = self._table.get(frozenset(self._pressed))
+            if action: self.triggered.emit(action)
+        else:
+            self._pressed.discard(name)
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import zlib
+import struct
+import hashlib
+
+HISTORY_DIR = '.history'
+GC_EVERY = 64  # 累计这么多个版本被合并 / 淘汰后整理一次对象包
+MAX_CHAIN = 16  # 增量版本最多连续这么多个，之后写一个完整的按钮列表
+_HEADER = struct.Struct('<16sI')  # 摘要 + 压缩后长度
+REASON_NAMES = {'load': "加载", 'save': "保存", 'backup': "还原前", 'restore': "还原", 'delete': "删除前", 'sync': "同步"}
+
+
+def describe_version(entry):
+    """菜单和列表里显示的一行版本说明"""
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time']))
+    return f"{stamp}  {REASON_NAMES.get(entry['reason'], entry['reason'])}  {entry['buttons']} 个按钮  ({entry['id'][:8]})"
+
+
+def _canonical(obj):
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ProfileStore:
+    """配置的历史版本（按内容寻址、去重）
+
+    config/.history/objects.pack  只追加的对象包：每个对象 = 16 字节 blake2b 摘要 + 4 字节长度 + zlib 压缩的规范化 JSON
+    config/.history/logs/<配置名>  该配置的版本列表（JSON，最新在前）
+    一个版本 = {'meta': 按钮以外字段的摘要, 'buttons': [每个按钮的摘要]}，它本身也是对象，摘要即版本号；
+    只改了少数按钮时写成增量 {'meta', 'base': 上一个版本, 'n': 按钮数, 'set': {序号: 摘要}}。
+    没有变化的按钮在所有版本之间只存一份；小对象集中在一个文件里，不会每个占一个磁盘块。
+    拖动时的连续保存在 coalesce_s 秒内合并为一个版本；超过 keep 个或早于 days 天的版本被淘汰
+    （每个配置最新的版本总是保留），不再被引用的对象在 gc() 重写对象包时清除。
+    """
+
+    def __init__(self, config_dir, keep=50, days=30, coalesce_s=60):
+        self.config_dir = config_dir
+        self.root = os.path.join(config_dir, HISTORY_DIR)
+        self.pack_path = os.path.join(self.root, 'objects.pack')
+        self.log_dir = os.path.join(self.root, 'logs')
+        self.keep = max(1, int(keep)); self.days = days; self.coalesce_s = coalesce_s
+        self._index = None  # 摘要 -> (数据偏移, 长度)，首次使用时扫描对象包建立
+        self._cache = {}  # 摘要 -> 解压后的 JSON 字节
+        self._manifests = {}  # 版本号 -> (meta, 按钮摘要元组, 增量深度)
+        self._logs = {}  # 配置名 -> 版本列表
+        self._garbage = 0
+
+    # --- 对象包 ---
+    def _load_index(self):
+        if self._index is not None: return self._index
+        self._index = {}
+        if not os.path.exists(self.pack_path): return self._index
+        with open(self.pack_path, 'rb') as f:
+            offset = 0; size = os.fstat(f.fileno()).st_size
+            while offset + _HEADER.size <= size:
+                f.seek(offset)
+                digest, length = _HEADER.unpack(f.read(_HEADER.size))
+                if offset + _HEADER.size + length > size: break
+                self._index[digest] = (offset + _HEADER.size, length)
+                offset += _HEADER.size + length
+        if offset < size:  # 上次写入中断留下的半条记录
+            print(f"历史版本对象包末尾不完整，已截断 {size - offset} 字节")
+            with open(self.pack_path, 'r+b') as f: f.truncate(offset)
+        return self._index
+
+    def _write(self, blobs):
+        """把尚未保存的对象追加到对象包；blobs: [(摘要, 规范化 JSON)]"""
+        index = self._load_index()
+        new = [(d, data) for d, data in dict(blobs).items() if d not in index]
+        if not new: return
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.pack_path, 'ab') as f:
+            offset = f.tell()
+            for digest, data in new:
+                packed = zlib.compress(data, 6)
+                f.write(_HEADER.pack(digest, len(packed)) + packed)
+                index[digest] = (offset + _HEADER.size, len(packed)); offset += _HEADER.size + len(packed)
+            f.flush(); os.fsync(f.fileno())
+
+    def _read(self, hexdigest, f=None):
+        digest = bytes.fromhex(hexdigest)
+        data = self._cache.get(digest)
+        if data is not None: return data
+        entry = self._load_index().get(digest)
+        if entry is None: raise KeyError(f"历史版本缺少对象 {hexdigest}")
+        if f is None:
+            with open(self.pack_path, 'rb') as pack: return self._read(hexdigest, pack)
+        f.seek(entry[0]); data = zlib.decompress(f.read(entry[1]))
+        if len(self._cache) > 4096: self._cache.clear()
+        self._cache[digest] = data
+        return data
+
+    def _manifest(self, vid, f=None):
+        """展开版本（沿增量链），返回 (meta, 按钮摘要元组, 增量深度)"""
+        manifest = self._manifests.get(vid)
+        if manifest is not None: return manifest
+        version = json.loads(self._read(vid, f))
+        if 'base' in version:
+            _, buttons, depth = self._manifest(version['base'], f)
+            buttons = list(buttons[:version['n']]) + [None] * (version['n'] - len(buttons))
+            for i, h in version['set'].items(): buttons[int(i)] = h
+            manifest = (version['meta'], tuple(buttons), depth + 1)
+        else: manifest = (version['meta'], tuple(version['buttons']), 0)
+        if len(self._manifests) > 1024: self._manifests.clear()
+        self._manifests[vid] = manifest
+        return manifest
+
+    # --- 版本列表 ---
+    def _log(self, filename):
+        log = self._logs.get(filename)
+        if log is None:
+            try:
+                with open(os.path.join(self.log_dir, filename), 'r', encoding='utf-8') as f: log = json.load(f)
+            except (OSError, ValueError): log = []
+            self._logs[filename] = log
+        return log
+
+    def _save_log(self, filename, log):
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = os.path.join(self.log_dir, filename); tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(log, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _evict(self, log, now):
+        limit = now - self.days * 86400 if self.days else None
+        kept = log[:1] + [e for i, e in enumerate(log[1:], 1) if i < self.keep and (limit is None or e['time'] >= limit)]
+        self._garbage += len(log) - len(kept)
+        log[:] = kept
+
+    # --- 公开接口 ---
+    def snapshot(self, filename, config, reason='save'):
+        """记录配置的当前内容，返回新版本号；与最新版本相同时返回 None（不写任何文件）"""
+        blobs = []
+        def put(obj):
+            data = _canonical(obj); digest = _digest(data)
+            blobs.append((digest, data)); return digest.hex()
+        meta = put({k: v for k, v in config.items() if k != 'buttons'})
+        buttons = tuple(put(b) for b in config.get('buttons', []))
+        log = self._log(filename); now = time.time()
+        head = log[0] if log else None
+        if head and self._manifest(head['id'])[:2] == (meta, buttons): return None
+        coalesce = head and reason == 'save' and head['reason'] == 'save' and now - head.get('start', head['time']) < self.coalesce_s
+        if coalesce: base = log[1] if len(log) > 1 else None  # 合并时替换掉最新版本，增量基于它之前的版本
+        else: base = head
+        version = {'meta': meta, 'buttons': list(buttons)}
+        if base:
+            _, base_buttons, depth = self._manifest(base['id'])
+            changed = {str(i): h for i, h in enumerate(buttons) if i >= len(base_buttons) or base_buttons[i] != h}
+            if depth < MAX_CHAIN and len(changed) * 4 <= len(buttons):
+                version = {'meta': meta, 'base': base['id'], 'n': len(buttons), 'set': changed}
+        vid = put(version)
+        self._write(blobs)
+        self._manifests[vid] = (meta, buttons, self._manifest(base['id'])[2] + 1 if 'base' in version else 0)
+        entry = {'id': vid, 'time': round(now, 3), 'start': round(now, 3), 'reason': reason, 'buttons': len(buttons)}
+        if coalesce: entry['start'] = head.get('start', head['time']); log[0] = entry; self._garbage += 1
+        else: log.insert(0, entry)
+        self._evict(log, now)
+        self._save_log(filename, log)
+        if self._garbage >= GC_EVERY: self.gc()
+        return vid
+
+    def versions(self, filename):
+        """版本列表（最新在前）：[{'id', 'time', 'reason', 'buttons'}]"""
+        return [dict(e) for e in self._log(filename)]
+
+    def profiles(self):
+        """有历史记录的配置名（包括已删除的配置）"""
+        try: return sorted(f for f in os.listdir(self.log_dir) if not f.endswith('.tmp'))
+        except OSError: return []
+
+    def load(self, filename, vid=None):
+        """还原出某个版本的配置（新的字典，可以直接修改）；vid 为 None 时取最新版本"""
+        log = self._log(filename)
+        if vid is None:
+            if not log: raise KeyError(f"{filename} 没有历史版本")
+            vid = log[0]['id']
+        with open(self.pack_path, 'rb') as f:
+            meta, buttons, _ = self._manifest(vid, f)
+            config = json.loads(self._read(meta, f))
+            config['buttons'] = [json.loads(self._read(h, f)) for h in buttons]
+        return config
+
+    def restore(self, filename, vid):
+        """把配置文件写回到某个版本（先记录当前内容，还原本身也可以撤销），返回还原后的配置"""
+        config = self.load(filename, vid)
+        path = os.path.join(self.config_dir, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self.snapshot(filename, json.load(f), 'backup')
+        except (OSError, ValueError): pass
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(config, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.snapshot(filename, config, 'restore')
+        return config
+
+    def gc(self):
+        """重写对象包，只保留仍被版本引用的对象，返回清除的对象数"""
+        self._garbage = 0
+        index = self._load_index()
+        if not index: return 0
+        live = set()
+        with open(self.pack_path, 'rb') as f:
+            for name in self.profiles():
+                for entry in self._log(name):
+                    try: meta, buttons, _ = self._manifest(entry['id'], f)
+                    except KeyError: continue
+                    live.add(meta); live.update(buttons)
+                    vid = entry['id']
+                    while vid and vid not in live:  # 增量链上的版本也要保留
+                        live.add(vid); vid = json.loads(self._read(vid, f)).get('base')
+            live = {bytes.fromhex(h) for h in live}
+            removed = len(index) - len(live & index.keys())
+            if not removed: return 0
+            tmp = self.pack_path + '.tmp'; new_index = {}
+            with open(tmp, 'wb') as out:
+                for digest, (offset, length) in index.items():
+                    if digest not in live: continue
+                    f.seek(offset)
+                    out.write(_HEADER.pack(digest, length)); new_index[digest] = (out.tell(), length); out.write(f.read(length))
+                out.flush(); os.fsync(out.fileno())
+        os.replace(tmp, self.pack_path)
+        self._index = new_index
+        self._cache = {d: v for d, v in self._cache.items() if d in live}
+        return removed
+
+    def stats(self):
+        index = self._load_index()
+        names = self.profiles()
+        return {'profiles': len(names), 'versions': sum(len(self._log(n)) for n in names), 'objects': len(index),
+                'pack_bytes': os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0}
+
+
+def benchmark(buttons=100, saves=2000, coalesce_s=0):
+    """模拟长时间拖动：每次保存只移动一个按钮，返回每次快照耗时、还原耗时和最终占用（coalesce_s=0 时每次保存都是一个版本）"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProfileStore(tmp, keep=50, coalesce_s=coalesce_s)
+        config = {'buttons': [{'id': str(i), 'label': f"按钮{i}", 'shortcut': 'ctrl+c', 'position': [i * 10, i * 5], 'size': [120, 60],
+                               'color': '#0A84FF', 'textColor': '#ffffff', 'opacity': 0.9} for i in range(buttons)]}
+        t = time.perf_counter()
+        for i in range(saves):
+            config['buttons'][i % buttons]['position'][0] += 1
+            store.snapshot('bench.json', config)
+        snapshot_ms = (time.perf_counter() - t) * 1000 / saves
+        store._cache.clear()
+        vid = store.versions('bench.json')[-1]['id']
+        t = time.perf_counter(); restored = store.load('bench.json', vid); load_ms = (time.perf_counter() - t) * 1000
+        raw = len(json.dumps(config, indent=2, ensure_ascii=False).encode('utf-8'))
+        return dict(store.stats(), buttons=len(restored['buttons']), snapshot_ms=round(snapshot_ms, 3), load_ms=round(load_ms, 3),
+                    profile_bytes=raw, full_copies_bytes=raw * len(store.versions('bench.json')))
+
+
+if __name__ == "__main__":
+    # python profile_store.py           性能测试
+    # python profile_store.py config    列出 config 目录下各配置的历史版本
+    import sys
+    if len(sys.argv) < 2: print(json.dumps(benchmark(), ensure_ascii=False, indent=2)); sys.exit(0)
+    store = ProfileStore(sys.argv[1])
+    for name in store.profiles():
+        exists = os.path.exists(os.path.join(sys.argv[1], name))
+        print(f"{name}{'' if exists else '（已删除）'}")
+        for e in store.versions(name): print(f"  {describe_version(e)}")
+    print(json.dumps(store.stats(), ensure_ascii=False))
@@ -0,0 +1,459 @@
+"""配置同步（无界面，不需要 PyQt5）
+
+    python profile_sync.py serve 目录 [--port 8765]          本地替身服务器：把目录中的配置按同步协议提供出去
+    python profile_sync.py pull http://主机:8765 [config/]    拉取变化并合并到配置目录（主程序运行时用 main.py --sync）
+    python profile_sync.py bench                             测试每次同步的流量和耗时
+
+协议（HTTP + JSON，响应可 gzip 压缩）：
+    GET  /manifest                      {"profiles": {配置名: 配置摘要}}，带 ETag；没有任何变化时返回 304
+    GET  /profiles/<配置名>?since=摘要  按钮索引 {"meta": 摘要, "buttons": [[id, 摘要], ...]}；
+                                        服务器认得 since 时只返回增量 {"since", "meta", "set": {id: 摘要}, "order": [id]（按钮增删或换序时）}
+    POST /objects  {"hashes": [...]}    {"objects": {摘要: 内容}}，只请求本机没有的按钮 / 整体设置
+摘要是规范化 JSON 的 blake2b；配置摘要 = 按钮索引的摘要。一次同步的流量只与变化的配置和按钮有关：
+没有变化时只有一个 304，改了一个按钮时是一个按钮索引的增量加一个按钮的内容。
+"""
+import os
+import sys
+import copy
+import json
+import gzip
+import time
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from profile_compiler import upgrade_profile
+
+SYNC_DIR = '.sync'  # config/.sync/state.json 与 config/.sync/bases/<配置名>（上次同步的服务器版本，合并基准）
+PREFS_FILE = 'preferences.json'
+KEEP_LOCAL = ('position',)  # 本机和服务器都改了时保留本机值的字段（本机拖动过的位置）
+GZIP_MIN = 512  # 响应超过这么多字节才压缩
+_MISSING = object()
+
+
+def content_hash(obj):
+    return hashlib.blake2b(json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def profile_index(config):
+    """配置 -> (按钮索引, {摘要: 内容})"""
+    meta = {k: v for k, v in config.items() if k != 'buttons'}
+    objects = {content_hash(meta): meta}
+    index = {'meta': next(iter(objects)), 'buttons': []}
+    for button in config.get('buttons', []):
+        if not isinstance(button, dict): continue
+        h = content_hash(button); objects[h] = button
+        index['buttons'].append([button.get('id'), h])
+    return index, objects
+
+
+def index_delta(old, new):
+    old_map = dict(map(tuple, old['buttons'])); ids = [i for i, _ in new['buttons']]
+    delta = {'meta': new['meta'], 'set': {i: h for i, h in new['buttons'] if old_map.get(i) != h}}
+    if [i for i, _ in old['buttons']] != ids: delta['order'] = ids
+    return delta
+
+
+def apply_index_delta(old, delta):
+    mapping = dict(map(tuple, old['buttons'])); mapping.update(delta['set'])
+    ids = delta.get('order') or [i for i, _ in old['buttons']]
+    return {'meta': delta['meta'], 'buttons': [[i, mapping[i]] for i in ids]}
+
+
+def valid_profile_name(name):
+    """服务器给出的配置名只能是配置目录下的普通 .json 文件名"""
+    return (isinstance(name, str) and name.endswith('.json') and name != PREFS_FILE and not name.startswith('.')
+            and '/' not in name and '\\' not in name and ':' not in name and '\0' not in name)
+
+
+def _buttons_by_id(config):
+    return {b['id']: b for b in (config or {}).get('buttons', []) if isinstance(b, dict) and isinstance(b.get('id'), str)}
+
+
+def _edited(base, local):
+    """本机是否改过基准中的字段（本机配置加载时补全了默认值，不能直接比较整个字典）"""
+    return any(local.get(k, _MISSING) != v for k, v in base.items())
+
+
+def merge_profile(base, local, remote, keep_local=KEEP_LOCAL):
+    """三方合并：base 为上次同步的服务器版本，local 为本机当前配置，remote 为新的服务器版本
+
+    按按钮 id 逐字段合并：只有一方改过的字段取改过的一方；双方改成不同的值时，keep_local 中的字段保留本机的值
+    （默认位置：本机拖动过的按钮不会被挪回去），其他字段以服务器为准。本机新增的按钮保留；服务器删除的按钮删除，
+    本机删除而服务器改过的按钮恢复。没有 base（首次同步）时本机内容视为未修改，结果与服务器一致。
+    返回 (merged, report)；没有变化的按钮仍是 local 中的同一个字典，主程序据此只重建变化的按钮。
+    report = {'changed': {id: [字段]}, 'added': [id], 'removed': [id], 'meta': [字段], 'conflicts': [[id, 字段, 'local' / 'remote']]}
+    """
+    if local is None: local = {'buttons': []}
+    if base is None: base = local
+    conflicts = []
+
+    def merge_fields(b, l, r, where):
+        out, changed = l, []
+        for key in r.keys() | l.keys() | b.keys():
+            if key == 'buttons' and where is None: continue
+            bv, lv, rv = b.get(key, _MISSING), l.get(key, _MISSING), r.get(key, _MISSING)
+            if rv == bv or rv == lv: continue  # 服务器没改，或者已经一致
+            if lv != bv and bv is not _MISSING:  # 双方都改了（基准里没有的字段多半是加载时补全的默认值，不算本机修改）
+                kept = 'local' if key in keep_local else 'remote'
+                conflicts.append([where, key, kept])
+                if kept == 'local': continue
+            if out is l: out = dict(l)
+            if rv is _MISSING: out.pop(key, None)
+            else: out[key] = copy.deepcopy(rv)
+            changed.append(key)
+        return out, changed
+
+    base_map, local_map, remote_map = _buttons_by_id(base), _buttons_by_id(local), _buttons_by_id(remote)
+    merged_map, changed, added, removed = {}, {}, [], []
+    for bid, r in remote_map.items():
+        l, b = local_map.get(bid), base_map.get(bid)
+        if l is None:
+            if b is not None and b == r: continue  # 本机删除了，服务器没改：保持删除
+            if b is not None: conflicts.append([bid, None, 'remote'])  # 本机删除了但服务器改过：恢复
+            merged_map[bid] = copy.deepcopy(r); added.append(bid)
+            continue
+        merged_map[bid], fields = merge_fields(b or {}, l, r, bid)
+        if fields: changed[bid] = fields
+    for bid, l in local_map.items():
+        if bid in remote_map: continue
+        b = base_map.get(bid)
+        if b is None: merged_map[bid] = l; continue  # 本机新增
+        if _edited(b, l): conflicts.append([bid, None, 'remote'])  # 本机改过但服务器删除了
+        removed.append(bid)
+    meta, meta_fields = merge_fields(base, local, remote, None)
+    # 按服务器的顺序，本机新增的按钮（以及没有 id 的旧按钮）排在最后
+    order = [bid for bid in remote_map if bid in merged_map] + [bid for bid in local_map if bid not in remote_map and bid in merged_map]
+    extra = [b for b in local.get('buttons', []) if isinstance(b, dict) and not isinstance(b.get('id'), str)]
+    merged = {k: v for k, v in meta.items() if k != 'buttons'}
+    merged['buttons'] = [merged_map[bid] for bid in order] + extra
+    return merged, {'changed': changed, 'added': added, 'removed': removed, 'meta': meta_fields, 'conflicts': conflicts}
+
+
+def _write_json(path, data, indent=2):
+    """先写临时文件再替换：读到的总是完整的旧文件或新文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f: json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class SyncError(Exception):
+    pass
+
+
+class SyncClient:
+    """从配置服务器拉取变化（fetch，只联网，可在后台线程运行）并合并写入配置目录（apply）"""
+
+    def __init__(self, config_dir, server, keep_local=KEEP_LOCAL, timeout=10):
+        self.config_dir = config_dir
+        self.server = server.rstrip('/')
+        self.keep_local = tuple(keep_local)
+        self.timeout = timeout
+        self.directory = os.path.join(config_dir, SYNC_DIR)
+        self.state_file = os.path.join(self.directory, 'state.json')
+        self.bases = os.path.join(self.directory, 'bases')  # 与 state.json 分开：配置名可以是任意 *.json
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f: self.state = json.load(f)
+        except (OSError, ValueError): self.state = {}
+        if self.state.get('server') != self.server: self.state = {'server': self.server, 'etag': None}  # 换了服务器：重新比较
+        self.bytes_received = 0; self.requests = 0
+
+    # ------------------------------------------------------------ 网络
+    def _request(self, path, body=None, etag=None):
+        """返回 (状态码, JSON, ETag)；bytes_received 统计响应体（压缩后）的字节数"""
+        headers = {'Accept-Encoding': 'gzip', 'Accept': 'application/json'}
+        if etag: headers['If-None-Match'] = etag
+        data = None
+        if body is not None: data = json.dumps(body).encode('utf-8'); headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.server + path, data=data, headers=headers, method='POST' if data is not None else 'GET')
+        self.requests += 1
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                raw = response.read(); self.bytes_received += len(raw)
+                if response.headers.get('Content-Encoding') == 'gzip': raw = gzip.decompress(raw)
+                return response.status, json.loads(raw), response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            if e.code == 304: return 304, None, etag
+            raise SyncError(f"{path}: HTTP {e.code}") from None
+        except (urllib.error.URLError, OSError, ValueError) as e: raise SyncError(f"{path}: {e}") from None
+
+    def _index(self, name, since, old_index):
+        path = '/profiles/' + urllib.parse.quote(name)
+        if since and old_index is not None:
+            _, data, _ = self._request(f"{path}?since={since}")
+            if 'set' not in data: return data  # 服务器不认得 since：返回了完整索引
+            try: return apply_index_delta(old_index, data)
+            except KeyError: pass
+        return self._request(path)[1]
+
+    def base(self, name):
+        """上次同步的服务器版本 (摘要, 配置)，没有时返回 (None, None)"""
+        try:
+            with open(os.path.join(self.bases, name), 'r', encoding='utf-8') as f: data = json.load(f)
+            return data['hash'], data['config']
+        except (OSError, ValueError, KeyError): return None, None
+
+    def synced_profiles(self):
+        try: return sorted(n for n in os.listdir(self.bases) if valid_profile_name(n))
+        except OSError: return []
+
+    def fetch(self):
+        """联网获取有变化的配置，不修改任何文件
+
+        返回 {'etag', 'updates': [(配置名, 摘要, 服务器版本)], 'removed': [服务器上已删除的配置], 'bytes', 'requests'}
+        """
+        bytes0, requests0 = self.bytes_received, self.requests
+        status, manifest, etag = self._request('/manifest', etag=self.state.get('etag'))
+        updates, removed = [], []
+        if status != 304:
+            profiles = manifest.get('profiles', {})
+            for name, remote_hash in sorted(profiles.items()):
+                if not valid_profile_name(name): print(f"忽略服务器上的配置名: {name!r}"); continue
+                base_hash, base = self.base(name)
+                if remote_hash == base_hash: continue
+                known, old_index = {}, None
+                if base is not None: old_index, known = profile_index(base)
+                try:  # 本机文件里与服务器相同的按钮也不必下载（首次同步、手动拷贝过的配置）
+                    with open(os.path.join(self.config_dir, name), 'r', encoding='utf-8') as f: known.update(profile_index(upgrade_profile(json.load(f)))[1])
+                except (OSError, ValueError): pass
+                index = self._index(name, base_hash, old_index)
+                if content_hash(index) != remote_hash:
+                    index = self._request('/profiles/' + urllib.parse.quote(name))[1]  # 增量对不上：取完整索引
+                    if content_hash(index) != remote_hash: continue  # 服务器上的文件刚好在变化，下次再同步
+                need = sorted({index['meta'], *(h for _, h in index['buttons'])} - known.keys())
+                if need:
+                    objects = self._request('/objects', {'hashes': need})[1].get('objects', {})
+                    for h in need:
+                        if h not in objects or content_hash(objects[h]) != h: raise SyncError(f"{name}: 服务器返回的内容与摘要不符")
+                    known.update(objects)
+                config = copy.deepcopy(known[index['meta']])
+                config['buttons'] = [copy.deepcopy(known[h]) for _, h in index['buttons']]
+                updates.append((name, remote_hash, config))
+            removed = [name for name in self.synced_profiles() if name not in profiles]
+        return {'etag': etag, 'updates': updates, 'removed': removed,
+                'bytes': self.bytes_received - bytes0, 'requests': self.requests - requests0}
+
+    # ------------------------------------------------------------ 写入
+    def apply(self, name, remote_hash, remote, local=None):
+        """与本机配置三方合并，原子写入配置文件并记下新的合并基准，返回 (merged, report)
+
+        local 为主程序内存中的当前配置（含未保存的拖动位置），None 时读取配置文件。
+        """
+        path = os.path.join(self.config_dir, name)
+        exists = local is not None
+        if local is None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f: local = upgrade_profile(json.load(f)); exists = True
+            except FileNotFoundError: pass
+        merged, report = merge_profile(self.base(name)[1], local, remote, self.keep_local)
+        if not exists or report['changed'] or report['added'] or report['removed'] or report['meta']: _write_json(path, merged)
+        _write_json(os.path.join(self.bases, name), {'hash': remote_hash, 'config': remote}, None)
+        return merged, report
+
+    def forget(self, name):
+        """服务器上已删除的配置：不再同步（本机文件保留）"""
+        try: os.remove(os.path.join(self.bases, name))
+        except OSError: pass
+
+    def commit(self, etag):
+        """全部应用完成后记下清单的 ETag；传 None 表示下次重新比较"""
+        self.state['etag'] = etag
+        _write_json(self.state_file, self.state)
+
+    def pull(self):
+        """fetch + apply 全部配置（命令行用；主程序在界面线程里 apply，以便合并内存中的配置）"""
+        t = time.perf_counter()
+        result = self.fetch()
+        t_fetch = time.perf_counter()
+        conflicts = []
+        for name, remote_hash, remote in result['updates']:
+            conflicts += [[name] + c for c in self.apply(name, remote_hash, remote)[1]['conflicts']]
+        for name in result['removed']: self.forget(name)
+        self.commit(result['etag'])
+        return {'updated': [u[0] for u in result['updates']], 'removed': result['removed'], 'conflicts': conflicts,
+                'bytes': result['bytes'], 'requests': result['requests'],
+                'fetch_ms': round((t_fetch - t) * 1000, 2), 'apply_ms': round((time.perf_counter() - t_fetch) * 1000, 2)}
+
+    def stats(self):
+        return {'server': self.server, 'requests': self.requests, 'bytes_received': self.bytes_received, 'profiles': len(self.synced_profiles())}
+
+
+# ---------------------------------------------------------------- 本地替身服务器
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args): pass
+
+    def _send(self, status, data=None, etag=None):
+        body = b'' if data is None else json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        if etag: self.send_header('ETag', etag)
+        if body:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            if len(body) > GZIP_MIN and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, 6); self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body: self.wfile.write(body)
+        self.server.owner.bytes_sent += len(body); self.server.owner.requests += 1
+
+    def do_GET(self):
+        owner = self.server.owner
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/manifest':
+            manifest = owner.manifest(); etag = f'"{content_hash(manifest)}"'
+            if self.headers.get('If-None-Match') == etag: return self._send(304, etag=etag)
+            return self._send(200, manifest, etag)
+        if url.path.startswith('/profiles/'):
+            name = urllib.parse.unquote(url.path[len('/profiles/'):])
+            index = owner.index(name, urllib.parse.parse_qs(url.query).get('since', [None])[0])
+            return self._send(200, index) if index is not None else self._send(404, {'error': name})
+        self._send(404, {'error': url.path})
+
+    def do_POST(self):
+        if self.path != '/objects': return self._send(404, {'error': self.path})
+        try: hashes = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))['hashes']
+        except (ValueError, KeyError, TypeError): return self._send(400, {'error': "需要 {\"hashes\": [...]}"})
+        self._send(200, {'objects': self.server.owner.objects(hashes)})
+
+
+class ProfileServer:
+    """本地替身服务器：按同步协议提供目录中的配置文件（测试和小规模部署用）
+
+    文件按修改时间重新读取；提供过的按钮索引保留最近 INDEX_CACHE 个，客户端带上这些版本的 since 时只返回增量。
+    没有 id 的按钮按序号给一个固定的 id。
+    """
+    INDEX_CACHE = 256
+
+    def __init__(self, directory, host='127.0.0.1', port=0):
+        self.directory = directory
+        self._files = {}  # 配置名 -> (mtime_ns, 索引, 摘要, 对象)
+        self._indexes = OrderedDict()  # 配置摘要 -> 索引
+        self._lock = threading.Lock()
+        self.bytes_sent = 0; self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), _Handler); self.httpd.daemon_threads = True
+        self.httpd.owner = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="ProfileServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+    def _scan(self):
+        names = set()
+        for name in sorted(os.listdir(self.directory)):
+            if not valid_profile_name(name): continue
+            path = os.path.join(self.directory, name)
+            try: mtime = os.stat(path).st_mtime_ns
+            except OSError: continue
+            names.add(name)
+            entry = self._files.get(name)
+            if entry and entry[0] == mtime: continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f: config = upgrade_profile(json.load(f))
+            except (OSError, ValueError) as e: print(f"读取配置失败 {name}: {e}"); names.discard(name); continue
+            for i, button in enumerate(b for b in config.get('buttons', []) if isinstance(b, dict)):
+                if not isinstance(button.get('id'), str): button['id'] = f"{os.path.splitext(name)[0]}-{i}"
+            index, objects = profile_index(config)
+            h = content_hash(index)
+            self._files[name] = (mtime, index, h, objects)
+            self._indexes[h] = index; self._indexes.move_to_end(h)
+            while len(self._indexes) > self.INDEX_CACHE: self._indexes.popitem(last=False)
+        for name in set(self._files) - names: del self._files[name]
+
+    def manifest(self):
+        with self._lock:
+            self._scan()
+            return {'profiles': {name: entry[2] for name, entry in self._files.items()}}
+
+    def index(self, name, since=None):
+        with self._lock:
+            self._scan()
+            entry = self._files.get(name)
+            if entry is None: return None
+            old = self._indexes.get(since) if since else None
+            if old is None: return entry[1]
+            delta = index_delta(old, entry[1]); delta['since'] = since
+            return delta
+
+    def objects(self, hashes):
+        with self._lock:
+            found = {}
+            for entry in self._files.values():
+                for h in hashes:
+                    if h in entry[3]: found[h] = entry[3][h]
+            return found
+
+
+def benchmark(profiles=50, buttons=100):
+    """profiles 个配置、每个 buttons 个按钮：比较整份拷贝与同步的流量，以及改一个按钮后同步的流量和耗时"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        served, local = os.path.join(tmp, 'server'), os.path.join(tmp, 'config')
+        os.makedirs(served)
+        for p in range(profiles):
+            config = {'buttons': [{'id': f'b{i}', 'label': f'键 {i}', 'shortcut': 'ctrl+c', 'position': [i * 10, p], 'size': [100, 50],
+                                   'color': '#ffffff', 'textColor': '#000000', 'opacity': 0.8} for i in range(buttons)]}
+            _write_json(os.path.join(served, f'p{p}.json'), config)
+        full = sum(os.path.getsize(os.path.join(served, n)) for n in os.listdir(served))
+        server = ProfileServer(served).start()
+        try:
+            client = SyncClient(local, server.url)
+            first = client.pull()
+            unchanged = client.pull()
+            # 服务器改了 p0 的一个按钮快捷键；本机同时拖动了同一个按钮
+            path = os.path.join(served, 'p0.json')
+            with open(path, 'r', encoding='utf-8') as f: config = json.load(f)
+            config['buttons'][3]['shortcut'] = 'f5'; config['buttons'][3]['position'] = [1, 1]
+            _write_json(path, config)
+            with open(os.path.join(local, 'p0.json'), 'r', encoding='utf-8') as f: mine = json.load(f)
+            mine['buttons'][3]['position'] = [500, 300]
+            _write_json(os.path.join(local, 'p0.json'), mine)
+            one = client.pull()
+            with open(os.path.join(local, 'p0.json'), 'r', encoding='utf-8') as f: merged = json.load(f)['buttons'][3]
+        finally: server.stop()
+    return {'profiles': profiles, 'buttons': buttons, 'full_copy_bytes': full,
+            'first_sync': {k: first[k] for k in ('bytes', 'requests', 'fetch_ms', 'apply_ms')},
+            'unchanged': {k: unchanged[k] for k in ('bytes', 'requests', 'fetch_ms')},
+            'one_button': {k: one[k] for k in ('bytes', 'requests', 'fetch_ms', 'apply_ms', 'conflicts')},
+            'merged_button': {'shortcut': merged['shortcut'], 'position': merged['position']}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="配置同步客户端 / 本地替身服务器")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help="提供目录中的配置"); p.add_argument('directory'); p.add_argument('--host', default='127.0.0.1'); p.add_argument('--port', type=int, default=8765)
+    p = sub.add_parser('pull', help="拉取并合并到配置目录"); p.add_argument('server'); p.add_argument('config_dir', nargs='?', default='config')
+    p.add_argument('--keep-local', default=','.join(KEEP_LOCAL), help="双方都改了时保留本机值的字段（逗号分隔）")
+    p = sub.add_parser('bench', help="流量与耗时测试"); p.add_argument('--profiles', type=int, default=50); p.add_argument('--buttons', type=int, default=100)
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        server = ProfileServer(args.directory, args.host, args.port)
+        print(f"提供 {os.path.abspath(args.directory)}: {server.url}")
+        try: server.httpd.serve_forever()
+        except KeyboardInterrupt: pass
+        return 0
+    if args.command == 'bench':
+        print(json.dumps(benchmark(args.profiles, args.buttons), ensure_ascii=False, indent=2)); return 0
+    try: result = SyncClient(args.config_dir, args.server, [f for f in args.keep_local.split(',') if f]).pull()
+    except SyncError as e: print(f"同步失败: {e}"); return 2
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
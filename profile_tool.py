@@ -0,0 +1,249 @@
+"""配置文件批量工具（无界面，不需要显示器和 PyQt5）
+
+    python profile_tool.py validate config/               检查配置（有错误时退出码为 1）
+    python profile_tool.py normalize config/*.json -i     规范化并写回（补全字段、统一格式、转换旧格式）；不加 -i/-o 只检查
+    python profile_tool.py convert old/ -o config/        转换旧格式（按钮列表、x/y/width/height）
+    python profile_tool.py rescale config/ --from 1920x1080 --to 2560x1440 -o out/
+    python profile_tool.py merge a.json b.json -o all.json
+    python profile_tool.py diff old/ new/                 按按钮 id 比较（有差异时退出码为 1）
+
+参数可以是文件、目录（其中所有 *.json，preferences.json 除外）或通配符。多个文件时用进程池并行处理，
+结果按输入顺序逐个输出。退出码：0 正常，1 发现错误 / 差异，2 文件无法读取或写入。
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from profile_compiler import compile_profile, upgrade_profile
+
+PREFS_FILE = 'preferences.json'
+PARALLEL_MIN = 16  # 文件数少于此值时在本进程内处理，省去启动进程池的开销
+
+
+def expand_paths(args):
+    """文件 / 目录 / 通配符 -> 排序后的文件列表（目录只取其中的 *.json，跳过 preferences.json）"""
+    files = []
+    for arg in args:
+        if os.path.isdir(arg):
+            files += sorted(os.path.join(arg, f) for f in os.listdir(arg) if f.endswith('.json') and f != PREFS_FILE)
+        elif glob.has_magic(arg):
+            files += sorted(f for f in glob.glob(arg) if os.path.basename(f) != PREFS_FILE)
+        else: files.append(arg)
+    return files
+
+
+def load_profile(path):
+    with open(path, 'r', encoding='utf-8') as f: return upgrade_profile(json.load(f))
+
+
+def dump_profile(config, path):
+    """与主程序保存配置相同的格式；先写临时文件再替换，中途失败不会留下半个文件"""
+    text = json.dumps(config, indent=2, ensure_ascii=False)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f: f.write(text)
+    os.replace(tmp, path)
+    return text
+
+
+def output_path(path, opts):
+    if opts.get('in_place'): return path
+    if opts.get('out'): return os.path.join(opts['out'], os.path.basename(path))
+    return None
+
+
+def parse_resolution(text):
+    try:
+        w, h = (int(v) for v in text.lower().split('x'))
+        if w > 0 and h > 0: return w, h
+    except ValueError: pass
+    raise argparse.ArgumentTypeError(f"分辨率格式应为 宽x高: {text}")
+
+
+def rescale_profile(config, src, dst, fonts=False):
+    """把按钮位置和尺寸从 src 分辨率换算到 dst（均为 (宽, 高)），结果限制在屏幕内"""
+    sx, sy = dst[0] / src[0], dst[1] / src[1]
+    for b in config['buttons']:
+        w = max(1, round(b['size'][0] * sx)); h = max(1, round(b['size'][1] * sy))
+        b['size'] = [w, h]
+        b['position'] = [min(max(0, round(b['position'][0] * sx)), max(0, dst[0] - w)), min(max(0, round(b['position'][1] * sy)), max(0, dst[1] - h))]
+        if fonts: b['fontSize'] = max(1, round(b['fontSize'] * min(sx, sy)))
+    return config
+
+
+# ---------------------------------------------------------------- 单个文件的任务（在工作进程中运行）
+# 每个任务返回 (path, status, lines)：status 为 STATUS_TEXT 中的一项
+
+def _issue_lines(issues, quiet_warnings=False):
+    return [f"  [{'错误' if i.level == 'error' else '修正'}] {i}" for i in issues if not (quiet_warnings and i.level != 'error')]
+
+
+def task_validate(path, opts):
+    try: config = load_profile(path)
+    except (OSError, ValueError) as e: return path, 'failed', [f"  无法读取: {e}"]
+    plans, issues = compile_profile(config, stylesheets=False)
+    errors = sum(1 for i in issues if i.level == 'error')
+    status = 'error' if errors or (opts.get('strict') and issues) else ('warning' if issues else 'ok')
+    return path, status, [f"  {len(plans)} 个按钮"] * bool(opts.get('verbose')) + _issue_lines(issues, not opts.get('strict') and not opts.get('verbose'))
+
+
+def task_normalize(path, opts):
+    """normalize / convert / rescale 共用：读取、（换算）、编译规范化、写出"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f: original = f.read()
+        config = upgrade_profile(json.loads(original))
+    except (OSError, ValueError) as e: return path, 'failed', [f"  无法读取: {e}"]
+    plans, issues = compile_profile(config, stylesheets=False)
+    if opts.get('rescale'): rescale_profile(config, opts['rescale'][0], opts['rescale'][1], opts.get('fonts'))
+    errors = [i for i in issues if i.level == 'error']
+    text = json.dumps(config, indent=2, ensure_ascii=False)
+    changed = text != original
+    target = output_path(path, opts)
+    if target and (changed or target != path):
+        try: dump_profile(config, target)
+        except OSError as e: return path, 'failed', [f"  无法写入 {target}: {e}"]
+    lines = _issue_lines(issues) + ([f"  -> {target}"] if target and target != path else [])
+    return path, 'error' if errors else ('changed' if changed else 'ok'), lines
+
+
+def _index_buttons(config):
+    return {b['id']: b for b in config['buttons']}
+
+
+def diff_profiles(a, b):
+    """按按钮 id 比较两份（已规范化的）配置，返回差异行列表"""
+    ia, ib = _index_buttons(a), _index_buttons(b)
+    name = lambda btn: btn.get('label') or btn.get('shortcut') or btn['id'][:8]
+    lines = [f"  - [{name(ia[k])}] {k}" for k in ia if k not in ib]
+    lines += [f"  + [{name(ib[k])}] {k}" for k in ib if k not in ia]
+    for k in ia:
+        if k not in ib: continue
+        old, new = ia[k], ib[k]
+        for field in sorted(set(old) | set(new)):
+            if old.get(field) != new.get(field):
+                lines.append(f"  ~ [{name(new)}] {field}: {json.dumps(old.get(field), ensure_ascii=False)} -> {json.dumps(new.get(field), ensure_ascii=False)}")
+    for key in sorted((set(a) | set(b)) - {'buttons'}):
+        if a.get(key) != b.get(key): lines.append(f"  ~ {key}: {json.dumps(a.get(key), ensure_ascii=False)} -> {json.dumps(b.get(key), ensure_ascii=False)}")
+    return lines
+
+
+def task_diff(pair, opts):
+    left, right = pair
+    configs = []
+    for path in pair:
+        if not os.path.exists(path): configs.append(None); continue
+        try: config = load_profile(path)
+        except (OSError, ValueError) as e: return f"{left} {right}", 'failed', [f"  无法读取 {path}: {e}"]
+        compile_profile(config, stylesheets=False); configs.append(config)
+    label = f"{left} {right}"
+    if configs[0] is None and configs[1] is None: return label, 'failed', ["  两个文件都不存在"]
+    if configs[0] is None or configs[1] is None: return label, 'differs', [f"  只存在于 {right if configs[0] is None else left}"]
+    lines = diff_profiles(*configs)
+    return label, 'differs' if lines else 'ok', lines
+
+
+def task_load(path, opts):
+    try: config = load_profile(path)
+    except (OSError, ValueError) as e: return path, 'failed', [f"  无法读取: {e}"], None
+    return path, 'ok', [], config
+
+
+# ---------------------------------------------------------------- 调度与输出
+def run_tasks(fn, items, opts, jobs=None):
+    """按输入顺序逐个产出任务结果；文件多时用进程池，边处理边输出"""
+    if len(items) < PARALLEL_MIN or jobs == 1:
+        for item in items: yield fn(item, opts)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(fn, items, [opts] * len(items), chunksize=max(1, min(64, len(items) // (jobs * 8))))
+
+
+STATUS_TEXT = {'ok': "正常", 'warning': "有警告", 'changed': "已更新", 'differs': "有差异", 'error': "有错误", 'failed': "失败"}
+
+
+def report(results, quiet=False, fail_on=('error',), out=sys.stdout):
+    """逐个输出结果，返回退出码：有 failed 为 2，有 fail_on 中的状态为 1，否则为 0"""
+    counts = dict.fromkeys(STATUS_TEXT, 0)
+    t = time.perf_counter()
+    for label, status, lines, *_ in results:
+        counts[status] += 1
+        if quiet and status in ('ok', 'warning', 'changed'): continue
+        out.write(f"{label}: {STATUS_TEXT[status]}\n")
+        for line in lines: out.write(line + "\n")
+        out.flush()
+    total = sum(counts.values())
+    print(f"共 {total} 项：" + "，".join(f"{STATUS_TEXT[k]} {v}" for k, v in counts.items() if v) + f"（{time.perf_counter() - t:.2f} 秒）", file=sys.stderr)
+    return 2 if counts['failed'] else (1 if any(counts[k] for k in fail_on) else 0)
+
+
+def cmd_diff(args, opts):
+    left, right = args.paths
+    if os.path.isdir(left) and os.path.isdir(right):
+        names = sorted({os.path.basename(f) for f in expand_paths([left, right])})
+        pairs = [(os.path.join(left, n), os.path.join(right, n)) for n in names]
+    else: pairs = [(left, right)]
+    return report(run_tasks(task_diff, pairs, opts, args.jobs), args.quiet, fail_on=('differs',))
+
+
+def cmd_merge(args, opts):
+    merged, seen = None, 0
+    code = 0
+    for path, status, lines, config in run_tasks(task_load, expand_paths(args.paths), opts, args.jobs):
+        if config is None:
+            print(f"{path}: {STATUS_TEXT[status]}\n" + "\n".join(lines)); code = 2; continue
+        if not isinstance(config, dict) or not isinstance(config.get('buttons', []), list):
+            print(f"{path}: 不是有效的配置（buttons 必须是列表），已跳过"); code = 2; continue
+        if merged is None: merged = config; merged.setdefault('buttons', [])
+        else: merged['buttons'] += config.get('buttons', [])
+        seen += 1
+    if merged is None: print("没有可合并的配置", file=sys.stderr); return 2
+    plans, issues = compile_profile(merged, stylesheets=False)  # 重复的 id 会重新生成
+    for line in _issue_lines(issues): print(line)
+    try: dump_profile(merged, args.out)
+    except OSError as e: print(f"无法写入 {args.out}: {e}", file=sys.stderr); return 2
+    print(f"合并 {seen} 个配置，共 {len(plans)} 个按钮 -> {args.out}", file=sys.stderr)
+    return code or (1 if any(i.level == 'error' for i in issues) else 0)
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-j', '--jobs', type=int, help="并行进程数（默认 CPU 核数）")
+    common.add_argument('-q', '--quiet', action='store_true', help="只输出有问题的文件")
+    parser = argparse.ArgumentParser(prog="profile_tool.py", description="TouchMultiButton 配置文件批量工具")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('validate', parents=[common], help="检查配置")
+    p.add_argument('paths', nargs='+'); p.add_argument('--strict', action='store_true', help="自动修正项也算错误")
+    p.add_argument('-v', '--verbose', action='store_true', help="同时列出自动修正项")
+    for name, text in (('normalize', "规范化配置"), ('convert', "转换旧格式配置"), ('rescale', "按新分辨率换算位置和尺寸")):
+        p = sub.add_parser(name, parents=[common], help=text)
+        p.add_argument('paths', nargs='+')
+        dest = p.add_mutually_exclusive_group(required=name != 'normalize')
+        dest.add_argument('-i', '--in-place', action='store_true', help="写回原文件")
+        dest.add_argument('-o', '--out', metavar='DIR', help="写到目录（保持文件名）")
+        if name == 'rescale':
+            p.add_argument('--from', dest='src', type=parse_resolution, required=True, metavar='WxH')
+            p.add_argument('--to', dest='dst', type=parse_resolution, required=True, metavar='WxH')
+            p.add_argument('--fonts', action='store_true', help="字号按比例缩放")
+    p = sub.add_parser('merge', parents=[common], help="合并多个配置的按钮"); p.add_argument('paths', nargs='+'); p.add_argument('-o', '--out', required=True)
+    p = sub.add_parser('diff', parents=[common], help="按按钮比较两个配置（或两个目录中的同名配置）"); p.add_argument('paths', nargs=2)
+
+    args = parser.parse_args(argv)
+    opts = {k: v for k, v in vars(args).items() if k in ('strict', 'verbose', 'in_place', 'out', 'fonts')}
+    if args.command == 'diff': return cmd_diff(args, opts)
+    if args.command == 'merge': return cmd_merge(args, opts)
+    files = expand_paths(args.paths)
+    if not files: print("没有找到配置文件", file=sys.stderr); return 2
+    if args.command == 'validate': return report(run_tasks(task_validate, files, opts, args.jobs), args.quiet)
+    if args.command == 'rescale': opts['rescale'] = (args.src, args.dst)
+    # normalize 不指定 -i / -o 时只检查：列出需要更新的文件，有则退出码为 1
+    check = not (args.in_place or args.out)
+    return report(run_tasks(task_normalize, files, opts, args.jobs), args.quiet, fail_on=('error', 'changed') if check else ('error',))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+
+class ProfileCapture:
+    """按需性能采集
+
+    - cProfile 跟踪主线程（Qt 事件循环、按钮回调、保存配置等），输出 .pstats
+    - 采样线程每隔 interval 秒读取所有线程的调用栈（包括点击队列、宏调度等注入线程），
+      输出 collapsed 格式（"线程;函数;函数 次数"），可直接交给 flamegraph.pl / speedscope 生成火焰图
+    不采集时不安装任何钩子、不启动线程，没有额外开销。start/stop 需在主线程调用。
+    """
+
+    def __init__(self, out_dir, interval=0.005):
+        self.out_dir = out_dir
+        self.interval = interval
+        self._profile = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._stacks = Counter()
+        self.started_at = None
+        self.samples = 0
+
+    @property
+    def active(self): return self._profile is not None
+
+    def start(self):
+        if self.active: return False
+        self._stacks.clear(); self.samples = 0; self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._sample_loop, name="ProfileSampler", daemon=True)
+        self._thread.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return True
+
+    def stop(self):
+        """停止采集并写出文件，返回 {'pstats': 路径, 'collapsed': 路径, 'summary': 路径, 'samples': 采样数}"""
+        if not self.active: return None
+        self._profile.disable()
+        profile, self._profile = self._profile, None
+        self._stop.set(); self._thread.join(timeout=1.0)
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, "profile-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at)))
+        result = {'pstats': base + ".pstats", 'collapsed': base + ".collapsed", 'summary': base + ".txt",
+                  'seconds': round(time.time() - self.started_at, 2), 'samples': self.samples}
+        profile.dump_stats(result['pstats'])
+        with open(result['collapsed'], 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common(): f.write(f"{';'.join(stack)} {count}\n")
+        with open(result['summary'], 'w', encoding='utf-8') as f:
+            stats = pstats.Stats(result['pstats'], stream=f)
+            stats.sort_stats('cumulative').print_stats(40)
+            stats.sort_stats('tottime').print_stats(20)
+        return result
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own: continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
@@ -0,0 +1,161 @@
+"""触摸会话回放：python replay.py 会话.jsonl [--speed 1] [--update] [--expect 文件] [--json]
+
+在临时配置目录中以 offscreen 方式启动程序（按键由 RecordingBackend 记录，不会真的注入），
+把录制的按下 / 移动 / 松开原样发给对应按钮，然后：
+    - 与期望的按键序列比较（默认 会话.expected.json，--update 用本次结果覆盖），不一致时退出码为 1
+    - 报告输入到注入的延迟、每个输入事件的处理耗时（含重绘）和相对录制时间的滞后分布
+--speed 1 按原速回放，2 为两倍速，0（默认）为不等待；点击 / 长按判定使用录制时的事件时间戳，结果与速度无关。
+宏按真实时间等待，和点击、摇杆是各自独立的按键来源，它们之间的先后会随回放速度变化，
+所以默认逐个按键比较（每个按键的按下 / 松开次数和顺序），--strict 才要求整体顺序完全一致。
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import tempfile
+import argparse
+import contextlib
+
+
+def _percentiles(samples):
+    if not samples: return None
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(len(s) * q))], 3)
+    return {'count': len(s), 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(s[-1], 3)}
+
+
+def _prepare(header, config_dir):
+    """把录制时的配置写入临时目录，关闭与回放无关的后台功能"""
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, header['profile']), 'w', encoding='utf-8') as f: json.dump(header['config'], f, ensure_ascii=False)
+    prefs = {'last_config': header['profile'], 'history': {'enabled': False}, 'usage': {'enabled': False}}
+    with open(os.path.join(config_dir, 'preferences.json'), 'w', encoding='utf-8') as f: json.dump(prefs, f)
+
+
+def replay(path, speed=0.0, settle_ms=300):
+    """回放会话文件，返回报告 dict（keys 为产生的 [种类, 按键] 序列）"""
+    from session_recorder import read_session
+    header, entries = read_session(path)
+    tmp = tempfile.TemporaryDirectory()
+    config_dir = os.path.join(tmp.name, 'config'); _prepare(header, config_dir)
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    os.environ['TMB_INPUT_BACKEND'] = 'recording'
+    os.environ['TMB_CONFIG_DIR'] = config_dir
+    os.environ['TMB_CONTROL_NAME'] = f"TouchMultiButton-replay-{os.getpid()}"  # 不与正在运行的实例冲突
+    with contextlib.redirect_stdout(sys.stderr):  # 程序自身的输出不混入报告
+        report = _run(path, header, entries, config_dir, speed, settle_ms)
+    tmp.cleanup()
+    return report
+
+
+def _run(path, header, entries, config_dir, speed, settle_ms):
+    from PyQt5.QtCore import QCoreApplication, QPointF, Qt
+    from PyQt5.QtGui import QMouseEvent
+    from control_server import add_arguments
+    from input_backend import RecordingBackend
+    from macro import MacroScheduler
+    from main import TouchButtonApp
+    parser = argparse.ArgumentParser(); add_arguments(parser)
+    app = TouchButtonApp(parser.parse_args(['--new-instance']))
+    for _ in range(3): QCoreApplication.processEvents()  # 完成启动后的初始化
+    macro_backend = RecordingBackend()  # 宏的按键单独记录：宏里的等待不算作注入延迟
+    app.macro_scheduler = MacroScheduler(macro_backend)
+    types = {'p': QMouseEvent.MouseButtonPress, 'm': QMouseEvent.MouseMove, 'r': QMouseEvent.MouseButtonRelease}
+    sends = []  # 每个输入事件发出时的 perf_counter_ns，用于计算注入延迟
+    handling = []; lateness = []; missing = 0
+    start = time.perf_counter()
+    for entry in entries:
+        if isinstance(entry, dict):
+            if entry.get('type') == 'profile':  # 录制期间切换了配置：写入并加载同样的内容
+                with open(os.path.join(config_dir, entry['profile']), 'w', encoding='utf-8') as f: json.dump(entry['config'], f, ensure_ascii=False)
+                app.load_config(entry['profile'])
+            continue
+        t, kind, button_id, x, y, gx, gy, stamp, button, buttons = entry
+        if speed:
+            target = start + t / 1000 / speed
+            while time.perf_counter() < target:
+                QCoreApplication.processEvents(); time.sleep(min(0.001, max(0, target - time.perf_counter())))
+            lateness.append((time.perf_counter() - target) * 1000)
+        widget = app.button_map.get(button_id)
+        if widget is None: missing += 1; continue
+        event = QMouseEvent(types[kind], QPointF(x, y), QPointF(gx, gy), Qt.MouseButton(button), Qt.MouseButtons(buttons), Qt.NoModifier)
+        event.setTimestamp(stamp)
+        t0 = time.perf_counter_ns()
+        if kind != 'm': sends.append(t0)
+        QCoreApplication.sendEvent(widget, event)
+        QCoreApplication.processEvents()  # 包括这次输入引起的重绘
+        handling.append((time.perf_counter_ns() - t0) / 1e6)
+    # 等待排队的点击和宏执行完：按键记录在 settle_ms 内不再变化即可
+    app.dispatcher.drain()
+    last = -1; stable_since = time.perf_counter()
+    while time.perf_counter() - stable_since < settle_ms / 1000:
+        QCoreApplication.processEvents(); time.sleep(0.005)
+        count = len(app.backend.events) + len(macro_backend.events)
+        if count != last: last = count; stable_since = time.perf_counter()
+    elapsed = time.perf_counter() - start
+    latency = []
+    for ns, _, _ in app.backend.events:
+        i = bisect.bisect_right(sends, ns) - 1
+        if i >= 0: latency.append((ns - sends[i]) / 1e6)
+    events = sorted(app.backend.events + macro_backend.events, key=lambda e: e[0])
+    report = {'session': os.path.basename(path), 'profile': header['profile'], 'inputs': sum(1 for e in entries if isinstance(e, list)),
+              'missing_buttons': missing, 'speed': speed, 'seconds': round(elapsed, 2),
+              'recorded_seconds': round(max((e[0] for e in entries if isinstance(e, list)), default=0) / 1000, 2),
+              'keys': [[kind, keys] for _, kind, keys in events], 'macro_keys': len(macro_backend.events),
+              'latency_ms': _percentiles(latency), 'handling_ms': _percentiles(handling), 'lateness_ms': _percentiles(lateness)}
+    app.clean_exit()
+    return report
+
+
+def compare(actual, expected, strict=False):
+    """返回第一处不同的说明，一致时返回 None；strict 为 False 时只要求每个按键自己的事件顺序一致"""
+    if strict:
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            if list(a) != list(e): return f"第 {i + 1} 个按键事件不同: 期望 {e}，实际 {a}"
+        if len(actual) != len(expected): return f"按键事件数不同: 期望 {len(expected)}，实际 {len(actual)}"
+        return None
+    def by_key(events):
+        out = {}
+        for kind, keys in events: out.setdefault(keys, []).append(kind)
+        return out
+    a, e = by_key(actual), by_key(expected)
+    for keys in sorted(set(a) | set(e)):
+        if a.get(keys, []) != e.get(keys, []):
+            got, want = a.get(keys, []), e.get(keys, [])
+            return f"按键 {keys}: 期望 {want.count('press')} 次按下 / {want.count('release')} 次松开，实际 {got.count('press')} / {got.count('release')}" \
+                if got.count('press') != want.count('press') or got.count('release') != want.count('release') else f"按键 {keys} 的按下 / 松开顺序不同"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放录制的触摸会话并检查产生的按键")
+    parser.add_argument('session')
+    parser.add_argument('--speed', type=float, default=0.0, help="回放速度倍数，0 为不等待（默认）")
+    parser.add_argument('--expect', help="期望的按键序列文件（默认 会话.expected.json）")
+    parser.add_argument('--update', action='store_true', help="用本次结果覆盖期望文件")
+    parser.add_argument('--strict', action='store_true', help="要求所有按键事件的整体顺序一致（会话中有宏时可能随速度变化）")
+    parser.add_argument('--json', action='store_true', help="输出完整报告（JSON）")
+    args = parser.parse_args(argv)
+    expect_path = args.expect or os.path.splitext(args.session)[0] + '.expected.json'
+    report = replay(args.session, args.speed)
+    status = 0
+    if args.update:
+        with open(expect_path, 'w', encoding='utf-8') as f: json.dump(report['keys'], f, ensure_ascii=False, indent=1)
+        report['expected'] = "已更新"
+    elif os.path.exists(expect_path):
+        with open(expect_path, 'r', encoding='utf-8') as f: problem = compare(report['keys'], json.load(f), args.strict)
+        report['expected'] = problem or "一致"; status = 1 if problem else 0
+    else: report['expected'] = "没有期望文件（用 --update 生成）"
+    if args.json: print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{report['session']}: {report['inputs']} 个输入事件，{len(report['keys'])} 个按键事件，用时 {report['seconds']} 秒（录制 {report['recorded_seconds']} 秒）")
+        if report['missing_buttons']: print(f"  找不到按钮的事件: {report['missing_buttons']}")
+        for name in ('latency_ms', 'handling_ms', 'lateness_ms'):
+            if report[name]: print(f"  {name}: " + "  ".join(f"{k} {v}" for k, v in report[name].items()))
+        print(f"  按键序列: {report['expected']}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import gc
+import os
+import sys
+import time
+from collections import Counter
+from PyQt5.QtCore import QObject, QTimer, QEvent, QCoreApplication
+from PyQt5.QtWidgets import QApplication, QWidget, QGraphicsEffect
+
+# 需要统计连接数的自定义信号（按类名）；Qt 自带信号的连接数对泄漏排查意义不大
+_TRACKED_SIGNALS = ('clicked', 'pressed', 'released', 'positionChanged', 'keysChanged')
+
+
+def resident_memory():
+    """当前进程的常驻内存（字节），无法获取时返回 None"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                        'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+        counters = PROCESS_MEMORY_COUNTERS(); counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb): return counters.WorkingSetSize
+        return None
+    try:
+        with open('/proc/self/statm') as f: return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def heap_in_use():
+    """glibc 堆中实际在用的字节数（mallinfo2，不含已释放但未归还的内存），其他平台返回 None"""
+    if not sys.platform.startswith('linux'): return None
+    try:
+        import ctypes
+
+        class MALLINFO2(ctypes.Structure):
+            _fields_ = [(name, ctypes.c_size_t) for name in ('arena', 'ordblks', 'smblks', 'hblks', 'hblkhd', 'usmblks', 'fsmblks', 'uordblks', 'fordblks', 'keepcost')]
+        libc = ctypes.CDLL('libc.so.6'); libc.mallinfo2.restype = MALLINFO2
+        info = libc.mallinfo2()
+        return info.uordblks + info.hblkhd
+    except (OSError, AttributeError):
+        return None
+
+
+def trim_heap():
+    """把 glibc 堆中已释放的内存还给系统（其他平台无操作）
+
+    每个悬浮按钮都是顶层窗口，重建时会分配和释放大块的绘制缓冲；glibc 不会主动归还这些空闲块，
+    RSS 看起来一直上涨但其实是可复用的空闲内存。整理后的 RSS 才能反映真正的泄漏。
+    """
+    if not sys.platform.startswith('linux'): return False
+    try:
+        import ctypes
+        return bool(ctypes.CDLL('libc.so.6').malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+
+def flush_deleted():
+    """执行所有待处理的 deleteLater 并回收 Python 循环引用，让统计反映真正存活的对象
+
+    不整理堆（trim_heap）：浸泡测试前后两次快照之间整理会让 RSS 的增长失真，heap 已经单独统计在用字节。
+    """
+    for _ in range(3):
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        QCoreApplication.processEvents()
+    gc.collect()
+
+
+def snapshot():
+    """统计当前存活的 Qt 对象，返回 dict（所有计数均为整数，便于相减）
+
+    widgets.*  QApplication.allWidgets() 按类名计数（C++ 侧真实存活的控件）
+    native     已创建原生窗口的控件数（每个悬浮按钮都是一个顶层窗口）
+    objects.*  Python 侧仍被引用的 QObject 包装按类名计数（QTimer、动画、效果等没有父对象时只在这里可见）
+    timers / active_timers / effects / connections  汇总项
+    rss / heap 常驻内存、glibc 堆在用字节（RSS 上涨而 heap 不涨说明只是空闲内存没有归还）
+    """
+    widgets = QApplication.allWidgets()
+    data = Counter()
+    for w in widgets:
+        data['widgets.' + type(w).__name__] += 1
+        if w.windowHandle() is not None: data['native'] += 1
+        if w.graphicsEffect() is not None: data['effects'] += 1
+    data['widgets'] = len(widgets)
+    for obj in gc.get_objects():
+        if not isinstance(obj, QObject): continue
+        try: name = type(obj).__name__; obj.objectName()  # 底层 C++ 对象已删除时会抛出 RuntimeError
+        except RuntimeError: data['deleted_wrappers'] += 1; continue
+        data['objects.' + name] += 1
+        if isinstance(obj, QTimer):
+            data['timers'] += 1
+            if obj.isActive(): data['active_timers'] += 1
+        elif isinstance(obj, QGraphicsEffect): data['effect_objects'] += 1
+        if isinstance(obj, QWidget) and hasattr(obj, 'config'):
+            for sig in _TRACKED_SIGNALS:
+                signal = getattr(obj, sig, None)
+                if signal is not None: data['connections'] += obj.receivers(signal)
+    data['rss'] = resident_memory() or 0
+    data['heap'] = heap_in_use() or 0
+    return dict(data)
+
+
+def growth(before, after, ignore=('rss', 'heap')):
+    """两次快照之间变化的项（只列出非零变化），rss / heap 单独换算为 MB"""
+    keys = (set(before) | set(after)) - set(ignore)
+    out = {k: after.get(k, 0) - before.get(k, 0) for k in sorted(keys) if after.get(k, 0) != before.get(k, 0)}
+    for k in ignore:
+        if before.get(k) and after.get(k): out[k + '_mb'] = round((after[k] - before[k]) / 2 ** 20, 2)
+    return out
+
+
+def summary(data):
+    """快照的简短摘要（托盘提示和 metrics 用）"""
+    keys = ('widgets', 'native', 'timers', 'active_timers', 'effects', 'connections', 'deleted_wrappers')
+    out = {k: data.get(k, 0) for k in keys}
+    out['rss_mb'] = round(data.get('rss', 0) / 2 ** 20, 1)
+    if data.get('heap'): out['heap_mb'] = round(data['heap'] / 2 ** 20, 1)
+    return out
+
+
+def soak(app, cycles=1000, dialog_every=10, warmup=20, profiles=None, progress=None):
+    """浸泡测试：反复切换配置、打开/关闭设置窗口，报告预热之后的增长
+
+    app 为 main.TouchButtonApp；profiles 默认为全部配置文件。每 dialog_every 次切换打开并关闭一次设置窗口
+    （与托盘「管理按钮」相同的创建和清理流程，只是不进入模态循环）。前 warmup 次用于填充缓存，不计入增长。
+    返回 {'cycles', 'dialogs', 'seconds', 'growth', 'per_1000', 'before', 'after'}。
+    测试期间不写入偏好设置、不记录历史版本（IPC 触发时用的是用户正在使用的配置目录），结束后恢复。
+    """
+    profiles = profiles or app.list_config_files()
+    n = max(1, len(profiles))
+    cycles = -(-cycles // n) * n; warmup = -(-warmup // n) * n  # 取整到配置数的倍数，前后两次快照停在同一个配置上
+    start_profile = app.current_config_file
+    history = app.history
+    app.save_prefs = lambda: None; app.history = None
+    try: return _soak(app, profiles, cycles, dialog_every, warmup, start_profile, progress)
+    finally:
+        del app.save_prefs; app.history = history
+
+
+def _soak(app, profiles, cycles, dialog_every, warmup, start_profile, progress):
+    dialogs = 0; before = None; t = time.perf_counter()
+    for i in range(cycles + warmup):
+        if i == warmup: flush_deleted(); before = snapshot(); t = time.perf_counter()
+        if len(profiles) > 1: app.switch_config(profiles[i % len(profiles)])
+        else: app.load_config(app.current_config_file)
+        if dialog_every and i % dialog_every == 0:
+            dialog = app.create_settings_dialog()
+            dialog.show(); QCoreApplication.processEvents()
+            dialog.reject(); app.close_settings(dialog)
+            dialogs += i >= warmup
+        QCoreApplication.processEvents()
+        if progress and i % 100 == 0: progress(i)
+    flush_deleted()
+    after = snapshot()
+    seconds = time.perf_counter() - t
+    if start_profile in profiles: app.switch_config(start_profile)
+    diff = growth(before, after)
+    return {'cycles': cycles, 'dialogs': dialogs, 'seconds': round(seconds, 2), 'growth': diff,
+            'per_1000': {k: round(v * 1000 / cycles, 2) for k, v in diff.items()}, 'before': summary(before), 'after': summary(after)}
+
+
+if __name__ == "__main__":
+    # 离线浸泡测试：python resource_monitor.py [次数]，可配合 QT_QPA_PLATFORM=offscreen 和 TMB_INPUT_BACKEND=recording
+    # 在配置目录的临时副本上运行，不改动 config/ 里的配置和偏好设置
+    import json
+    import shutil
+    import argparse
+    import tempfile
+    source = os.environ.get('TMB_CONFIG_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+    tmp = tempfile.TemporaryDirectory()
+    config_dir = os.path.join(tmp.name, 'config')
+    if os.path.isdir(source): shutil.copytree(source, config_dir, ignore=shutil.ignore_patterns('.history', '.usage', '.sync'))
+    else: os.makedirs(config_dir)
+    os.environ['TMB_CONFIG_DIR'] = config_dir
+    from control_server import add_arguments
+    from main import TouchButtonApp
+    parser = argparse.ArgumentParser(); add_arguments(parser)
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    app = TouchButtonApp(parser.parse_args(['--new-instance']))
+    result = soak(app, cycles, progress=lambda i: print(f"{i}...", file=sys.stderr))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    app.clean_exit()
+    tmp.cleanup()
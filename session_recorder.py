@@ -0,0 +1,97 @@
+import os
+import json
+import time
+from PyQt5.QtCore import QObject, QEvent
+from PyQt5.QtWidgets import QApplication
+
+SESSION_VERSION = 1
+FLUSH_EVERY = 1000  # 缓冲这么多条事件后写一次文件
+_KINDS = {QEvent.MouseButtonPress: 'p', QEvent.MouseMove: 'm', QEvent.MouseButtonRelease: 'r'}
+
+
+class SessionRecorder(QObject):
+    """触摸会话录制（replay.py 可离线回放）
+
+    在每个悬浮按钮上安装事件过滤器，原样记下按钮收到的按下 / 移动 / 松开，只在录制期间安装，平时没有任何开销。
+    文件为 JSON Lines：
+        第一行  {"type": "session", "version", "profile", "config", "screen", "time"}  录制开始时的完整配置
+        事件行  [t, 种类 p/m/r, 按钮 id, x, y, 全局 x, 全局 y, Qt 时间戳, 按键, 按住的键]  t 为相对开始的毫秒
+        配置行  {"type": "profile", "t", "profile", "config"}  录制期间切换、重新加载或在设置窗口修改了配置
+    事件先缓存在内存中，每 FLUSH_EVERY 条或停止时批量写入。
+    """
+
+    def __init__(self, directory, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.path = None
+        self.active = False
+        self.events = 0
+        self._buffer = []
+        self._file = None
+        self._t0 = 0
+        self._buttons = []
+
+    def start(self, profile, config, buttons):
+        if self.active: return self.path
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, time.strftime('session-%Y%m%d-%H%M%S.jsonl'))
+        self._file = open(self.path, 'w', encoding='utf-8')
+        geo = QApplication.primaryScreen().geometry()
+        self._write({'type': 'session', 'version': SESSION_VERSION, 'profile': profile, 'config': config,
+                     'screen': [geo.width(), geo.height()], 'time': time.time()})
+        self.active = True; self.events = 0; self._t0 = time.perf_counter()
+        for button in buttons: self.attach(button)
+        return self.path
+
+    def attach(self, button):
+        """新建的按钮（切换配置后）也要录制"""
+        if not self.active: return
+        button.installEventFilter(self); self._buttons.append(button)
+
+    def profile_changed(self, profile, config):
+        if not self.active: return
+        self._buttons = []  # 旧按钮即将销毁
+        # 配置之后还会被修改（拖动等），这里立即序列化
+        self._buffer.append(self._encode({'type': 'profile', 't': self._now(), 'profile': profile, 'config': config}))
+
+    def stop(self):
+        if not self.active: return None
+        for button in self._buttons:
+            try: button.removeEventFilter(self)
+            except RuntimeError: pass  # 按钮已销毁
+        self._buttons = []
+        self.active = False
+        self._flush(); self._file.close(); self._file = None
+        return {'path': self.path, 'events': self.events, 'seconds': round(self._now() / 1000, 1)}
+
+    def _now(self):
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    @staticmethod
+    def _encode(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    def _write(self, obj):
+        self._file.write(self._encode(obj) + '\n')
+
+    def _flush(self):
+        self._file.write(''.join((row if isinstance(row, str) else self._encode(row)) + '\n' for row in self._buffer))
+        self._buffer.clear(); self._file.flush()
+
+    def eventFilter(self, obj, event):
+        kind = _KINDS.get(event.type())
+        if kind is not None:
+            self._buffer.append([self._now(), kind, obj.config['id'], event.x(), event.y(), event.globalX(), event.globalY(),
+                                 event.timestamp(), int(event.button()), int(event.buttons())])
+            self.events += 1
+            if len(self._buffer) >= FLUSH_EVERY: self._flush()
+        return False
+
+
+def read_session(path):
+    """读取会话文件，返回 (头部, 条目列表)；条目为事件行（list）或配置行（dict）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('type') != 'session': raise ValueError(f"不是会话文件: {path}")
+        if header.get('version', 0) > SESSION_VERSION: raise ValueError(f"会话文件版本过新: {header.get('version')}")
+        return header, [json.loads(line) for line in f if line.strip()]
@@ -3,59 +3,32 @@ import os
 import json
 import copy
 import uuid
+from edit_history import EditHistory, diff_fields, set_field, _MISSING
+from button_list_model import ButtonListModel, ButtonFilterModel
+from profile_compiler import complete_keys, validate_shortcut, validate_macro, PRESS_FEEDBACK, PRESS_FEEDBACK_NAMES
+from spatial_index import SpatialIndex
+from layers import BASE, MODES, MODE_NAMES, layer_of
+from joystick import DIRECTIONS, DEFAULT_KEYS
+from tap_classifier import DEFAULT_SLOP
+from usage_stats import GRID, PRESSES, summarize, grid_of
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QFormLayout, QHBoxLayout,
     QLineEdit, QSpinBox, QDoubleSpinBox,
-    QListWidget, QPushButton, QMessageBox, QCheckBox,
+    QListView, QPushButton, QMessageBox, QCheckBox,
     QColorDialog, QGroupBox, QLabel, QFrame, QSplitter,
     QComboBox, QInputDialog, QWidget, QGraphicsDropShadowEffect,
-    QApplication, QSizePolicy, QAbstractItemView, QMenu, QAction
+    QApplication, QSizePolicy, QAbstractItemView, QMenu, QAction, QShortcut, QCompleter, QFileDialog
 )
-from PyQt5.QtGui import QColor, QFont, QCursor, QPainter, QBrush, QPen, QColor, QMouseEvent, QPainterPath
-from PyQt5.QtCore import Qt, QTimer, QSize, QPropertyAnimation, QEasingCurve, QRect, QPoint, pyqtProperty, pyqtSignal, QRectF, QAbstractAnimation
+from PyQt5.QtGui import QColor, QFont, QCursor, QPainter, QBrush, QPen, QColor, QMouseEvent, QPainterPath, QKeySequence
+from PyQt5.QtCore import Qt, QTimer, QStringListModel, QSize, QPropertyAnimation, QEasingCurve, QRect, QPoint, pyqtProperty, pyqtSignal, QRectF, QAbstractAnimation
 
 # ==========================================
-# 1. 配置定义 (UI Scaling & Themes)
+# 1. 配置定义 (UI Scaling & Themes)，见 theme.py
 # ==========================================
+from theme import ScaleConfig, SCALES, ThemeConfig, THEMES
 
-class ScaleConfig:
-    def __init__(self, font_size, row_height, icon_size, padding, spacing):
-        self.font_size = font_size
-        self.row_height = row_height
-        self.icon_size = icon_size
-        self.padding = padding
-        self.spacing = spacing 
-
-SCALES = {
-    "标准 (Standard)": ScaleConfig(14, 38, 20, 8, 15),
-    "中号 (Medium)":   ScaleConfig(16, 48, 24, 10, 20),
-    "大号 (Large - 老人模式)": ScaleConfig(22, 64, 32, 14, 25)
-}
-
-class ThemeConfig:
-    def __init__(self, bg_main, bg_side, bg_input, text_main, text_dim, border, primary, danger, shadow):
-        self.bg_main = bg_main      
-        self.bg_side = bg_side      
-        self.bg_input = bg_input    
-        self.text_main = text_main  
-        self.text_dim = text_dim    
-        self.border = border        
-        self.primary = primary      
-        self.danger = danger        
-        self.shadow = shadow        
-
-THEMES = {
-    "深色 (Dark)": ThemeConfig(
-        bg_main="#1c1c1e", bg_side="#252526", bg_input="#3a3a3c",
-        text_main="#ffffff", text_dim="#98989d", border="#454545",
-        primary="#0A84FF", danger="#FF453A", shadow=QColor(0, 0, 0, 150)
-    ),
-    "浅色 (Light)": ThemeConfig(
-        bg_main="#ffffff", bg_side="#f2f2f7", bg_input="#ffffff",
-        text_main="#000000", text_dim="#6e6e73", border="#c6c6c8", 
-        primary="#007AFF", danger="#FF3B30", shadow=QColor(0, 0, 0, 40)
-    )
-}
+SHORTCUT_HELP = "按键组合，如 ctrl+c、volume up；多个组合以 , 分隔依次发送，+ 键写作 plus\n输入时会补全按键名"
+MACRO_HELP = "按顺序执行的动作，以 ; 分隔：按键组合 / wait 毫秒 / type 文本 / hold 按键 毫秒 / repeat 次数 (...)\n设置后点击按钮执行宏而不是热键，运行中再次点击可取消"
 
 # ==========================================
 # 2. 全向拖拽基类
@@ -389,18 +362,62 @@ class IOSSwitch(QCheckBox):
             QCheckBox::indicator:checked {{ background-color: #30D158; border: 1px solid #30D158; }}
         """)
 
+def draw_heat(painter, rect, grid):
+    """在 rect 内画触点格子热图（次数越多越红越不透明）"""
+    peak = max((n for row in grid for n in row), default=0)
+    cw = rect.width() / GRID; ch = rect.height() / GRID
+    if peak:
+        for r, row in enumerate(grid):
+            for c, n in enumerate(row):
+                if n: painter.fillRect(QRectF(rect.x() + c * cw, rect.y() + r * ch, cw, ch), QColor.fromHsvF(0.17 * (1 - n / peak), 1, 1, 0.2 + 0.6 * n / peak))
+    painter.setPen(QPen(QColor(128, 128, 128, 180), 1)); painter.setBrush(Qt.NoBrush); painter.drawRect(rect)
+
+
+class UsageHeatmap(QWidget):
+    """当前按钮的触点分布（设置窗口内的小图）"""
+    def __init__(self, parent=None):
+        super().__init__(parent); self.grid = None; self.setFixedSize(72, 40)
+    def set_grid(self, grid): self.grid = grid; self.update()
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        draw_heat(painter, QRectF(self.rect().adjusted(0, 0, -1, -1)), self.grid or [[0] * GRID] * GRID)
+
+
+class UsageOverlay(QWidget):
+    """屏幕热图：在每个按钮的实际位置上画触点分布和触发次数（透明置顶、鼠标穿透）"""
+    def __init__(self):
+        super().__init__(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool | Qt.WindowTransparentForInput | Qt.WindowDoesNotAcceptFocus)
+        self.setAttribute(Qt.WA_TranslucentBackground); self.setAttribute(Qt.WA_ShowWithoutActivating, True)
+        self.rows = []  # [(x, y, w, h, grid, 文字)]
+    def set_rows(self, rows):
+        geo = QApplication.primaryScreen().virtualGeometry()
+        if self.geometry() != geo: self.setGeometry(geo)
+        self.rows = rows; self.update()
+    def paintEvent(self, event):
+        painter = QPainter(self); painter.translate(-self.x(), -self.y())
+        font = painter.font(); font.setBold(True); painter.setFont(font)
+        for x, y, w, h, grid, text in self.rows:
+            rect = QRectF(x, y, w, h); draw_heat(painter, rect, grid)
+            painter.setPen(QColor(255, 255, 255)); painter.drawText(rect, Qt.AlignCenter, text)
+
+
 # ==========================================
 # 4. 主窗口逻辑
 # ==========================================
 
 class SettingsDialog(ResizableFramelessWindow):
-    def __init__(self, config_dir, current_filename, configs, apply_callback=None, parent=None):
+    def __init__(self, config_dir, current_filename, configs, apply_callback=None, store=None, usage=None, parent=None):
         super().__init__(parent)
         self.config_dir = config_dir
+        self.store = store  # 配置历史版本（profile_store.py），None 表示未启用
+        self.usage = usage  # 按钮使用统计（usage_stats.py），None 表示未启用
+        self.usage_overlay = None
         self.current_filename = current_filename
-        self.configs = copy.deepcopy(configs)
+        self.configs = configs  # 与主程序共享，不整份深拷贝：所有修改都经过 EditHistory，取消时由调用方 rewind 还原
         self.apply_callback = apply_callback
         self.current_id = None
+        self.history = EditHistory()  # 撤销/重做历史
+        self.spatial = SpatialIndex()  # 当前配置按钮矩形，用于重叠检测
         
         self.current_scale_name = "标准 (Standard)"
         self.current_theme_name = "深色 (Dark)"
@@ -408,7 +425,7 @@ class SettingsDialog(ResizableFramelessWindow):
         self.setup_ui()
         self.load_button_list()
         self.refresh_theme_scale()
-        if self.configs['buttons']: self.button_list.setCurrentRow(0)
+        if self.configs['buttons']: self.set_current_row(0)
 
     def setup_ui(self):
         self.resize(1100, 780)
@@ -461,12 +478,25 @@ class SettingsDialog(ResizableFramelessWindow):
         cfg_btns = QHBoxLayout()
         self.btn_new_cfg = AppleButton("新建"); self.btn_new_cfg.clicked.connect(self.create_config)
         self.btn_del_cfg = AppleButton("删除"); self.btn_del_cfg.clicked.connect(self.delete_config)
-        cfg_btns.addWidget(self.btn_new_cfg); cfg_btns.addWidget(self.btn_del_cfg)
+        self.btn_history = AppleButton("历史"); self.btn_history.clicked.connect(self.show_history)
+        self.btn_history.setEnabled(self.store is not None)
+        cfg_btns.addWidget(self.btn_new_cfg); cfg_btns.addWidget(self.btn_del_cfg); cfg_btns.addWidget(self.btn_history)
         self.left_layout.addLayout(cfg_btns)
         
         self.lbl_list = QLabel("按钮列表"); self.left_layout.addWidget(self.lbl_list)
-        self.button_list = QListWidget(); self.button_list.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
-        self.button_list.currentItemChanged.connect(self.select_button)
+        self.search_edit = QLineEdit(); self.search_edit.setPlaceholderText("搜索名称 / 热键 / 宏"); self.search_edit.setClearButtonEnabled(True)
+        self.left_layout.addWidget(self.search_edit)
+        # 模型直接包装 configs['buttons']，增量插入/删除/刷新；视图等高行 + 分批布局，上千个按钮也流畅
+        self.button_model = ButtonListModel(parent=self)
+        self.button_filter = ButtonFilterModel(self); self.button_filter.setSourceModel(self.button_model)
+        self.search_edit.textChanged.connect(self.button_filter.setFilterFixedString)
+        self.button_list = QListView(); self.button_list.setObjectName("ButtonList"); self.button_list.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.button_list.setUniformItemSizes(True); self.button_list.setLayoutMode(QListView.Batched); self.button_list.setBatchSize(200)
+        self.button_list.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.button_list.setSelectionMode(QAbstractItemView.ExtendedSelection)  # Ctrl/Shift 多选后批量编辑
+        self.button_list.setModel(self.button_filter)
+        self.button_list.selectionModel().currentChanged.connect(self.on_current_changed)
+        self.button_list.selectionModel().selectionChanged.connect(self.update_selection_ui)
         self.left_layout.addWidget(self.button_list)
         
         list_btns = QHBoxLayout()
@@ -496,15 +526,66 @@ class SettingsDialog(ResizableFramelessWindow):
         
         shortcut_layout = QHBoxLayout()
         self.shortcut_edit = QLineEdit(); self.shortcut_edit.textChanged.connect(self.on_shortcut_changed)
+        self.shortcut_edit.setToolTip(SHORTCUT_HELP); self.shortcut_edit.textEdited.connect(self.update_key_completions)
+        # 按键名补全：只补全光标所在的最后一个按键（'+' / ',' 之后的部分），候选来自配置编译器的按键名索引
+        self.key_model = QStringListModel(self); self.key_completer = QCompleter(self.key_model, self)
+        self.key_completer.setWidget(self.shortcut_edit); self.key_completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.key_completer.activated[str].connect(self.insert_key_completion)
+        # 输入停顿 500ms 后才写入配置（同一个定时器反复重启，不为每次按键新建）
+        self.shortcut_timer = QTimer(self); self.shortcut_timer.setSingleShot(True); self.shortcut_timer.setInterval(500)
+        self.shortcut_timer.timeout.connect(self.sync_current_data)
         self.btn_record = AppleButton("录制"); self.btn_record.setCheckable(True); self.btn_record.clicked.connect(self.toggle_key_detection)
         shortcut_layout.addWidget(self.shortcut_edit); shortcut_layout.addWidget(self.btn_record)
         
+        self.macro_edit = QLineEdit(); self.macro_edit.setPlaceholderText("f1; wait 300; volume up; right")
+        self.macro_edit.setToolTip(MACRO_HELP)
+        self.macro_edit.textChanged.connect(self.on_macro_changed)
+        
+        # 图层：留空为基础图层（始终显示）
+        self.layer_combo = QComboBox(); self.layer_combo.setEditable(True); self.layer_combo.lineEdit().setPlaceholderText("基础图层（始终显示）")
+        self.layer_combo.currentTextChanged.connect(self.sync_current_data)
+        layer_action_layout = QHBoxLayout()
+        self.action_mode = QComboBox(); self.action_mode.addItem("无", None)
+        for mode in MODES: self.action_mode.addItem(MODE_NAMES[mode], mode)
+        self.action_mode.currentIndexChanged.connect(self.on_layer_action_changed)
+        self.action_layer = QComboBox(); self.action_layer.setEditable(True); self.action_layer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.action_layer.currentTextChanged.connect(self.sync_current_data)
+        self.action_mode.setToolTip("设置后点击按钮切换图层而不是发送热键：切换到 = 只显示该图层，开关 = 显示/隐藏该图层，按住 = 按下时显示、松开后隐藏")
+        layer_action_layout.addWidget(self.action_mode); layer_action_layout.addWidget(self.action_layer)
+
+        # 类型：普通按钮 / 摇杆（摇杆按 上,下,左,右 填写方向键）
+        type_layout = QHBoxLayout()
+        self.type_combo = QComboBox(); self.type_combo.addItem("普通按钮", None); self.type_combo.addItem("摇杆", 'joystick')
+        self.type_combo.currentIndexChanged.connect(self.on_type_changed)
+        self.joy_keys = QLineEdit(); self.joy_keys.setPlaceholderText("上,下,左,右  如 w,s,a,d"); self.joy_keys.textChanged.connect(self.sync_current_data)
+        self.joy_keys.setToolTip("锁定位置后，手指在摇杆内的方向决定按住哪些键；未锁定时可拖动摆放")
+        self.joy_sectors = QComboBox(); self.joy_sectors.addItem("8 方向", 8); self.joy_sectors.addItem("4 方向", 4)
+        self.joy_sectors.currentIndexChanged.connect(self.sync_current_data)
+        type_layout.addWidget(self.type_combo); type_layout.addWidget(self.joy_keys); type_layout.addWidget(self.joy_sectors)
+
+        # 点击判定：锁定的按钮总在按下时触发
+        tap_layout = QHBoxLayout()
+        self.tap_fire = QComboBox(); self.tap_fire.addItem("松开时触发", 'release'); self.tap_fire.addItem("按下时触发", 'press')
+        self.tap_fire.setToolTip("锁定位置的按钮总是在按下时立即触发")
+        self.tap_slop = QSpinBox(); self.tap_slop.setRange(0, 100); self.tap_slop.setPrefix("容差 "); self.tap_slop.setSuffix(" px")
+        self.tap_slop.setToolTip("手指移动不超过该距离仍算点击")
+        self.long_press = QSpinBox(); self.long_press.setRange(0, 5000); self.long_press.setSingleStep(100); self.long_press.setPrefix("长按拖动 "); self.long_press.setSuffix(" ms")
+        self.long_press.setToolTip("大于 0 时需先按住这么久才能拖动按钮，避免点击时误拖")
+        for w in (self.tap_fire, self.tap_slop, self.long_press): tap_layout.addWidget(w)
+        self.tap_fire.currentIndexChanged.connect(self.sync_current_data)
+        self.tap_slop.valueChanged.connect(self.sync_current_data); self.long_press.valueChanged.connect(self.sync_current_data)
+
         self.chk_lock = IOSSwitch("锁定坐标位置")
         self.chk_lock.stateChanged.connect(self.on_position_lock_changed); self.chk_lock.stateChanged.connect(self.sync_current_data)
         
         self.form_basic.addRow("名称:", self.label_edit)
         self.form_basic.addRow("字体:", font_layout)
+        self.form_basic.addRow("类型:", type_layout)
         self.form_basic.addRow("热键:", shortcut_layout)
+        self.form_basic.addRow("宏:", self.macro_edit)
+        self.form_basic.addRow("点击判定:", tap_layout)
+        self.form_basic.addRow("图层:", self.layer_combo)
+        self.form_basic.addRow("图层动作:", layer_action_layout)
         self.form_basic.addRow("", self.chk_lock)
         self.group_basic.setLayout(self.form_basic)
         
@@ -525,6 +606,12 @@ class SettingsDialog(ResizableFramelessWindow):
         self.lbl_sz = QLabel("字号:"); self.lbl_sz.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
         row_nums.addWidget(self.lbl_op); row_nums.addWidget(self.spin_opacity)
         row_nums.addSpacing(20); row_nums.addWidget(self.lbl_sz); row_nums.addWidget(self.spin_size)
+        self.press_feedback = QComboBox()
+        for mode in PRESS_FEEDBACK: self.press_feedback.addItem(PRESS_FEEDBACK_NAMES[mode], mode)
+        self.press_feedback.setToolTip("按下按钮时立即显示的反馈；按住一段时间（或达到长按拖动时间）后会加深")
+        self.press_feedback.currentIndexChanged.connect(self.sync_current_data)
+        self.lbl_fb = QLabel("按下反馈:"); self.lbl_fb.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        row_nums.addSpacing(20); row_nums.addWidget(self.lbl_fb); row_nums.addWidget(self.press_feedback)
         style_box.addLayout(row_colors); style_box.addSpacing(15); style_box.addLayout(row_nums)
         self.group_style.setLayout(style_box)
         
@@ -536,13 +623,36 @@ class SettingsDialog(ResizableFramelessWindow):
         self.spin_w = QSpinBox(); self.spin_w.setRange(10, 9999); self.spin_w.setPrefix("W: "); self.spin_w.valueChanged.connect(self.sync_current_data)
         self.spin_h = QSpinBox(); self.spin_h.setRange(10, 9999); self.spin_h.setPrefix("H: "); self.spin_h.valueChanged.connect(self.sync_current_data)
         for sp in [self.spin_x, self.spin_y, self.spin_w, self.spin_h]: layout_pos.addWidget(sp)
-        self.group_pos.setLayout(layout_pos)
+        # 多选时的对齐 / 分布（锁定的按钮不移动）
+        layout_align = QHBoxLayout(); self.align_buttons = []
+        for text, mode in [("左对齐", 'left'), ("右对齐", 'right'), ("顶对齐", 'top'), ("底对齐", 'bottom'), ("水平分布", 'hdist'), ("垂直分布", 'vdist')]:
+            btn = AppleButton(text); btn.clicked.connect(lambda _, m=mode: self.align_selected(m))
+            layout_align.addWidget(btn); self.align_buttons.append((btn, mode))
+        self.lbl_overlap = QLabel(); self.lbl_overlap.setWordWrap(True); self.lbl_overlap.hide()
+        # 使用统计：触点分布偏向一侧 / 贴边比例高的按钮适合挪动或放大
+        layout_usage = QHBoxLayout()
+        self.usage_heat = UsageHeatmap(); self.usage_heat.setToolTip("按下位置在按钮内的分布（越红越多）")
+        self.lbl_usage = QLabel("使用统计未启用" if self.usage is None else ""); self.lbl_usage.setWordWrap(True)
+        self.btn_heatmap = AppleButton("屏幕热图"); self.btn_heatmap.setCheckable(True); self.btn_heatmap.toggled.connect(self.toggle_usage_overlay)
+        self.btn_export_usage = AppleButton("导出"); self.btn_export_usage.clicked.connect(self.export_usage)
+        for w in (self.btn_heatmap, self.btn_export_usage): w.setEnabled(self.usage is not None)
+        layout_usage.addWidget(self.usage_heat); layout_usage.addWidget(self.lbl_usage, 1)
+        layout_usage.addWidget(self.btn_heatmap); layout_usage.addWidget(self.btn_export_usage)
+        pos_box = QVBoxLayout(); pos_box.addLayout(layout_pos); pos_box.addWidget(self.lbl_overlap); pos_box.addLayout(layout_align); pos_box.addLayout(layout_usage)
+        self.group_pos.setLayout(pos_box)
         
         self.right_layout.addWidget(self.group_basic); self.right_layout.addWidget(self.group_style)
         self.right_layout.addWidget(self.group_pos); self.right_layout.addStretch()
         
         bot_layout = QHBoxLayout()
         self.btn_refresh = AppleButton("立即应用"); self.btn_refresh.clicked.connect(self.on_refresh)
+        self.btn_undo = AppleButton("撤销"); self.btn_undo.clicked.connect(self.undo); self.btn_undo.setToolTip("Ctrl+Z")
+        self.btn_redo = AppleButton("重做"); self.btn_redo.clicked.connect(self.redo); self.btn_redo.setToolTip("Ctrl+Y / Ctrl+Shift+Z")
+        bot_layout.addWidget(self.btn_undo); bot_layout.addWidget(self.btn_redo)
+        self.chk_live = IOSSwitch("实时预览"); self.chk_live.setToolTip("修改后自动应用到屏幕上的按钮（批量修改只刷新一次）")
+        bot_layout.addWidget(self.chk_live)
+        self.preview_timer = QTimer(self); self.preview_timer.setSingleShot(True); self.preview_timer.setInterval(150)
+        self.preview_timer.timeout.connect(self.on_refresh)
         self.btn_cancel = AppleButton("取消"); self.btn_cancel.clicked.connect(self.reject)
         self.btn_save = AppleButton("保存更改", is_primary=True); self.btn_save.clicked.connect(self.accept)
         bot_layout.addWidget(self.btn_refresh); bot_layout.addStretch(); bot_layout.addWidget(self.btn_cancel); bot_layout.addWidget(self.btn_save)
@@ -552,7 +662,14 @@ class SettingsDialog(ResizableFramelessWindow):
         self.splitter.setStretchFactor(0, 1); self.splitter.setStretchFactor(1, 3); self.splitter.setCollapsible(0, False)
         content_box.addWidget(self.splitter); frame_layout.addLayout(content_box)
         
-        self.load_config_list(); self.shortcut_timer = None
+        self.load_config_list()
+        
+        self.history_shortcuts = [
+            QShortcut(QKeySequence("Ctrl+Z"), self, activated=self.undo),
+            QShortcut(QKeySequence("Ctrl+Y"), self, activated=self.redo),
+            QShortcut(QKeySequence("Ctrl+Shift+Z"), self, activated=self.redo),
+        ]
+        self.update_history_buttons(); self.update_selection_ui()
 
     def _make_color_well(self, type_):
         w = AppleColorWell()
@@ -674,9 +791,9 @@ class SettingsDialog(ResizableFramelessWindow):
             QMenu::item:selected {{ background-color: {thm.primary}; color: white; }}
             QMenu::separator {{ height: 1px; background: {thm.border}; margin: 4px 10px; }}
 
-            QListWidget {{ background-color: {thm.bg_side}; border: 1px solid {thm.border}; border-radius: 8px; outline: none; color: {thm.text_main}; }}
-            QListWidget::item {{ height: {cfg.row_height + 4}px; padding-left: 10px; margin: 2px 5px; border-radius: 6px; }}
-            QListWidget::item:selected {{
+            QListView#ButtonList {{ background-color: {thm.bg_side}; border: 1px solid {thm.border}; border-radius: 8px; outline: none; color: {thm.text_main}; }}
+            QListView#ButtonList::item {{ height: {cfg.row_height + 4}px; padding-left: 10px; margin: 2px 5px; border-radius: 6px; }}
+            QListView#ButtonList::item:selected {{
                 background-color: {thm.bg_input if self.current_theme_name == "浅色 (Light)" else "#3a3a3c"};
                 color: {thm.text_main}; border: 1px solid {thm.primary}; border-left: 5px solid {thm.primary};
             }}
@@ -696,20 +813,49 @@ class SettingsDialog(ResizableFramelessWindow):
         if "Large" in self.current_scale_name and self.width() < 1200: self.resize(1250, 850)
 
     def load_button_list(self):
-        current_row = self.button_list.currentRow()
-        self.button_list.clear()
+        # 只在切换配置时整体重置模型，其余修改都是增量通知
+        current_row = self.current_row()
         if not self.configs.get('buttons'): self.configs['buttons'] = []
-        for config in self.configs['buttons']: self.button_list.addItem(f"{config['label']}")
-        if self.button_list.count() > 0:
-            row = current_row if (current_row >= 0 and current_row < self.button_list.count()) else 0
-            self.button_list.setCurrentRow(row)
-
-    def select_button(self, item, previous=None):
-        if not item: return
-        index = self.button_list.row(item)
-        if index < 0 or index >= len(self.configs['buttons']): return
+        self.button_model.set_buttons(self.configs['buttons'])
+        self.spatial.clear()
+        for b in self.configs['buttons']: self.index_button(b)
+        self.refresh_layer_items()
+        if self.button_model.rowCount() > 0:
+            self.set_current_row(current_row if 0 <= current_row < self.button_model.rowCount() else 0)
+
+    def current_row(self):
+        index = self.button_list.currentIndex()
+        return self.button_filter.mapToSource(index).row() if index.isValid() else -1
+
+    def set_current_row(self, row):
+        if 0 <= row < self.button_model.rowCount():
+            self.button_list.setCurrentIndex(self.button_filter.mapFromSource(self.button_model.index(row)))
+
+    def selected_buttons(self):
+        """当前选中的按钮（按列表顺序），当前编辑的按钮总在其中"""
+        rows = {self.button_filter.mapToSource(i).row() for i in self.button_list.selectionModel().selectedIndexes()}
+        rows.add(self.button_model.row_of(self.current_id))
+        return [self.configs['buttons'][r] for r in sorted(rows) if 0 <= r < len(self.configs['buttons'])]
+
+    def update_selection_ui(self, *args):
+        n = len(self.button_list.selectionModel().selectedIndexes())
+        self.lbl_list.setText(f"按钮列表 (已选 {n} 个，修改将应用到全部)" if n > 1 else "按钮列表")
+        for btn, mode in self.align_buttons: btn.setEnabled(n >= (3 if mode.endswith('dist') else 2))
+
+    def schedule_preview(self):
+        # 合并连续修改，只刷新一次屏幕上的按钮
+        if self.chk_live.isChecked(): self.preview_timer.start()
+
+    def on_current_changed(self, current, previous=None):
+        self.select_button(self.button_filter.mapToSource(current).row() if current.isValid() else -1)
+
+    def select_button(self, index):
+        if index < 0 or index >= len(self.configs['buttons']):
+            self.current_id = None; return
         self.current_id = self.configs['buttons'][index]['id']
         self.load_config_to_ui(self.configs['buttons'][index])
+        self.update_overlap_warning()
+        self.update_usage_ui()
 
     def load_config_to_ui(self, config):
         self.block_signals_custom(True)
@@ -718,7 +864,20 @@ class SettingsDialog(ResizableFramelessWindow):
         idx = self.font_combo.findText(font)
         if idx >= 0: self.font_combo.setCurrentIndex(idx)
         else: self.font_combo.addItem(font); self.font_combo.setCurrentText(font)
-        self.shortcut_edit.setText(config.get('shortcut', ''))
+        self.shortcut_edit.setText(config.get('shortcut', '')); self.validate_shortcut(self.shortcut_edit.text())
+        self.macro_edit.setText(config.get('macro', '')); self.validate_macro(self.macro_edit.text())
+        self.layer_combo.setEditText(layer_of(config))
+        self.type_combo.setCurrentIndex(max(0, self.type_combo.findData(config.get('type'))))
+        keys = dict(DEFAULT_KEYS, **(config.get('keys') or {}))
+        self.joy_keys.setText(",".join(keys.get(d, '') for d in DIRECTIONS))
+        self.joy_sectors.setCurrentIndex(max(0, self.joy_sectors.findData(config.get('sectors', 8))))
+        self.update_type_ui()
+        self.tap_fire.setCurrentIndex(max(0, self.tap_fire.findData(config.get('tap_fire', 'release'))))
+        self.tap_slop.setValue(config.get('tap_slop', DEFAULT_SLOP)); self.long_press.setValue(config.get('long_press_ms', 0))
+        self.press_feedback.setCurrentIndex(max(0, self.press_feedback.findData(config.get('press_feedback', 'highlight'))))
+        action = config.get('layer_action') or {}
+        self.action_mode.setCurrentIndex(max(0, self.action_mode.findData(action.get('mode'))))
+        self.action_layer.setEditText(action.get('layer', '')); self.action_layer.setEnabled(self.action_mode.currentIndex() > 0)
         self.color_bg.setText(config.get('color', '#ffffff'))
         self.color_text.setText(config.get('textColor', '#000000'))
         self.color_border.setText(config.get('borderColor', '#cccccc'))
@@ -730,28 +889,239 @@ class SettingsDialog(ResizableFramelessWindow):
         self.block_signals_custom(False)
 
     def block_signals_custom(self, block):
-        for w in [self.label_edit, self.font_combo, self.shortcut_edit, self.color_bg, self.color_text, self.color_border, self.spin_opacity, self.spin_size, self.spin_x, self.spin_y, self.spin_w, self.spin_h, self.chk_lock]: w.blockSignals(block)
+        for w in [self.label_edit, self.font_combo, self.shortcut_edit, self.macro_edit, self.layer_combo, self.action_mode, self.action_layer, self.type_combo, self.joy_keys, self.joy_sectors, self.tap_fire, self.tap_slop, self.long_press, self.press_feedback, self.color_bg, self.color_text, self.color_border, self.spin_opacity, self.spin_size, self.spin_x, self.spin_y, self.spin_w, self.spin_h, self.chk_lock]: w.blockSignals(block)
 
     def sync_current_data(self):
         if not self.current_id: return
-        index = next((i for i, b in enumerate(self.configs['buttons']) if b['id'] == self.current_id), None)
-        if index is not None:
-            self.configs['buttons'][index].update({
+        index = self.button_model.row_of(self.current_id)
+        if index >= 0:
+            button = self.configs['buttons'][index]
+            values = {
                 "label": self.label_edit.text(), "fontFamily": self.font_combo.currentText(), "shortcut": self.shortcut_edit.text(),
                 "color": self.color_bg.text(), "textColor": self.color_text.text(), "borderColor": self.color_border.text(),
                 "opacity": self.spin_opacity.value(), "fontSize": self.spin_size.value(),
                 "position": [self.spin_x.value(), self.spin_y.value()], "size": [self.spin_w.value(), self.spin_h.value()],
                 "position_lock": self.chk_lock.isChecked()
-            })
-            item = self.button_list.item(index)
-            if item: item.setText(self.label_edit.text())
+            }
+            if self.macro_edit.text() or 'macro' in button: values["macro"] = self.macro_edit.text()
+            layer = self.layer_combo.currentText().strip()
+            if layer or 'layer' in button: values["layer"] = layer
+            mode = self.action_mode.currentData()
+            values["layer_action"] = {"mode": mode, "layer": self.action_layer.currentText().strip()} if mode else _MISSING
+            # 默认值不写入配置，保持旧配置文件不变
+            for field, value, default in (("tap_fire", self.tap_fire.currentData(), 'release'), ("tap_slop", self.tap_slop.value(), DEFAULT_SLOP), ("long_press_ms", self.long_press.value(), 0),
+                                           ("press_feedback", self.press_feedback.currentData(), 'highlight')):
+                if value != default or field in button: values[field] = value
+            if self.type_combo.currentData() == 'joystick':
+                values["type"] = 'joystick'; values["sectors"] = self.joy_sectors.currentData()
+                values["keys"] = dict(zip(DIRECTIONS, (k.strip() for k in self.joy_keys.text().split(',') + [''] * 4)))
+            else: values["type"] = _MISSING
+            ops = diff_fields(button, values)
+            if not ops: return
+            targets = self.selected_buttons()
+            if len(targets) > 1: ops = self.expand_to_selection(button, ops, targets)
+            # 连续修改同一组按钮的同一组字段（打字、拖动数值框）合并为一步撤销；
+            # 多选时所有按钮的修改是一步操作、一次列表刷新、一次预览
+            with self.button_model.batch():
+                self.history.do(self, ops, merge_key=(tuple(b['id'] for b in targets), tuple(op[2] for op in ops)))
+            self.update_history_buttons(); self.schedule_preview()
+            if any(op[2] in ('position', 'size') for op in ops): self.update_overlap_warning()
+
+    def expand_to_selection(self, anchor, anchor_ops, targets):
+        """把对当前按钮的修改扩展到所有选中按钮：位置按相对位移移动（跳过锁定的按钮），其余字段直接赋值"""
+        ops = []
+        for b in targets:
+            values = {}
+            for _, _, field, old, new in anchor_ops:
+                if field != 'position' or b is anchor: values[field] = new
+                elif not b.get('position_lock', False) and isinstance(old, list):
+                    pos = b.get('position', [0, 0])
+                    values[field] = [pos[0] + new[0] - old[0], pos[1] + new[1] - old[1]]
+            ops += diff_fields(b, values)
+        return ops
+
+    def align_selected(self, mode):
+        buttons = [b for b in self.selected_buttons() if not b.get('position_lock', False)]
+        if len(buttons) < 2: return
+        rects = [(b, *b.get('position', [0, 0]), *b.get('size', [100, 50])) for b in buttons]
+        new_pos = {}
+        if mode == 'left':
+            left = min(x for _, x, y, w, h in rects); new_pos = {id(b): [left, y] for b, x, y, w, h in rects}
+        elif mode == 'right':
+            right = max(x + w for _, x, y, w, h in rects); new_pos = {id(b): [right - w, y] for b, x, y, w, h in rects}
+        elif mode == 'top':
+            top = min(y for _, x, y, w, h in rects); new_pos = {id(b): [x, top] for b, x, y, w, h in rects}
+        elif mode == 'bottom':
+            bottom = max(y + h for _, x, y, w, h in rects); new_pos = {id(b): [x, bottom - h] for b, x, y, w, h in rects}
+        elif mode in ('hdist', 'vdist') and len(rects) >= 3:
+            # 首尾不动，中间按钮等间距排列
+            axis = 1 if mode == 'hdist' else 2
+            rects.sort(key=lambda r: r[axis])
+            start = rects[0][axis]; end = rects[-1][axis] + rects[-1][axis + 2]
+            gap = (end - start - sum(r[axis + 2] for r in rects)) / (len(rects) - 1)
+            cursor = start
+            for b, x, y, w, h in rects:
+                pos = [x, y]; pos[axis - 1] = int(round(cursor)); new_pos[id(b)] = pos
+                cursor += (w if axis == 1 else h) + gap
+        ops = [op for b in buttons if id(b) in new_pos for op in diff_fields(b, {'position': new_pos[id(b)]})]
+        if not ops: return
+        with self.button_model.batch(): self.history.do(self, ops)
+        self.select_button(self.current_row()); self.update_history_buttons(); self.schedule_preview()
+
+    # --- EditHistory 文档接口：修改都经过列表模型，视图增量刷新 ---
+    def apply_set(self, button, field, value):
+        set_field(button, field, value); self.button_model.button_changed(button)
+        if field in ('position', 'size'): self.index_button(button)
+
+    def apply_insert(self, index, button):
+        self.button_model.insert_button(index, button); self.index_button(button)
+
+    def apply_remove(self, index):
+        self.spatial.remove(self.button_model.remove_button(index).get('id'))
+
+    # --- 重叠检测 ---
+    def index_button(self, button):
+        self.spatial.update(button.get('id'), *button.get('position', [0, 0]), *button.get('size', [100, 50]))
+
+    def update_overlap_warning(self):
+        # 不同的非基础图层不会同时显示，互相重叠不算问题
+        current = self.configs['buttons'][self.button_model.row_of(self.current_id)] if self.current_id else None
+        def same_screen(key):
+            other = layer_of(self.configs['buttons'][self.button_model.row_of(key)])
+            return BASE in (other, layer_of(current)) or other == layer_of(current)
+        others = self.spatial.overlaps(self.current_id, accept=same_screen) if current else set()
+        if not others: self.lbl_overlap.hide(); return
+        labels = [(self.configs['buttons'][r].get('label') or "").strip() or self.configs['buttons'][r].get('shortcut') or "(未命名)" for r in sorted(self.button_model.row_of(i) for i in others) if r >= 0]
+        names = "、".join(labels[:5]) + (f" 等 {len(labels)} 个" if len(labels) > 5 else "")
+        self.lbl_overlap.setText(f"⚠ 与 {names} 重叠")
+        self.lbl_overlap.setStyleSheet(f"color: {THEMES[self.current_theme_name].danger};")
+        self.lbl_overlap.show()
+
+    def apply_replace(self, filename, configs):
+        self.current_filename, self.configs = filename, configs
+        self.load_button_list()
+        if self.btn_heatmap.isChecked(): self.refresh_usage_overlay()
+
+    # --- 使用统计（usage_stats.py）---
+    def update_usage_ui(self):
+        if self.usage is None or not self.current_id: return
+        counter = self.usage.profile(self.current_filename).buttons.get(self.current_id)
+        if counter is None or not counter.counts[PRESSES]:
+            self.usage_heat.set_grid(None); self.lbl_usage.setText("还没有使用记录"); return
+        data = summarize(counter.counts)
+        self.usage_heat.set_grid(grid_of(counter.counts))
+        self.lbl_usage.setText(f"按下 {data['presses']} 次，触发 {data['taps']}，拖动 {data['drags']}，平均按住 {data['hold_avg_ms']:g} ms\n"
+                               f"重心偏移 {data['offset_x']:+.0%} / {data['offset_y']:+.0%}，贴边 {data['edge']:.0%}")
+
+    def toggle_usage_overlay(self, on):
+        if not on:
+            if self.usage_overlay: self.usage_overlay.hide()
+            return
+        if self.usage_overlay is None: self.usage_overlay = UsageOverlay()
+        self.refresh_usage_overlay(); self.usage_overlay.show()
+
+    def refresh_usage_overlay(self):
+        if self.usage_overlay is None: return
+        rows = []
+        for row, b in zip(self.usage.rows(self.current_filename, self.configs['buttons']), self.configs['buttons']):
+            x, y = b.get('position', [0, 0]); w, h = b.get('size', [100, 50])
+            rows.append((x, y, w, h, row['grid'], f"{row['taps']}"))
+        self.usage_overlay.set_rows(rows)
+
+    def export_usage(self):
+        default = os.path.join(os.path.expanduser('~'), os.path.splitext(self.current_filename)[0] + '-usage.csv')
+        path, _ = QFileDialog.getSaveFileName(self, "导出使用统计", default, "CSV (*.csv)")
+        if not path: return
+        try: count = self.usage.export_csv(path, self.current_filename, self.configs['buttons'])
+        except OSError as e: QMessageBox.warning(self, "导出", f"导出失败: {e}"); return
+        self.lbl_usage.setText(f"已导出 {count} 个按钮到 {os.path.basename(path)}")
+
+    def done(self, result):
+        if self.usage_overlay: self.usage_overlay.hide(); self.usage_overlay.deleteLater(); self.usage_overlay = None
+        super().done(result)
+
+    # --- 撤销 / 重做 ---
+    def update_history_buttons(self):
+        self.btn_undo.setEnabled(self.history.can_undo()); self.btn_redo.setEnabled(self.history.can_redo())
+
+    def undo(self):
+        if self.btn_record.isChecked(): return
+        with self.button_model.batch(): ops = self.history.undo(self)
+        if ops is not None: self.refresh_after_history()
+
+    def redo(self):
+        if self.btn_record.isChecked(): return
+        with self.button_model.batch(): ops = self.history.redo(self)
+        if ops is not None: self.refresh_after_history()
+
+    def rewind(self):
+        """撤销本次打开窗口以来的全部修改（取消时调用）"""
+        with self.button_model.batch(): self.history.rewind(self)
+
+    def refresh_after_history(self):
+        # 配置文件可能被切换回去，先同步下拉框，再尽量保持选中项并刷新右侧表单
+        self.config_combo.blockSignals(True)
+        idx = self.config_combo.findText(self.current_filename)
+        if idx >= 0: self.config_combo.setCurrentIndex(idx)
+        self.config_combo.blockSignals(False)
+        row = self.button_model.row_of(self.current_id)
+        self.set_current_row(row if row >= 0 else 0)
+        self.select_button(self.current_row())
+        self.update_history_buttons(); self.schedule_preview()
 
     def on_shortcut_changed(self, text):
-        if self.shortcut_timer: self.shortcut_timer.stop()
-        self.shortcut_timer = QTimer(); self.shortcut_timer.setSingleShot(True)
-        self.shortcut_timer.timeout.connect(lambda: self.sync_current_data()); self.shortcut_timer.start(500)
+        self.validate_shortcut(text); self.shortcut_timer.start()
+
+    def validate_shortcut(self, text):
+        # 与加载配置时相同的按键名索引，未知按键立即标红并给出最接近的名字
+        error = validate_shortcut(text)
+        self.shortcut_edit.setStyleSheet(f"border: 1px solid {THEMES[self.current_theme_name].danger};" if error else "")
+        self.shortcut_edit.setToolTip(f"快捷键无效: {error}" if error else SHORTCUT_HELP)
+        return error is None
+
+    def update_key_completions(self, text):
+        token = text[max(text.rfind('+'), text.rfind(',')) + 1:].lstrip()
+        names = complete_keys(token) if token else []
+        if not names or names == [token.lower()]: self.key_completer.popup().hide(); return
+        self.key_model.setStringList(names); self.key_completer.complete()
+
+    def insert_key_completion(self, name):
+        text = self.shortcut_edit.text()
+        cut = max(text.rfind('+'), text.rfind(','))
+        head = text[:cut + 1] + (' ' if cut >= 0 and text[cut] == ',' else '')
+        self.shortcut_edit.setText(head + name)
+
+    def refresh_layer_items(self):
+        """图层下拉框列出当前配置中已有的图层"""
+        names = sorted({layer_of(b) for b in self.configs['buttons']} - {BASE})
+        for combo in (self.layer_combo, self.action_layer):
+            text = combo.currentText(); combo.blockSignals(True)
+            combo.clear(); combo.addItems([BASE] + names); combo.setEditText(text)
+            combo.blockSignals(False)
+
+    def update_type_ui(self):
+        joystick = self.type_combo.currentData() == 'joystick'
+        self.joy_keys.setEnabled(joystick); self.joy_sectors.setEnabled(joystick)
+        self.shortcut_edit.setEnabled(not joystick); self.btn_record.setEnabled(not joystick); self.macro_edit.setEnabled(not joystick)
+
+    def on_type_changed(self, index):
+        self.update_type_ui(); self.sync_current_data()
+
+    def on_layer_action_changed(self, index):
+        self.action_layer.setEnabled(index > 0); self.sync_current_data()
+
+    def on_macro_changed(self, text):
+        self.validate_macro(text); self.sync_current_data()
+
+    def validate_macro(self, text):
+        # 与加载时相同的编译器（包括按键名检查），格式错误时标红并在提示中给出原因
+        error = validate_macro(text)
+        self.macro_edit.setStyleSheet(f"border: 1px solid {THEMES[self.current_theme_name].danger};" if error else "")
+        self.macro_edit.setToolTip(f"宏格式错误: {error}" if error else MACRO_HELP)
+        return error is None
 
     def toggle_key_detection(self, checked):
+        for sc in self.history_shortcuts: sc.setEnabled(not checked)  # 录制时让 Ctrl+Z 等按键进入录制
         if checked:
             self.shortcut_edit.clearFocus(); self.shortcut_edit.setPlaceholderText("按下按键...")
             self.shortcut_edit.clear(); self.btn_record.setText("停止")
@@ -770,8 +1140,9 @@ class SettingsDialog(ResizableFramelessWindow):
         super().keyPressEvent(event)
 
     def on_position_lock_changed(self, state):
-        locked = (state == Qt.Checked) if isinstance(state, int) else state
+        locked = state if isinstance(state, bool) else (state == Qt.Checked)  # bool 也是 int，需先判断
         self.spin_x.setEnabled(not locked); self.spin_y.setEnabled(not locked)
+        self.tap_fire.setEnabled(not locked); self.long_press.setEnabled(not locked)  # 锁定后总是按下即触发、不能拖动
 
     def load_config_list(self):
         self.config_combo.blockSignals(True); self.config_combo.clear()
@@ -788,8 +1159,11 @@ class SettingsDialog(ResizableFramelessWindow):
         path = os.path.join(self.config_dir, filename)
         if os.path.exists(path):
             try:
-                with open(path, 'r', encoding='utf-8') as f: self.configs = json.load(f)
-                self.current_filename = filename; self.current_id = None; self.load_button_list()
+                with open(path, 'r', encoding='utf-8') as f: configs = json.load(f)
+                # 切换配置只记录新旧两份对象的引用，撤销时直接换回
+                self.current_id = None
+                self.history.do(self, [('replace', self.current_filename, self.configs, filename, configs)])
+                self.update_history_buttons()
             except: pass
 
     def create_config(self):
@@ -803,35 +1177,63 @@ class SettingsDialog(ResizableFramelessWindow):
         if self.config_combo.count() <= 1: return
         fname = self.config_combo.currentText()
         if QMessageBox.question(self, "删除", f"删除 {fname}?") == QMessageBox.Yes:
-            os.remove(os.path.join(self.config_dir, fname))
+            path = os.path.join(self.config_dir, fname)
+            if self.store:  # 删除前留一个版本，可从托盘「历史版本」恢复
+                try:
+                    with open(path, 'r', encoding='utf-8') as f: self.store.snapshot(fname, json.load(f), 'delete')
+                except Exception as e: print(f"删除前保存历史版本失败: {e}")
+            os.remove(path)
             self.load_config_list(); self.on_config_changed(self.config_combo.currentText())
 
+    def show_history(self):
+        """载入当前配置的某个历史版本（可撤销，点确定后才写回文件）"""
+        from profile_store import describe_version
+        versions = self.store.versions(self.current_filename)
+        if not versions: QMessageBox.information(self, "历史版本", f"{self.current_filename} 还没有历史版本"); return
+        items = [describe_version(v) for v in versions]
+        item, ok = QInputDialog.getItem(self, "历史版本", f"{self.current_filename}:", items, 0, False)
+        if not ok: return
+        try: configs = self.store.load(self.current_filename, versions[items.index(item)]['id'])
+        except Exception as e: QMessageBox.warning(self, "历史版本", f"读取失败: {e}"); return
+        self.current_id = None
+        self.history.do(self, [('replace', self.current_filename, self.configs, self.current_filename, configs)])
+        self.update_history_buttons(); self.schedule_preview()
+
     def create_new_button(self):
         new_btn = {
             "id": str(uuid.uuid4()), "label": "新按钮", "position": [100, 100], "size": [120, 60],
             "color": "#0A84FF", "textColor": "#ffffff", "borderColor": "#0071e3", "opacity": 0.9, "fontSize": 14,
             "position_lock": False, "fontFamily": "Microsoft YaHei UI"
         }
-        self.configs['buttons'].append(new_btn); self.load_button_list(); self.button_list.setCurrentRow(len(self.configs['buttons'])-1)
+        self.append_button(new_btn)
+
+    def append_button(self, new_btn):
+        self.search_edit.clear()  # 确保新按钮不被搜索过滤掉
+        self.history.do(self, [('insert', len(self.configs['buttons']), new_btn)])
+        self.set_current_row(len(self.configs['buttons'])-1); self.update_history_buttons(); self.schedule_preview()
 
     def copy_button(self):
         if not self.current_id: return
-        idx = next((i for i, b in enumerate(self.configs['buttons']) if b['id'] == self.current_id), None)
-        if idx is not None:
+        idx = self.button_model.row_of(self.current_id)
+        if idx >= 0:
             new_btn = copy.deepcopy(self.configs['buttons'][idx]); new_btn['id'] = str(uuid.uuid4()); new_btn['label'] += " 副本"
             new_btn['position'][0] += 20; new_btn['position'][1] += 20
-            self.configs['buttons'].append(new_btn); self.load_button_list(); self.button_list.setCurrentRow(len(self.configs['buttons'])-1)
+            self.append_button(new_btn)
 
     def delete_button(self):
         if not self.current_id: return
-        idx = next((i for i, b in enumerate(self.configs['buttons']) if b['id'] == self.current_id), None)
-        if idx is not None:
+        idx = self.button_model.row_of(self.current_id)
+        if idx >= 0:
             if QMessageBox.question(self, "删除", "确认删除?") == QMessageBox.Yes:
-                del self.configs['buttons'][idx]; self.current_id = None; self.load_button_list()
+                # 删除后视图会自动选中相邻行并触发 on_current_changed
+                self.history.do(self, [('remove', idx, self.configs['buttons'][idx])])
+                self.select_button(self.current_row()); self.update_history_buttons(); self.schedule_preview()
 
     def apply_font_to_all(self):
         font = self.font_combo.currentText()
-        for b in self.configs['buttons']: b['fontFamily'] = font
+        ops = [op for b in self.configs['buttons'] for op in diff_fields(b, {'fontFamily': font})]
+        with self.button_model.batch(): self.history.do(self, ops)
+        self.update_history_buttons(); self.schedule_preview()
         self.sync_current_data(); QMessageBox.information(self, "成功", "已应用")
 
     def on_refresh(self):
@@ -0,0 +1,148 @@
+import itertools
+
+
+class SpatialIndex:
+    """按钮矩形的均匀网格索引
+
+    每个矩形登记在它覆盖的网格单元里，移动时只更新变化的单元。
+    点查询只看一个单元，矩形查询只看覆盖到的单元，与按钮总数基本无关。
+    """
+
+    def __init__(self, cell=128):
+        self.cell = cell
+        self._cells = {}  # (cx, cy) -> set(key)
+        self._rects = {}  # key -> (x, y, w, h, cells, order)
+        self._order = itertools.count()
+
+    def __len__(self): return len(self._rects)
+    def __contains__(self, key): return key in self._rects
+
+    def _cells_of(self, x, y, w, h):
+        c = self.cell
+        x0, y0 = int(x // c), int(y // c)
+        x1, y1 = int((x + max(w, 1) - 1) // c), int((y + max(h, 1) - 1) // c)
+        return tuple((cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1))
+
+    def clear(self):
+        self._cells.clear(); self._rects.clear()
+
+    def insert(self, key, x, y, w, h):
+        if key in self._rects: self.remove(key)
+        cells = self._cells_of(x, y, w, h)
+        for cell in cells: self._cells.setdefault(cell, set()).add(key)
+        self._rects[key] = (x, y, w, h, cells, next(self._order))
+
+    def update(self, key, x, y, w, h):
+        old = self._rects.get(key)
+        if old is None: return self.insert(key, x, y, w, h)
+        cells = self._cells_of(x, y, w, h)
+        if cells != old[4]:
+            for cell in old[4]:
+                bucket = self._cells.get(cell)
+                if bucket:
+                    bucket.discard(key)
+                    if not bucket: del self._cells[cell]
+            for cell in cells: self._cells.setdefault(cell, set()).add(key)
+        self._rects[key] = (x, y, w, h, cells, old[5])
+
+    def remove(self, key):
+        old = self._rects.pop(key, None)
+        if old is None: return
+        for cell in old[4]:
+            bucket = self._cells.get(cell)
+            if bucket:
+                bucket.discard(key)
+                if not bucket: del self._cells[cell]
+
+    def rect(self, key):
+        r = self._rects.get(key)
+        return r[:4] if r else None
+
+    def query_rect(self, x, y, w, h, exclude=None):
+        """与给定矩形相交（不含仅边缘接触）的所有 key"""
+        found = set()
+        for cell in self._cells_of(x, y, w, h):
+            bucket = self._cells.get(cell)
+            if bucket: found |= bucket
+        found.discard(exclude)
+        rects = self._rects
+        return {k for k in found
+                if rects[k][0] < x + w and x < rects[k][0] + rects[k][2] and rects[k][1] < y + h and y < rects[k][1] + rects[k][3]}
+
+    def overlaps(self, key, accept=None):
+        """与 key 重叠的其他 key；accept(key) 为假的不计入（例如另一图层的按钮）"""
+        r = self._rects.get(key)
+        found = self.query_rect(*r[:4], exclude=key) if r else set()
+        return {k for k in found if accept(k)} if accept else found
+
+    def hit_test(self, px, py, accept=None):
+        """返回包含该点的按钮（多个重叠时取最后加入的，即最上层），没有则返回 None"""
+        bucket = self._cells.get((int(px // self.cell), int(py // self.cell)))
+        if not bucket: return None
+        best, best_order = None, -1
+        for k in bucket:
+            x, y, w, h, _, order = self._rects[k]
+            if x <= px < x + w and y <= py < y + h and order > best_order and (accept is None or accept(k)): best, best_order = k, order
+        return best
+
+    def snap(self, key, x, y, w, h, threshold=8, reach=None, accept=None):
+        """吸附到附近按钮的边缘或中线
+
+        返回 (x, y, guides)，guides 为参考线列表 ('v', x, y0, y1) / ('h', y, x0, x1)。
+        只在距离 reach（默认 1 个网格）以内的邻居中查找，候选数与总数无关。
+        """
+        reach = self.cell if reach is None else reach
+        found = set()
+        for cell in self._cells_of(x - reach, y - reach, w + 2 * reach, h + 2 * reach):
+            bucket = self._cells.get(cell)
+            if bucket: found |= bucket
+        found.discard(key)
+        if accept: found = {k for k in found if accept(k)}
+        best_dx = best_dy = threshold + 1
+        guide_v = guide_h = None
+        xs = (x, x + w / 2, x + w); ys = (y, y + h / 2, y + h)
+        rects = self._rects
+        for k in found:
+            ox, oy, ow, oh = rects[k][:4]
+            for tx in (ox, ox + ow / 2, ox + ow):
+                for sx in xs:
+                    d = tx - sx
+                    if -best_dx < d < best_dx: best_dx = abs(d); dx = d; guide_v = (tx, min(y, oy), max(y + h, oy + oh))
+            for ty in (oy, oy + oh / 2, oy + oh):
+                for sy in ys:
+                    d = ty - sy
+                    if -best_dy < d < best_dy: best_dy = abs(d); dy = d; guide_h = (ty, min(x, ox), max(x + w, ox + ow))
+        guides = []
+        if guide_v:
+            x += dx; guides.append(('v', int(guide_v[0]), int(guide_v[1]), int(guide_v[2])))
+        if guide_h:
+            y += dy; guides.append(('h', int(guide_h[0]), int(guide_h[1]), int(guide_h[2])))
+        return int(round(x)), int(round(y)), guides
+
+def benchmark(count=1000, queries=10000, area=(2560, 1600), size=(60, 60)):
+    """随机布局下各类查询的平均耗时（微秒）"""
+    import random, time
+    rnd = random.Random(1)
+    index = SpatialIndex()
+    for i in range(count): index.insert(i, rnd.randrange(area[0]), rnd.randrange(area[1]), *size)
+    points = [(rnd.randrange(area[0]), rnd.randrange(area[1])) for _ in range(queries)]
+    result = {}
+    t = time.perf_counter()
+    for px, py in points: index.hit_test(px, py)
+    result['hit_test_us'] = (time.perf_counter() - t) / queries * 1e6
+    t = time.perf_counter()
+    for i, (px, py) in enumerate(points): index.snap(i % count, px, py, *size)
+    result['snap_us'] = (time.perf_counter() - t) / queries * 1e6
+    t = time.perf_counter()
+    for i, (px, py) in enumerate(points): index.update(i % count, px, py, *size)
+    result['update_us'] = (time.perf_counter() - t) / queries * 1e6
+    t = time.perf_counter()
+    for i in range(queries): index.overlaps(i % count)
+    result['overlaps_us'] = (time.perf_counter() - t) / queries * 1e6
+    return {k: round(v, 2) for k, v in result.items()}
+
+
+if __name__ == "__main__":
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for k, v in benchmark(n).items(): print(f"{k}: {v}")
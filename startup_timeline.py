@@ -0,0 +1,36 @@
+import time
+
+# 尽量早地导入本模块（main.py 的第一条 import），以它作为时间零点
+_T0 = time.perf_counter()
+
+
+class StartupTimeline:
+    """启动时间线：记录各阶段相对零点的耗时，可随时导出"""
+
+    def __init__(self):
+        self.marks = [('模块加载', _T0)]
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def mark_once(self, name):
+        if not any(n == name for n, _ in self.marks): self.mark(name)
+
+    def elapsed_ms(self, name):
+        for n, t in self.marks:
+            if n == name: return (t - _T0) * 1000
+        return None
+
+    def as_dict(self):
+        return {name: round((t - _T0) * 1000, 2) for name, t in self.marks}
+
+    def report(self):
+        lines = ["启动时间线 (ms):"]
+        prev = _T0
+        for name, t in self.marks[1:]:
+            lines.append(f"  {(t - _T0) * 1000:8.1f}  (+{(t - prev) * 1000:6.1f})  {name}")
+            prev = t
+        return "\n".join(lines)
+
+
+timeline = StartupTimeline()
@@ -0,0 +1,54 @@
+FIRE_MODES = ('release', 'press')
+DEFAULT_SLOP = 8  # 像素
+IDLE, PENDING, FIRED, DRAGGING, CANCELLED = range(5)
+
+
+class TapClassifier:
+    """单个按钮的点击 / 拖动判定（与 Qt 无关，时间单位为毫秒）
+
+    fire:           'release' 松开时触发（默认），'press' 按下时立即触发
+    slop:           手指移动不超过该距离（像素）仍算点击
+    long_press_ms:  0 表示移动超过 slop 就开始拖动；大于 0 时必须先按住这么久才能拖动，
+                    在此之前移动超过 slop 视为取消，按住超过该时间后松开也不算点击
+    锁定的按钮总是在按下时立即触发，且不会进入拖动。
+
+    press / move / release 返回 True 表示此刻应触发点击；是否拖动看 dragging。
+    """
+
+    def __init__(self, fire='release', slop=DEFAULT_SLOP, long_press_ms=0):
+        self.fire = fire if fire in FIRE_MODES else 'release'
+        self.slop2 = max(0, slop) ** 2
+        self.long_press_ms = max(0, long_press_ms)
+        self.state = IDLE
+        self.x = self.y = 0; self.t = 0; self.locked = False
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('tap_fire', 'release'), config.get('tap_slop', DEFAULT_SLOP), config.get('long_press_ms', 0))
+
+    @property
+    def dragging(self): return self.state == DRAGGING
+
+    def press(self, x, y, t, locked=False):
+        self.x, self.y, self.t, self.locked = x, y, t, locked
+        if locked or self.fire == 'press':
+            self.state = FIRED; return True
+        self.state = PENDING; return False
+
+    def move(self, x, y, t):
+        """返回 True 表示刚进入拖动"""
+        if self.state not in (PENDING, FIRED) or self.locked: return False
+        dx = x - self.x; dy = y - self.y
+        if dx * dx + dy * dy <= self.slop2: return False
+        if self.long_press_ms and t - self.t < self.long_press_ms:
+            self.state = CANCELLED  # 长按前的滑动：本次既不点击也不拖动（按下时已触发的不受影响）
+            return False
+        self.state = DRAGGING
+        return True
+
+    def release(self, x, y, t):
+        state, self.state = self.state, IDLE
+        if state != PENDING: return False
+        if self.long_press_ms and t - self.t >= self.long_press_ms: return False  # 长按后松开是拖动意图
+        dx = x - self.x; dy = y - self.y
+        return dx * dx + dy * dy <= self.slop2
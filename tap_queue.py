@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+
+POLICIES = ('drop_oldest', 'drop_newest', 'coalesce')
+MAX_COALESCE = 64  # coalesce 策略下单个排队项最多合并的点击数
+
+
+class _Tap:
+    __slots__ = ('button', 'keys', 'count', 'alive', 'queued_at')
+
+    def __init__(self, button, keys):
+        self.button = button; self.keys = keys; self.count = 1; self.alive = True
+        self.queued_at = time.perf_counter()
+
+
+class TapDispatcher:
+    """点击事件队列
+
+    GUI 线程只做入队（微秒级），由单个后台线程按全局点击顺序注入按键，
+    所以跨按钮的顺序与点击顺序一致。每个按钮的排队数有上限，满了以后按策略处理：
+        drop_oldest  丢弃该按钮最早的一次点击（默认）
+        drop_newest  丢弃新的点击
+        coalesce     合并到最后一个排队项，轮到时连续注入多次（超过 MAX_COALESCE 后丢弃）
+    """
+
+    def __init__(self, backend, capacity=8, policy='drop_oldest'):
+        if policy not in POLICIES: raise ValueError(f"未知的队列策略: {policy}")
+        self.backend = backend
+        self.capacity = max(1, int(capacity)); self.policy = policy
+        self.counters = {'queued': 0, 'dropped': 0, 'coalesced': 0, 'injected': 0, 'errors': 0}
+        self._limits = {}  # button_id -> (capacity, policy)
+        self._order = deque()  # 全局 FIFO
+        self._pending = {}  # button_id -> deque[_Tap]
+        self._latency = deque(maxlen=1000)  # 入队到注入完成的耗时（秒）
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="TapDispatcher", daemon=True)
+        self._thread.start()
+
+    def configure(self, button_id, capacity=None, policy=None):
+        """单独设置某个按钮的队列长度和溢出策略"""
+        if policy is not None and policy not in POLICIES: raise ValueError(f"未知的队列策略: {policy}")
+        self._limits[button_id] = (max(1, int(capacity or self.capacity)), policy or self.policy)
+
+    def submit(self, button_id, keys):
+        """入队一次点击；返回 False 表示被丢弃"""
+        capacity, policy = self._limits.get(button_id, (self.capacity, self.policy))
+        with self._cond:
+            q = self._pending.get(button_id)
+            if q is None: q = self._pending[button_id] = deque()
+            if len(q) >= capacity:
+                if policy == 'coalesce' and q[-1].count < MAX_COALESCE:
+                    q[-1].count += 1; self.counters['coalesced'] += 1
+                    return True
+                if policy == 'drop_oldest':
+                    q.popleft().alive = False; self.counters['dropped'] += 1
+                else:
+                    self.counters['dropped'] += 1
+                    return False
+            tap = _Tap(button_id, keys)
+            q.append(tap); self._order.append(tap)
+            self.counters['queued'] += 1
+            self._cond.notify()
+        return True
+
+    def pending(self):
+        with self._cond: return sum(len(q) for q in self._pending.values())
+
+    def stats(self):
+        """计数器快照以及排队延迟（毫秒）"""
+        with self._cond:
+            data = dict(self.counters)
+            samples = sorted(self._latency)
+        data['pending'] = self.pending()
+        if samples:
+            data['latency_p50_ms'] = round(samples[len(samples) // 2] * 1000, 3)
+            data['latency_p99_ms'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3)
+            data['latency_max_ms'] = round(samples[-1] * 1000, 3)
+        return data
+
+    def drain(self, timeout=5.0):
+        """等待队列清空（测试用）"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline: time.sleep(0.001)
+        return not self.pending()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True; self._cond.notify()
+        self._thread.join(timeout=1.0)
+
+    def _loop(self):
+        backend = self.backend
+        while True:
+            with self._cond:
+                while not self._order and not self._stopped: self._cond.wait()
+                if self._stopped: return
+                tap = self._order.popleft()
+                if not tap.alive: continue
+                self._pending[tap.button].popleft()
+                count = tap.count
+            injected = 0
+            try:
+                for _ in range(count):
+                    backend.send(tap.keys); injected += 1  # send 按 split_sequence 逐个组合键注入（'alt+tab, enter'）
+            except ValueError:
+                print(f"无效的快捷键: {tap.keys}")
+            except Exception as e:
+                print(f"快捷键执行错误: {e}")
+            with self._cond:
+                self.counters['injected'] += injected
+                if injected < count: self.counters['errors'] += 1
+                self._latency.append(time.perf_counter() - tap.queued_at)
+
+
+def stress_test(buttons=4, rate=60, seconds=3.0, latency=0.002, capacity=8, policy='drop_oldest'):
+    """压力测试：多个按钮以总速率 rate 次/秒轮流点击，注入后端模拟 latency 秒的耗时
+
+    返回计数器、入队耗时（代表 GUI 线程开销）以及注入顺序是否与点击顺序一致。
+    """
+    from input_backend import RecordingBackend
+    backend = RecordingBackend(latency=latency)
+    dispatcher = TapDispatcher(backend, capacity, policy)
+    submit_cost, accepted = [], []
+    interval = 1.0 / rate; start = time.perf_counter(); n = 0
+    while time.perf_counter() - start < seconds:
+        bid = f"btn{n % buttons}"
+        t0 = time.perf_counter()
+        if dispatcher.submit(bid, f"k{n}"): accepted.append(f"k{n}")
+        submit_cost.append(time.perf_counter() - t0)
+        n += 1
+        time.sleep(max(0.0, start + n * interval - time.perf_counter()))
+    dispatcher.drain()
+    elapsed = time.perf_counter() - start
+    dispatcher.stop()
+    injected = list(dict.fromkeys(backend.keys('press')))  # coalesce 时同一项会连续注入多次
+    delivered = set(injected)
+    submit_cost.sort()
+    report = dispatcher.stats()
+    report.update({
+        'taps': n, 'taps_per_second': round(n / elapsed, 1),
+        'submit_p99_us': round(submit_cost[int(len(submit_cost) * 0.99)] * 1e6, 1),
+        'submit_max_us': round(submit_cost[-1] * 1e6, 1),
+        'ordered': injected == [k for k in accepted if k in delivered],
+    })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="点击队列压力测试")
+    parser.add_argument('--buttons', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=60, help="总点击速率（次/秒）")
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--latency', type=float, default=0.002, help="模拟每次注入耗时（秒）")
+    parser.add_argument('--capacity', type=int, default=8)
+    parser.add_argument('--policy', choices=POLICIES, default='drop_oldest')
+    args = parser.parse_args()
+    result = stress_test(args.buttons, args.rate, args.seconds, args.latency, args.capacity, args.policy)
+    for k, v in result.items(): print(f"{k}: {v}")
+    raise SystemExit(0 if result['ordered'] else 1)
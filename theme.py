@@ -0,0 +1,42 @@
+from PyQt5.QtGui import QColor
+
+# 界面缩放与主题配色（设置窗口和托盘菜单共用，保持轻量以便启动时单独加载）
+
+class ScaleConfig:
+    def __init__(self, font_size, row_height, icon_size, padding, spacing):
+        self.font_size = font_size
+        self.row_height = row_height
+        self.icon_size = icon_size
+        self.padding = padding
+        self.spacing = spacing 
+
+SCALES = {
+    "标准 (Standard)": ScaleConfig(14, 38, 20, 8, 15),
+    "中号 (Medium)":   ScaleConfig(16, 48, 24, 10, 20),
+    "大号 (Large - 老人模式)": ScaleConfig(22, 64, 32, 14, 25)
+}
+
+class ThemeConfig:
+    def __init__(self, bg_main, bg_side, bg_input, text_main, text_dim, border, primary, danger, shadow):
+        self.bg_main = bg_main      
+        self.bg_side = bg_side      
+        self.bg_input = bg_input    
+        self.text_main = text_main  
+        self.text_dim = text_dim    
+        self.border = border        
+        self.primary = primary      
+        self.danger = danger        
+        self.shadow = shadow        
+
+THEMES = {
+    "深色 (Dark)": ThemeConfig(
+        bg_main="#1c1c1e", bg_side="#252526", bg_input="#3a3a3c",
+        text_main="#ffffff", text_dim="#98989d", border="#454545",
+        primary="#0A84FF", danger="#FF453A", shadow=QColor(0, 0, 0, 150)
+    ),
+    "浅色 (Light)": ThemeConfig(
+        bg_main="#ffffff", bg_side="#f2f2f7", bg_input="#ffffff",
+        text_main="#000000", text_dim="#6e6e73", border="#c6c6c8", 
+        primary="#007AFF", danger="#FF3B30", shadow=QColor(0, 0, 0, 40)
+    )
+}
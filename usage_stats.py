@@ -0,0 +1,189 @@
+import os
+import csv
+import json
+from array import array
+from bisect import bisect_right
+
+GRID = 8  # 触点位置直方图：按钮均分为 GRID x GRID 格
+HOLD_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200)  # 按住时长分桶上界（毫秒），最后一桶为更长
+PRESSES, TAPS, DRAGS, HOLD_MS = range(4)
+_HOLD0 = 4
+_GRID0 = _HOLD0 + len(HOLD_BUCKETS) + 1
+SLOTS = _GRID0 + GRID * GRID
+USAGE_DIR = '.usage'
+
+
+class ButtonUsage:
+    """单个按钮的计数器：一个定长 array('Q')，记录时只做几次整数加法，不分配对象
+
+    布局：[按下次数, 触发次数, 拖动次数, 总按住毫秒, 按住时长分桶..., 触点格子...]
+    """
+    __slots__ = ('counts', 'owner', 'press_t')
+
+    def __init__(self, owner, counts=None):
+        self.owner = owner
+        self.counts = array('Q', counts if counts and len(counts) == SLOTS else bytes(8 * SLOTS))
+        self.press_t = None
+
+    def press(self, x, y, w, h, t, fired=False):
+        """按下：x, y 为按钮内坐标，t 为事件时间戳（毫秒）；fired 表示按下时已触发"""
+        c = self.counts
+        gx = min(GRID - 1, max(0, x * GRID // w)) if w > 0 else 0
+        gy = min(GRID - 1, max(0, y * GRID // h)) if h > 0 else 0
+        c[PRESSES] += 1; c[_GRID0 + gy * GRID + gx] += 1
+        if fired: c[TAPS] += 1
+        self.press_t = t; self.owner.dirty = True
+
+    def release(self, t, fired=False, dragged=False):
+        if self.press_t is None: return
+        hold = max(0, t - self.press_t); self.press_t = None
+        c = self.counts
+        c[HOLD_MS] += hold; c[_HOLD0 + bisect_right(HOLD_BUCKETS, hold)] += 1
+        if fired: c[TAPS] += 1
+        if dragged: c[DRAGS] += 1
+        self.owner.dirty = True
+
+
+def summarize(counts):
+    """把计数数组换算成便于阅读的指标
+
+    offset_x / offset_y: 触点重心相对按钮中心的偏移（按钮宽高的比例，-0.5 ~ 0.5），持续偏向一侧说明按钮该挪一挪
+    edge: 落在最外一圈格子的比例，偏高说明按钮偏小或者容易点偏
+    """
+    presses = counts[PRESSES]
+    grid = counts[_GRID0:]
+    data = {'presses': presses, 'taps': counts[TAPS], 'drags': counts[DRAGS],
+            'hold_avg_ms': round(counts[HOLD_MS] / presses, 1) if presses else 0,
+            'hold_buckets': list(counts[_HOLD0:_GRID0])}
+    total = sum(grid)
+    if total:
+        cx = sum(grid[i] * (i % GRID + 0.5) for i in range(len(grid))) / total
+        cy = sum(grid[i] * (i // GRID + 0.5) for i in range(len(grid))) / total
+        edge = sum(grid[i] for i in range(len(grid)) if i % GRID in (0, GRID - 1) or i // GRID in (0, GRID - 1))
+        data.update(offset_x=round(cx / GRID - 0.5, 3), offset_y=round(cy / GRID - 0.5, 3), edge=round(edge / total, 3))
+    else: data.update(offset_x=0, offset_y=0, edge=0)
+    return data
+
+
+def grid_of(counts):
+    """触点格子（GRID x GRID 的行列表）"""
+    return [list(counts[_GRID0 + r * GRID:_GRID0 + (r + 1) * GRID]) for r in range(GRID)]
+
+
+class ProfileUsage:
+    """一个配置的全部按钮计数器，对应 config/.usage/<配置名>"""
+
+    def __init__(self, path):
+        self.path = path
+        self.buttons = {}  # 按钮 id -> ButtonUsage
+        self.dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+            if data.get('grid') == GRID and data.get('hold_buckets') == list(HOLD_BUCKETS):
+                self.buttons = {k: ButtonUsage(self, v) for k, v in data.get('buttons', {}).items()}
+            else: print(f"使用统计格式已变化，重新开始记录: {path}")
+        except (OSError, ValueError): pass
+
+    def button(self, button_id):
+        usage = self.buttons.get(button_id)
+        if usage is None: usage = self.buttons[button_id] = ButtonUsage(self)
+        return usage
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {'grid': GRID, 'hold_buckets': list(HOLD_BUCKETS),
+                'buttons': {k: v.counts.tolist() for k, v in self.buttons.items() if v.counts[PRESSES]}}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+class UsageStats:
+    """按钮使用统计（按配置分文件）
+
+    按钮在 press / release 里直接累加自己的 ButtonUsage（在触发点击之后），磁盘写入由 flush() 定期批量完成，
+    点击本身不做任何 I/O。
+    """
+
+    def __init__(self, config_dir):
+        self.directory = os.path.join(config_dir, USAGE_DIR)
+        self._profiles = {}  # 配置名 -> ProfileUsage
+        self.flushes = 0
+
+    def profile(self, name):
+        usage = self._profiles.get(name)
+        if usage is None: usage = self._profiles[name] = ProfileUsage(os.path.join(self.directory, name))
+        return usage
+
+    def button(self, profile, button_id):
+        return self.profile(profile).button(button_id)
+
+    def flush(self):
+        """把有变化的配置写入磁盘，返回写入的文件数"""
+        written = 0
+        for usage in self._profiles.values():
+            if not usage.dirty: continue
+            try: usage.save(); written += 1
+            except OSError as e: print(f"保存使用统计失败: {e}")
+        self.flushes += bool(written)
+        return written
+
+    def reset(self, profile):
+        usage = self.profile(profile)
+        zero = array('Q', bytes(8 * SLOTS))
+        for u in usage.buttons.values(): u.counts[:] = zero  # 原地清零：按钮手里的 ButtonUsage 继续有效
+        usage.dirty = True
+
+    def rows(self, profile, buttons=()):
+        """每个按钮一行的统计（buttons 为按钮配置列表，用来补充名称；已删除按钮的统计也会列出）"""
+        usage = self.profile(profile)
+        labels = {b.get('id'): b.get('label', '') for b in buttons}
+        ids = [b.get('id') for b in buttons] + sorted(k for k in usage.buttons if k not in labels)
+        out = []
+        for button_id in ids:
+            counts = usage.buttons[button_id].counts if button_id in usage.buttons else array('Q', bytes(8 * SLOTS))
+            row = {'profile': profile, 'id': button_id, 'label': labels.get(button_id, "（已删除）")}
+            row.update(summarize(counts)); row['grid'] = grid_of(counts)
+            out.append(row)
+        return out
+
+    def export_csv(self, path, profile, buttons=()):
+        """导出为 CSV：每个按钮一行，按住时长分桶和触点格子展开成列"""
+        hold_cols = [f"hold_le_{b}ms" for b in HOLD_BUCKETS] + [f"hold_gt_{HOLD_BUCKETS[-1]}ms"]
+        grid_cols = [f"cell_{r}_{c}" for r in range(GRID) for c in range(GRID)]
+        head = ['profile', 'id', 'label', 'presses', 'taps', 'drags', 'hold_avg_ms', 'offset_x', 'offset_y', 'edge']
+        rows = self.rows(profile, buttons)
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:  # 带 BOM，Excel 能正确识别中文
+            writer = csv.writer(f)
+            writer.writerow(head + hold_cols + grid_cols)
+            for row in rows: writer.writerow([row[k] for k in head] + row['hold_buckets'] + [n for line in row['grid'] for n in line])
+        return len(rows)
+
+
+def benchmark(taps=100000):
+    """单次按下 + 松开记录的平均耗时（微秒）"""
+    import time
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        usage = UsageStats(tmp).button('bench.json', 'a')
+        t = time.perf_counter()
+        for i in range(taps):
+            usage.press(i % 120, i % 60, 120, 60, i * 100); usage.release(i * 100 + 80, True)
+        return {'taps': taps, 'per_tap_us': round((time.perf_counter() - t) / taps * 1e6, 3)}
+
+
+if __name__ == "__main__":
+    # python usage_stats.py                         性能测试
+    # python usage_stats.py config [输出目录]        把 config 下所有配置的统计导出为 CSV
+    import sys
+    if len(sys.argv) < 2: print(benchmark()); sys.exit(0)
+    config_dir = sys.argv[1]; out_dir = sys.argv[2] if len(sys.argv) > 2 else '.'
+    stats = UsageStats(config_dir)
+    names = sorted(os.listdir(stats.directory)) if os.path.isdir(stats.directory) else []
+    for name in (n for n in names if not n.endswith('.tmp')):
+        try:
+            with open(os.path.join(config_dir, name), 'r', encoding='utf-8') as f: buttons = json.load(f).get('buttons', [])
+        except (OSError, ValueError, AttributeError): buttons = []
+        out = os.path.join(out_dir, os.path.splitext(name)[0] + '-usage.csv')
+        print(f"{out}: {stats.export_csv(out, name, buttons)} 个按钮")
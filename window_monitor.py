@@ -0,0 +1,332 @@
+import os
+import re
+import sys
+import fnmatch
+import threading
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+
+# ==========================================
+# 规则：前台程序 / 窗口标题 -> 配置文件
+# ==========================================
+def _compile_pattern(pattern):
+    """通配符（不区分大小写），以 re: 开头时按正则表达式处理"""
+    if not pattern: return None
+    if pattern.startswith('re:'): return re.compile(pattern[3:], re.IGNORECASE)
+    return re.compile(fnmatch.translate(pattern), re.IGNORECASE)
+
+
+def compile_rules(rules):
+    """[{"app": "chrome.exe", "title": "*网课*", "profile": "网课config.json"}] -> [(app_re, title_re, profile)]"""
+    compiled = []
+    for rule in rules or []:
+        profile = rule.get('profile') if isinstance(rule, dict) else None
+        if not profile or not (rule.get('app') or rule.get('title')):
+            print(f"无效的自动切换规则: {rule}"); continue
+        try: compiled.append((_compile_pattern(rule.get('app')), _compile_pattern(rule.get('title')), profile))
+        except re.error as e: print(f"自动切换规则中的正则有误 {rule}: {e}")
+    return compiled
+
+
+def match_rules(compiled, app, title):
+    """按顺序返回第一条匹配的配置文件名，没有匹配返回 None"""
+    for app_re, title_re, profile in compiled:
+        if app_re and not app_re.match(app or ''): continue
+        if title_re and not title_re.match(title or ''): continue
+        return profile
+    return None
+
+
+# ==========================================
+# 前台窗口来源
+# 统一接口：start(callback) / stop()，前台变化时调用 callback(app, title, pid)，可在任意线程
+# ==========================================
+class FakeProvider:
+    """测试用：手动调用 activate() 模拟前台窗口切换"""
+
+    def __init__(self):
+        self.callback = None
+
+    def start(self, callback): self.callback = callback
+    def stop(self): self.callback = None
+
+    def activate(self, app, title='', pid=0):
+        if self.callback: self.callback(app, title, pid)
+
+
+class PollingProvider:
+    """低频轮询（事件钩子不可用时的后备）：只在结果变化时回调，定时器使用粗精度以便系统合并唤醒"""
+
+    def __init__(self, probe, interval_ms=1000):
+        self.probe = probe
+        self.timer = QTimer(); self.timer.setTimerType(Qt.VeryCoarseTimer); self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._poll)
+        self.callback = None; self._last = None
+
+    def start(self, callback):
+        self.callback = callback; self._poll(); self.timer.start()
+
+    def stop(self):
+        self.timer.stop(); self.callback = None; self._last = None
+
+    def pause(self):
+        self.timer.stop()
+
+    def resume(self):
+        if self.callback: self._poll(); self.timer.start()
+
+    def _poll(self):
+        try: info = self.probe()
+        except Exception: info = None
+        if info and info != self._last:
+            self._last = info
+            if self.callback: self.callback(*info)
+
+
+class Win32EventProvider:
+    """Windows：SetWinEventHook 监听前台切换，无事件时不占用 CPU
+
+    标题变化只监听当前前台进程（每次前台切换时重新挂钩），避免接收全系统的 NAMECHANGE 事件。
+    钩子为 OUTOFCONTEXT，回调在安装钩子的线程（Qt 主线程）的消息循环中执行。
+    """
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+
+    def __init__(self, watch_titles=True):
+        import ctypes
+        from ctypes import wintypes
+        self.ctypes, self.wintypes = ctypes, wintypes
+        self.user32 = ctypes.windll.user32
+        self.watch_titles = watch_titles
+        self.WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                               wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        self.user32.SetWinEventHook.restype = wintypes.HANDLE
+        self.user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, self.WinEventProc,
+                                                wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+        self.user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+        self._proc = self.WinEventProc(self._on_event)  # 必须保持引用，否则回调会被回收
+        self._hook = None; self._title_hook = None; self._title_pid = None
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+        self._hook = self.user32.SetWinEventHook(self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND, None, self._proc,
+                                                 0, 0, self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS)
+        if not self._hook: raise OSError("SetWinEventHook 失败")
+        self._report(win32_foreground())
+
+    def stop(self):
+        for hook in (self._hook, self._title_hook):
+            if hook: self.user32.UnhookWinEvent(hook)
+        self._hook = self._title_hook = self._title_pid = None; self.callback = None
+
+    def _on_event(self, hook, event, hwnd, id_object, id_child, thread, ms):
+        if event == self.EVENT_SYSTEM_FOREGROUND: self._report(win32_window_info(hwnd))
+        elif id_object == 0 and hwnd == self.user32.GetForegroundWindow(): self._report(win32_window_info(hwnd))  # OBJID_WINDOW
+
+    def _report(self, info):
+        if not info: return
+        if self.watch_titles and info[2] != self._title_pid:
+            if self._title_hook: self.user32.UnhookWinEvent(self._title_hook)
+            self._title_hook = self.user32.SetWinEventHook(self.EVENT_OBJECT_NAMECHANGE, self.EVENT_OBJECT_NAMECHANGE, None, self._proc,
+                                                           info[2], 0, self.WINEVENT_OUTOFCONTEXT)
+            self._title_pid = info[2]
+        if self.callback: self.callback(*info)
+
+
+def win32_window_info(hwnd):
+    """(程序文件名, 窗口标题, pid)"""
+    import ctypes
+    from ctypes import wintypes
+    user32, kernel32 = ctypes.windll.user32, ctypes.windll.kernel32
+    if not hwnd: return None
+    length = user32.GetWindowTextLengthW(wintypes.HWND(hwnd))
+    title = ctypes.create_unicode_buffer(length + 1); user32.GetWindowTextW(wintypes.HWND(hwnd), title, length + 1)
+    pid = wintypes.DWORD(); user32.GetWindowThreadProcessId(wintypes.HWND(hwnd), ctypes.byref(pid))
+    app = ''
+    handle = kernel32.OpenProcess(0x1000, False, pid.value)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if handle:
+        size = wintypes.DWORD(1024); path = ctypes.create_unicode_buffer(1024)
+        if kernel32.QueryFullProcessImageNameW(handle, 0, path, ctypes.byref(size)): app = os.path.basename(path.value)
+        kernel32.CloseHandle(handle)
+    return app, title.value, pid.value
+
+
+def win32_foreground():
+    import ctypes
+    return win32_window_info(ctypes.windll.user32.GetForegroundWindow())
+
+
+def _xprop_value(out, name):
+    m = re.search(rf'^{name}\([^)]*\)(?: =|:) (.*)$', out, re.M)  # WINDOW 类型的属性用冒号
+    return m.group(1) if m else None
+
+
+def x11_foreground():
+    """(WM_CLASS, 窗口标题, pid)：调用 xprop 命令，不需要 python-xlib（轮询后备用）"""
+    import subprocess
+    def xprop(*args): return subprocess.run(['xprop', *args], capture_output=True, text=True, timeout=1).stdout
+    active = _xprop_value(xprop('-root', '_NET_ACTIVE_WINDOW'), '_NET_ACTIVE_WINDOW') or ''
+    m = re.search(r'0x[0-9a-fA-F]+', active)
+    if not m or int(m.group(0), 16) == 0: return None
+    out = xprop('-id', m.group(0), 'WM_CLASS', '_NET_WM_NAME', 'WM_NAME', '_NET_WM_PID')
+    wm_class = re.findall(r'"((?:[^"\\]|\\.)*)"', _xprop_value(out, 'WM_CLASS') or '')
+    name = re.match(r'"((?:[^"\\]|\\.)*)"', _xprop_value(out, '_NET_WM_NAME') or _xprop_value(out, 'WM_NAME') or '')
+    pid = _xprop_value(out, '_NET_WM_PID')
+    return ((wm_class[1] if len(wm_class) > 1 else ''), (re.sub(r'\\(.)', r'\1', name.group(1)) if name else ''),
+            (int(pid) if pid and pid.isdigit() else 0))
+
+
+def foreground_probe():
+    """当前平台可用于轮询的前台窗口查询函数，没有时返回 None"""
+    if sys.platform == 'win32': return win32_foreground
+    if os.environ.get('DISPLAY'):
+        import shutil
+        if shutil.which('xprop'): return x11_foreground
+    return None
+
+
+class X11EventProvider:
+    """Linux/X11：在后台线程阻塞等待根窗口 _NET_ACTIVE_WINDOW 属性变化（需要 pip install python-xlib）"""
+
+    def __init__(self, watch_titles=True):
+        from Xlib import display, X  # 可选依赖，缺失时由 create_provider 回退
+        self.X = X
+        self.display = display.Display()
+        self.root = self.display.screen().root
+        self.atoms = {name: self.display.intern_atom(name) for name in ('_NET_ACTIVE_WINDOW', '_NET_WM_NAME', '_NET_WM_PID', 'WM_NAME')}
+        self.watch_titles = watch_titles
+        self.callback = None; self._active = None; self._stop = threading.Event(); self._thread = None
+
+    def start(self, callback):
+        self.callback = callback; self._stop.clear()
+        if self._thread and self._thread.is_alive(): return  # 上次没能唤醒的线程：继续用它，同一个 Display 上只能有一个线程读事件
+        self.root.change_attributes(event_mask=self.X.PropertyChangeMask)
+        self._thread = threading.Thread(target=self._run, name="x11-window-monitor", daemon=True); self._thread.start()
+
+    def stop(self):
+        self._stop.set(); self.callback = None
+        if not (self._thread and self._thread.is_alive()): return
+        try:  # 线程阻塞在 next_event：用另一条连接给根窗口发一个事件唤醒它
+            from Xlib import display, protocol
+            waker = display.Display()
+            event = protocol.event.ClientMessage(window=self.root.id, client_type=waker.intern_atom('_TMB_WAKE'), data=(32, [0] * 5))
+            waker.send_event(self.root.id, event, event_mask=self.X.PropertyChangeMask); waker.close()
+        except Exception as e: print(f"唤醒 X11 监听线程失败: {e}")
+        self._thread.join(1)
+        if not self._thread.is_alive(): self._thread = None
+
+    def _run(self):
+        self._report()
+        while not self._stop.is_set():
+            event = self.display.next_event()  # 阻塞，没有事件时不占 CPU
+            if self._stop.is_set() or event.type != self.X.PropertyNotify: continue
+            if event.atom == self.atoms['_NET_ACTIVE_WINDOW'] or (event.window == self._active and event.atom in (self.atoms['_NET_WM_NAME'], self.atoms['WM_NAME'])):
+                self._report()
+
+    def _report(self):
+        try:
+            prop = self.root.get_full_property(self.atoms['_NET_ACTIVE_WINDOW'], self.X.AnyPropertyType)
+            if not prop or not prop.value[0]: return
+            window = self.display.create_resource_object('window', prop.value[0])
+            if self.watch_titles and window != self._active: window.change_attributes(event_mask=self.X.PropertyChangeMask)
+            self._active = window
+            name = window.get_full_property(self.atoms['_NET_WM_NAME'], 0) or window.get_full_property(self.atoms['WM_NAME'], 0)
+            title = name.value.decode('utf-8', 'replace') if name and isinstance(name.value, bytes) else (name.value if name else '')
+            wm_class = window.get_wm_class()
+            pid = window.get_full_property(self.atoms['_NET_WM_PID'], self.X.AnyPropertyType)
+            info = ((wm_class[1] if wm_class else ''), title, (pid.value[0] if pid else 0))
+        except Exception: return  # 窗口可能在查询过程中关闭
+        if self.callback: self.callback(*info)
+
+
+def create_provider(name=None, watch_titles=True, poll_ms=1000):
+    """按平台选择：事件钩子优先，失败时退回低频轮询；name 可指定 win32 / x11 / poll / fake"""
+    if name == 'fake': return FakeProvider()
+    if name in (None, 'win32') and sys.platform == 'win32':
+        try: return Win32EventProvider(watch_titles)
+        except Exception as e: print(f"前台窗口钩子不可用，改用轮询: {e}")
+    elif name in (None, 'x11') and os.environ.get('DISPLAY'):
+        try: return X11EventProvider(watch_titles)
+        except Exception as e: print(f"X11 前台窗口监听不可用，改用轮询: {e}")
+    elif name not in (None, 'poll'): print(f"未知或当前平台不可用的前台窗口监听方式: {name}")
+    probe = foreground_probe()
+    return PollingProvider(probe, poll_ms) if probe else None
+
+
+# ==========================================
+# 监视器：规则匹配 + 防抖
+# ==========================================
+class WindowMonitor(QObject):
+    """前台窗口变化时按规则请求切换配置
+
+    回调可能来自任意线程，经信号转到 Qt 主线程；只有前台稳定 debounce_ms 后才发出 profileRequested，
+    Alt+Tab 快速划过的窗口不会触发切换。本程序自己的窗口（设置窗口等）被忽略。
+    """
+    profileRequested = pyqtSignal(str)
+    _foreground = pyqtSignal(str, str, int)
+
+    def __init__(self, rules, provider=None, debounce_ms=400, fallback=None, parent=None):
+        super().__init__(parent)
+        self.rules = compile_rules(rules)
+        self.provider = provider
+        self.fallback = fallback  # 没有规则匹配时使用的配置，None 表示保持当前配置
+        self.current = None  # 上一次请求的配置
+        self._pending = None
+        self.events = 0  # 收到的前台变化次数，用于确认空闲时确实没有活动
+        self._own_pid = os.getpid()
+        self._timer = QTimer(self); self._timer.setSingleShot(True); self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._fire)
+        self._foreground.connect(self._on_foreground)
+
+    def start(self):
+        if self.provider is None or not self.rules: return False
+        self.provider.start(self._foreground.emit)
+        return True
+
+    def stop(self):
+        self._timer.stop()
+        if self.provider: self.provider.stop()
+
+    def pause(self):
+        """空闲时暂停轮询（事件钩子本身没有定时器，不需要暂停）"""
+        if hasattr(self.provider, 'pause'): self.provider.pause()
+
+    def resume(self):
+        if hasattr(self.provider, 'resume'): self.provider.resume()
+
+    def _on_foreground(self, app, title, pid):
+        self.events += 1
+        if pid == self._own_pid: return
+        profile = match_rules(self.rules, app, title) or self.fallback
+        if profile is None: return
+        self._pending = profile  # 总是记下最近前台窗口对应的配置，recheck 时使用
+        if profile == self.current and not self._timer.isActive(): return
+        self._timer.start()  # 重新计时，只有停留足够久的窗口才生效
+
+    def recheck(self, current=None):
+        """上次请求的切换没有执行（例如设置窗口打开）：以 current 为当前配置，按最近的前台窗口重新请求"""
+        if current is not None: self.current = current
+        if self._pending and self._pending != self.current: self._timer.start()
+
+    def _fire(self):
+        if self._pending and self._pending != self.current:
+            self.current = self._pending; self.profileRequested.emit(self.current)
+
+
+if __name__ == "__main__":
+    # 打印前台窗口变化，并在结束时报告本进程 CPU 时间：python window_monitor.py [秒数]
+    import time
+    from PyQt5.QtCore import QCoreApplication
+    app = QCoreApplication(sys.argv)
+    provider = create_provider()
+    if provider is None: sys.exit("当前平台没有可用的前台窗口来源")
+    provider.start(lambda a, t, p: print(f"{time.strftime('%H:%M:%S')}  {a}  |  {t}  (pid {p})"))
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    cpu0 = time.process_time()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+    provider.stop()
+    print(f"{seconds:.0f} 秒内 CPU 时间: {(time.process_time() - cpu0) * 1000:.1f} ms")